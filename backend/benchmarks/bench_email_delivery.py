@@ -0,0 +1,135 @@
+"""Benchmark email alert throughput against a local SMTP sink
+
+Starts a minimal SMTP server that accepts and discards mail, pausing before
+its greeting to stand in for the TCP/TLS/login round trips of a real provider.
+Then sends a burst of emails the old way (a fresh blocking connection per
+message inside a coroutine), through the pooled transport one message per
+call, and through the pooled transport in batches, while a ticker measures
+how late the event loop wakes up. Run from the backend directory:
+    python -m benchmarks.bench_email_delivery [emails] [connect_delay_seconds]
+"""
+import asyncio
+import smtplib
+import sys
+import threading
+import time
+
+from utils.email_transport import SMTPAccount, send_emails, close_email_transport
+
+TICK_SECONDS = 0.01
+BATCH_SIZE = 10
+
+MESSAGE = "Subject: BurnStop benchmark\r\n\r\nA cost alert.\r\n"
+
+def start_smtp_sink(connect_delay: float) -> int:
+    """Serve a discard-everything SMTP server on a free local port and return the port"""
+    ready = threading.Event()
+    port = []
+
+    async def session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await asyncio.sleep(connect_delay)
+        writer.write(b"220 sink ESMTP\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line[:4].upper()
+            if command == b"EHLO":
+                writer.write(b"250-sink\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                writer.write(b"354 go ahead\r\n")
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                # HELO, MAIL, RCPT, RSET and NOOP
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(session, "127.0.0.1", 0))
+        port.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return port[0]
+
+def envelope(index: int):
+    return ("alerts@burnstop.dev", [f"admin{index % 3}@burnstop.dev"], MESSAGE)
+
+async def connection_per_message(account: SMTPAccount, emails: int) -> int:
+    """How IntegrationService used to send: a blocking connection per email inside a coroutine"""
+    async def send(index: int) -> int:
+        server = smtplib.SMTP(account.server, account.port)
+        from_addr, to_addrs, message = envelope(index)
+        server.sendmail(from_addr, to_addrs, message)
+        server.quit()
+        return 1
+    return sum(await asyncio.gather(*(send(index) for index in range(emails))))
+
+async def pooled_single(account: SMTPAccount, emails: int) -> int:
+    return sum(await asyncio.gather(*(send_emails(account, [envelope(index)]) for index in range(emails))))
+
+async def pooled_batched(account: SMTPAccount, emails: int) -> int:
+    batches = [
+        [envelope(index) for index in range(start, min(start + BATCH_SIZE, emails))]
+        for start in range(0, emails, BATCH_SIZE)
+    ]
+    return sum(await asyncio.gather(*(send_emails(account, batch) for batch in batches)))
+
+async def measure(send, account: SMTPAccount, emails: int) -> dict:
+    """Send `emails` emails while sampling event-loop lag"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(time.perf_counter() - expected, 0))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    delivered = await send(account, emails)
+    elapsed = time.perf_counter() - started
+
+    done.set()
+    await ticker_task
+    close_email_transport()
+
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "delivered": delivered,
+        "max_lag": lags[-1] if lags else elapsed,
+    }
+
+def main():
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    connect_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    port = start_smtp_sink(connect_delay)
+    account = SMTPAccount("127.0.0.1", port, "alerts@burnstop.dev", None, use_tls=False)
+    for name, send in (
+        ("connection per message", connection_per_message),
+        ("pooled, one per call", pooled_single),
+        (f"pooled, batches of {BATCH_SIZE}", pooled_batched),
+    ):
+        result = asyncio.run(measure(send, account, emails))
+        print(
+            f"{name:24s} {result['delivered']}/{emails} sent in {result['elapsed']:6.2f}s "
+            f"({result['delivered'] / result['elapsed']:7.1f}/s), event-loop lag max {result['max_lag'] * 1000:7.1f} ms"
+        )
+
+if __name__ == "__main__":
+    main()
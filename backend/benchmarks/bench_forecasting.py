@@ -0,0 +1,48 @@
+"""Benchmark the batched forecasting engine on a large synthetic organization
+
+Run from the backend directory:
+    python -m benchmarks.bench_forecasting [services] [months]
+"""
+import sys
+import time
+
+import numpy as np
+
+from utils.forecasting import forecast_matrix, MODELS
+
+def synthetic_costs(services: int, months: int, seed: int = 7) -> np.ndarray:
+    """Monthly cost series with trend, yearly seasonality, noise and late starting services"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(months)
+    base = rng.uniform(5, 2000, size=(services, 1))
+    trend = rng.normal(0, 0.01, size=(services, 1)) * base * t
+    season = 0.1 * base * np.sin(2 * np.pi * t / 12 + rng.uniform(0, 2 * np.pi, size=(services, 1)))
+    noise = rng.normal(0, 0.03, size=(services, months)) * base
+    costs = np.maximum(base + trend + season + noise, 0)
+
+    # A quarter of the services were created part way through the window
+    starts = rng.integers(0, months - 2, size=services)
+    starts[rng.random(services) > 0.25] = 0
+    costs[t[None, :] < starts[:, None]] = np.nan
+    return costs
+
+def main():
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+
+    costs = synthetic_costs(services, months)
+    print(f"Forecasting {services:,} services x {months} months")
+
+    for horizon in (1, 3, 12):
+        runs = []
+        for _ in range(3):
+            started = time.perf_counter()
+            result = forecast_matrix(costs, horizon)
+            runs.append(time.perf_counter() - started)
+        best = min(runs)
+        picked = np.bincount(result["model"], minlength=len(MODELS))
+        mix = ", ".join(f"{name}={count}" for name, count in zip(MODELS, picked))
+        print(f"horizon={horizon:>2}: {best * 1000:8.1f} ms  ({services / best:,.0f} series/s)  models: {mix}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark the top-N services lookup against sorting the full service list
+
+Seeds a scratch organization on the configured Redis (REDIS_HOST/REDIS_PORT),
+times both approaches and removes the scratch keys again. Run from the backend
+directory:
+    python -m benchmarks.bench_top_services [services] [n]
+"""
+import json
+import random
+import sys
+import time
+import uuid
+
+from utils.redis_db import redis_db
+from utils.ranking import apply_rank_change, get_top_service_ids, delete_cost_rank
+
+PLATFORMS = ("aws", "gcp", "azure", "other")
+
+def seed(org_id: str, services: int) -> list:
+    """Store synthetic service bodies, the org service list and the cost ranks"""
+    rng = random.Random(7)
+    service_ids = []
+    pipe = redis_db.pipeline(transaction=False)
+    for index in range(services):
+        service_id = str(uuid.uuid4())
+        service_data = {
+            "id": service_id,
+            "org_id": org_id,
+            "name": f"service-{index}",
+            "platform": rng.choice(PLATFORMS),
+            "service_type": "ec2",
+            "cost": round(rng.lognormvariate(4, 1.5), 2),
+            "reminder_date": "2030-01-01T00:00:00",
+            "status": "active" if rng.random() > 0.05 else "pending_deletion",
+            "created_at": "2024-01-01T00:00:00",
+        }
+        pipe.set(f"service:{service_id}", json.dumps(service_data))
+        apply_rank_change(pipe, org_id, None, service_data)
+        service_ids.append(service_id)
+        if index % 1000 == 999:
+            pipe.execute()
+    pipe.set(f"org_services:{org_id}", json.dumps(service_ids))
+    pipe.set(f"costrank_built:{org_id}", 1)
+    pipe.execute()
+    return service_ids
+
+def top_from_full_list(org_id: str, n: int) -> list:
+    """What the dashboard widget does today: load every service and sort client side"""
+    services = []
+    for service_id in redis_db.get(f"org_services:{org_id}") or []:
+        service_data = redis_db.get(f"service:{service_id}")
+        if service_data and service_data.get("status") == "active":
+            services.append(service_data)
+    return sorted(services, key=lambda service: -service["cost"])[:n]
+
+def top_from_index(org_id: str, n: int) -> list:
+    """ZREVRANGE on the cost rank plus one MGET for the bodies"""
+    top = get_top_service_ids(org_id, n)
+    return redis_db.mget([f"service:{service_id}" for service_id, _ in top])
+
+def timed(func, *args, repeat: int = 5) -> tuple:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    org_id = f"bench-{uuid.uuid4()}"
+
+    print(f"Seeding {services} services...")
+    service_ids = seed(org_id, services)
+    try:
+        full_seconds, expected = timed(top_from_full_list, org_id, n, repeat=1)
+        index_seconds, result = timed(top_from_index, org_id, n)
+        # Services with equal cost may come back in a different order, so compare costs
+        assert [service["cost"] for service in expected] == [service["cost"] for service in result]
+
+        print(f"full list + sort: {full_seconds * 1000:9.1f} ms")
+        print(f"cost rank index:  {index_seconds * 1000:9.1f} ms  ({full_seconds / index_seconds:.0f}x faster)")
+    finally:
+        for start in range(0, len(service_ids), 1000):
+            redis_db.redis_client.delete(*[f"service:{service_id}" for service_id in service_ids[start:start + 1000]])
+        redis_db.redis_client.delete(f"org_services:{org_id}")
+        delete_cost_rank(org_id)
+
+if __name__ == "__main__":
+    main()
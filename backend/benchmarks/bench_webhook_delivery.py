@@ -0,0 +1,99 @@
+"""Benchmark event-loop lag while delivering webhooks to a slow endpoint
+
+Starts a local stub webhook server that answers after a delay, then sends a
+burst of alerts the old way (blocking requests.post inside a coroutine) and
+through the shared async client, while a ticker measures how late the event
+loop wakes up. Run from the backend directory:
+    python -m benchmarks.bench_webhook_delivery [alerts] [delay_seconds]
+"""
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils.http_client import post_json, close_http_client
+
+TICK_SECONDS = 0.01
+
+def start_stub_server(delay: float) -> ThreadingHTTPServer:
+    """Serve 200 OK to every POST after `delay` seconds, on a free local port"""
+
+    class SlowWebhook(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowWebhook)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def blocking_send(url: str, payload: dict) -> bool:
+    """How IntegrationService used to deliver: a blocking call inside a coroutine"""
+    response = requests.post(url, json=payload, timeout=10)
+    return response.status_code == 200
+
+async def async_send(url: str, payload: dict) -> bool:
+    response = await post_json(url, payload)
+    return response.status_code == 200
+
+async def measure(send, url: str, alerts: int) -> dict:
+    """Send `alerts` webhooks concurrently while sampling event-loop lag"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(time.perf_counter() - expected, 0))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(send(url, {"text": f"alert {i}"}) for i in range(alerts)))
+    elapsed = time.perf_counter() - started
+
+    done.set()
+    await ticker_task
+    await close_http_client()
+
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "delivered": sum(results),
+        "max_lag": lags[-1] if lags else elapsed,
+        "p99_lag": lags[int(len(lags) * 0.99)] if lags else elapsed,
+    }
+
+def main():
+    alerts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+
+    server = start_stub_server(delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}/webhook"
+    try:
+        for name, send in (("blocking requests.post", blocking_send), ("shared httpx.AsyncClient", async_send)):
+            result = asyncio.run(measure(send, url, alerts))
+            print(
+                f"{name:26s} {result['delivered']}/{alerts} delivered in {result['elapsed']:6.2f}s, "
+                f"event-loop lag max {result['max_lag'] * 1000:7.1f} ms, p99 {result['p99_lag'] * 1000:7.1f} ms"
+            )
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Load test the alert pipeline end to end against the local webhook sink
+
+Creates throwaway organizations whose Slack, Discord, Teams and Google Chat
+integrations point at an in-process webhook sink, queues N alerts on the
+notification stream and runs the worker's consumers until every delivery
+arrived or the timeout passed. Reports throughput, end-to-end latency
+(enqueue to receipt) p50/p99 and loss. Run from the backend directory
+against a scratch Redis (REDIS_HOST/REDIS_PORT), since it uses the real
+notification stream:
+    python -m benchmarks.load_test_notifications [--events 1000] [--orgs 50] [--consumers 4]
+        [--latency 0.05] [--jitter 0.02] [--error-rate 0.01] [--rate-limit 10] [--timeout 120]
+
+Deliveries to one webhook are also paced by the client-side rate limiter
+(utils/rate_limits.py), which allows 5/s per local URL, so spread the load over
+enough organizations for the throughput you want to measure.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import re
+import time
+import uuid
+from datetime import datetime
+
+from utils.redis_db import redis_db
+from utils.integrations import IntegrationService
+from utils.notifications import enqueue_notification, ensure_consumer_group, queue_stats
+from utils.delivery_metrics import delete_delivery_metrics
+from utils.http_client import close_http_client
+from benchmarks.webhook_sink import SinkSettings, start_webhook_sink
+from worker import consume, housekeeping
+
+ENQUEUE_BATCH = 500
+
+def create_integrations(run_id: str, orgs: int, base_url: str) -> list:
+    """Give every throwaway organization one integration per webhook platform on the sink"""
+    org_ids = [f"loadtest-{run_id}-{index}" for index in range(orgs)]
+    now = datetime.utcnow().isoformat()
+    for org_id in org_ids:
+        for integration_type in IntegrationService.SINK_WEBHOOK_PATHS:
+            redis_db.set(f"integration:{org_id}:{integration_type}", {
+                "id": str(uuid.uuid4()),
+                "organization_id": org_id,
+                "type": integration_type,
+                "config": {
+                    "webhook_url": IntegrationService.sink_webhook_url(base_url, integration_type, org_id),
+                    "digest_window_seconds": 0,
+                },
+                "enabled": True,
+                "created_at": now,
+                "updated_at": now,
+            })
+    return org_ids
+
+def delete_integrations(org_ids: list):
+    for org_id in org_ids:
+        for integration_type in IntegrationService.SINK_WEBHOOK_PATHS:
+            redis_db.delete(f"integration:{org_id}:{integration_type}")
+        delete_delivery_metrics(org_id)
+
+def enqueue_events(run_id: str, org_ids: list, events: int):
+    """Queue the alerts, each tagged with its sequence number and enqueue time"""
+    for start in range(0, events, ENQUEUE_BATCH):
+        pipe = redis_db.pipeline()
+        for index in range(start, min(start + ENQUEUE_BATCH, events)):
+            message = f"Load test alert {index} [lt:{run_id}:{index}:{time.time():.6f}]"
+            enqueue_notification(pipe, [org_ids[index % len(org_ids)]], message, "BurnStop load test", kind="loadtest")
+        pipe.execute()
+
+def deliveries(sink, run_id: str) -> dict:
+    """Get the first receipt time and enqueue time of every (webhook, event) the sink accepted"""
+    marker = re.compile(rf"\[lt:{run_id}:(\d+):([\d.]+)\]")
+    seen, duplicates = {}, 0
+    with sink.lock:
+        received = list(sink.received)
+    for received_at, path, text in received:
+        match = marker.search(text)
+        if not match:
+            continue
+        key = (path, int(match.group(1)))
+        if key in seen:
+            duplicates += 1
+            continue
+        seen[key] = (received_at, float(match.group(2)))
+    return {"seen": seen, "duplicates": duplicates}
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else float("nan")
+
+async def drive(sink, run_id: str, expected: int, consumers: int, timeout: float) -> float:
+    """Run the worker's consumers until all deliveries arrived or the timeout passed"""
+    names = [f"loadtest-{run_id}-{index}" for index in range(consumers)]
+    tasks = [asyncio.create_task(housekeeping(names[0]))]
+    tasks += [asyncio.create_task(consume(name)) for name in names]
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < timeout:
+            if len(deliveries(sink, run_id)["seen"]) >= expected:
+                break
+            await asyncio.sleep(0.2)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await close_http_client()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test BurnStop alert delivery")
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--orgs", type=int, default=50)
+    parser.add_argument("--consumers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="sink response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sink responses that are 5xx")
+    parser.add_argument("--rate-limit", type=float, default=None, help="sink requests per second per webhook")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    sink = start_webhook_sink(SinkSettings(args.latency, args.jitter, args.error_rate, args.rate_limit))
+    org_ids = create_integrations(run_id, args.orgs, sink.base_url)
+    expected = args.events * len(IntegrationService.SINK_WEBHOOK_PATHS)
+    ensure_consumer_group()
+
+    try:
+        started = time.time()
+        enqueue_events(run_id, org_ids, args.events)
+        enqueued = time.time() - started
+        # The worker logs every notification; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = asyncio.run(drive(sink, run_id, expected, args.consumers, args.timeout))
+    finally:
+        delete_integrations(org_ids)
+        sink.shutdown()
+
+    result = deliveries(sink, run_id)
+    seen = result["seen"]
+    latencies = sorted(received_at - queued_at for received_at, queued_at in seen.values())
+    span = max((received_at for received_at, _ in seen.values()), default=started) - started
+
+    print(f"run {run_id}: {args.events} alerts x {len(IntegrationService.SINK_WEBHOOK_PATHS)} webhooks "
+          f"over {args.orgs} orgs, {args.consumers} consumers (enqueued in {enqueued:.2f}s)")
+    print(f"delivered   {len(seen)}/{expected} in {span:.2f}s ({len(seen) / span if span > 0 else 0:.0f}/s), "
+          f"stopped after {elapsed:.2f}s")
+    print(f"latency     p50 {percentile(latencies, 0.5) * 1000:.0f} ms, p99 {percentile(latencies, 0.99) * 1000:.0f} ms, "
+          f"max {(latencies[-1] if latencies else float('nan')) * 1000:.0f} ms")
+    print(f"loss        {expected - len(seen)} ({(expected - len(seen)) / expected:.2%}), duplicates {result['duplicates']}")
+    print(f"sink        {sink.stats}")
+    print(f"queue       {queue_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Local webhook sink emulating the Slack, Discord, Teams and Google Chat webhook contracts
+
+Accepts alerts on the same paths and with the same success, validation and
+rate-limit responses as the real platforms, with configurable latency, server
+errors and a per-webhook rate limit that answers 429 with Retry-After.
+Every accepted message is recorded so a load test can measure delivery.
+
+    python -m benchmarks.webhook_sink [--port 8099] [--latency 0.05] [--jitter 0.02]
+                                      [--error-rate 0.01] [--rate-limit 5]
+
+Point the test integrations at it with TEST_WEBHOOK_BASE_URL=http://localhost:8099.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+DISCORD_CONTENT_LIMIT = 2000
+
+class SinkSettings:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, retry_after: float = 1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Requests per second each webhook accepts (burst of the same size); None for unlimited
+        self.rate_limit = rate_limit
+        # Retry-After to send when the bucket is empty but no exact refill time applies
+        self.retry_after = retry_after
+
+class WebhookSink(ThreadingHTTPServer):
+    """Threaded HTTP server recording every message it accepts"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], settings: SinkSettings):
+        super().__init__(address, _SinkHandler)
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.received: List[Tuple[float, str, str]] = []  # (time, path, text)
+        self.buckets: Dict[str, Tuple[float, float]] = {}  # path -> (tokens, updated)
+        self.stats = {"accepted": 0, "rate_limited": 0, "errors": 0, "invalid": 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def take_token(self, path: str) -> float:
+        """Take a token from the webhook's bucket; returns 0, or the seconds until one is available"""
+        rate = self.settings.rate_limit
+        if not rate:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(path, (rate, now))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets[path] = (tokens - 1, now)
+                return 0.0
+            self.buckets[path] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def record(self, path: str, text: str):
+        with self.lock:
+            self.received.append((time.time(), path, text))
+            self.stats["accepted"] += 1
+
+def _platform(path: str) -> Optional[str]:
+    if path.startswith("/services/"):
+        return "slack"
+    if path.startswith("/api/webhooks/"):
+        return "discord"
+    if path.startswith("/webhook/"):
+        return "teams"
+    if re.match(r"^/v1/spaces/[^/]+/messages", path):
+        return "google_workspace"
+    return None
+
+def _message_text(platform: str, payload: dict) -> Optional[str]:
+    """Get the text of a payload if it satisfies the platform's contract"""
+    if platform == "slack":
+        return payload.get("text") or (payload.get("blocks") and json.dumps(payload["blocks"]))
+    if platform == "discord":
+        content = payload.get("content")
+        if content is not None and len(content) > DISCORD_CONTENT_LIMIT:
+            return None
+        return content or (payload.get("embeds") and json.dumps(payload["embeds"]))
+    if platform == "teams":
+        return json.dumps(payload.get("sections")) if payload.get("sections") or payload.get("text") else None
+    if platform == "google_workspace":
+        return payload.get("text") or (payload.get("cards") and json.dumps(payload["cards"]))
+    return None
+
+class _SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: WebhookSink
+
+    def reply(self, status: int, body: bytes = b"", content_type: str = "text/plain", headers: Optional[dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def reply_json(self, status: int, payload, headers: Optional[dict] = None):
+        self.reply(status, json.dumps(payload).encode(), "application/json", headers)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0]
+        platform = _platform(path)
+        settings = self.server.settings
+
+        if platform is None:
+            self.reply(404, b"no_service")
+            return
+
+        if settings.latency or settings.jitter:
+            time.sleep(max(settings.latency + random.uniform(-settings.jitter, settings.jitter), 0))
+
+        wait = self.server.take_token(path)
+        if wait:
+            self.server.count("rate_limited")
+            self.rate_limited(platform, max(wait, 0.001))
+            return
+
+        if settings.error_rate and random.random() < settings.error_rate:
+            self.server.count("errors")
+            self.reply(random.choice([500, 502, 503]), b"upstream error")
+            return
+
+        try:
+            payload = json.loads(raw)
+            text = _message_text(platform, payload) if isinstance(payload, dict) else None
+        except ValueError:
+            text = None
+        if not text:
+            self.server.count("invalid")
+            self.invalid(platform)
+            return
+
+        self.server.record(path, text)
+        self.accepted(platform, text)
+
+    def rate_limited(self, platform: str, wait: float):
+        retry_after = f"{wait:.3f}"
+        if platform == "discord":
+            self.reply_json(429, {"message": "You are being rate limited.", "retry_after": wait, "global": False}, {
+                "Retry-After": str(max(int(wait + 0.999), 1)),
+                "X-RateLimit-Limit": str(int(self.server.settings.rate_limit)),
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset-After": retry_after,
+            })
+        elif platform == "google_workspace":
+            self.reply_json(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded"}},
+                            {"Retry-After": retry_after})
+        elif platform == "slack":
+            self.reply(429, b"rate_limited", headers={"Retry-After": retry_after})
+        else:
+            self.reply(429, b"Microsoft Teams endpoint returned HTTP error 429", headers={"Retry-After": retry_after})
+
+    def invalid(self, platform: str):
+        if platform == "discord":
+            self.reply_json(400, {"code": 50035, "message": "Invalid Form Body"})
+        elif platform == "google_workspace":
+            self.reply_json(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT", "message": "Invalid message"}})
+        elif platform == "slack":
+            self.reply(400, b"invalid_payload")
+        else:
+            self.reply(400, b"Bad payload received by generic incoming webhook.")
+
+    def accepted(self, platform: str, text: str):
+        if platform == "discord":
+            self.reply(204)
+        elif platform == "google_workspace":
+            self.reply_json(200, {"name": f"{self.path.split('?')[0][4:-9]}/messages/{time.time_ns()}", "text": text[:100]})
+        elif platform == "slack":
+            self.reply(200, b"ok")
+        else:
+            self.reply(200, b"1")
+
+    def log_message(self, *args):
+        pass
+
+def start_webhook_sink(settings: SinkSettings, port: int = 0) -> WebhookSink:
+    """Serve the sink on a background thread"""
+    sink = WebhookSink(("127.0.0.1", port), settings)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    return sink
+
+def main():
+    parser = argparse.ArgumentParser(description="Local webhook sink for BurnStop integrations")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 5xx")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second per webhook before 429s")
+    args = parser.parse_args()
+
+    sink = WebhookSink(("0.0.0.0", args.port), SinkSettings(args.latency, args.jitter, args.error_rate, args.rate_limit))
+    print(f"Webhook sink listening on port {args.port}; TEST_WEBHOOK_BASE_URL=http://localhost:{args.port}")
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(sink.stats))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
-from routers import auth, organizations, services, reminders, integrations
+from routers import auth, organizations, services, reminders, integrations, events
+from utils.http_client import close_http_client
+from utils.email_transport import close_email_transport
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled webhook connections and SMTP sessions on shutdown
+    await close_http_client()
+    close_email_transport()
 
 app = FastAPI(
     title="BurnStop API",
     description="Stop burning money on subscriptions and cloud infrastructure",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -30,6 +41,7 @@ app.include_router(organizations.router)
 app.include_router(services.router)
 app.include_router(reminders.router)
 app.include_router(integrations.router)
+app.include_router(events.router)
 
 @app.get("/")
 async def root():
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 from enum import Enum
 
 class IntegrationType(str, Enum):
@@ -26,6 +26,7 @@ class EmailIntegration(BaseModel):
     email: EmailStr
     app_password: str  # Gmail app password or SMTP password
     from_name: Optional[str] = "BurnStop Alerts"
+    use_tls: bool = True
     enabled: bool = True
 
 class DiscordIntegration(BaseModel):
@@ -52,8 +53,74 @@ class Integration(BaseModel):
     type: IntegrationType
     config: Dict[str, Any]
     enabled: bool
+    disabled_reason: Optional[str] = None
     created_at: str
     updated_at: str
 
+class AlertTemplateUpdate(BaseModel):
+    # The webhook payload as a JSON object, or the HTML body for email, with $placeholders
+    template: Union[Dict[str, Any], str]
+
 class TestIntegrationRequest(BaseModel):
-    message: str = "🔥 Test alert from BurnStop! Your integration is working correctly." 
\ No newline at end of file
+    message: str = "🔥 Test alert from BurnStop! Your integration is working correctly."
+
+class LatencyHistogram(BaseModel):
+    buckets_ms: Dict[str, int]  # deliveries by latency bucket upper bound ("inf" for the slowest)
+    mean_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+
+class IntegrationMetrics(BaseModel):
+    type: IntegrationType
+    enabled: bool
+    disabled_reason: Optional[str] = None
+    sent: int
+    failed: int
+    rate_limited: int
+    retried: int
+    suppressed: int
+    consecutive_failures: int
+    latency: LatencyHistogram
+    timeline: List[Dict[str, Any]]  # hourly counters, hours without deliveries omitted
+
+class IntegrationMetricsReport(BaseModel):
+    organization_id: str
+    hours: int
+    integrations: List[IntegrationMetrics]
+
+class EventType(str, Enum):
+    SERVICE_CREATED = "service.created"
+    SERVICE_UPDATED = "service.updated"
+    SERVICE_DELETED = "service.deleted"
+    REMINDER_DUE = "reminder.due"
+    BUDGET_CROSSED = "budget.crossed"
+
+class EventWebhookCreate(BaseModel):
+    url: str
+    events: List[EventType]
+    batch_size: int = 100  # events per POST at most
+    batch_ms: int = 1000  # how long the first event of a batch may wait for more
+    enabled: bool = True
+
+class EventWebhookUpdate(BaseModel):
+    url: Optional[str] = None
+    events: Optional[List[EventType]] = None
+    batch_size: Optional[int] = None
+    batch_ms: Optional[int] = None
+    enabled: Optional[bool] = None
+    rotate_secret: bool = False
+
+class EventWebhook(BaseModel):
+    id: str
+    organization_id: str
+    url: str
+    events: List[EventType]
+    batch_size: int
+    batch_ms: int
+    enabled: bool
+    secret: Optional[str] = None  # only returned on creation and secret rotation
+    failures: int = 0
+    last_error: Optional[str] = None
+    next_retry_at: Optional[str] = None
+    created_at: str
+    updated_at: str
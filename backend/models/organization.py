@@ -1,11 +1,12 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict
 import uuid
 from datetime import datetime
 
 class OrganizationBase(BaseModel):
     name: str
     budget: Optional[float] = None  # Monthly budget in dollars
+    budget_envelopes: Dict[str, float] = {}  # Monthly budgets per scope, e.g. {"platform:aws": 500}
 
 class OrganizationCreate(OrganizationBase):
     pass
@@ -28,6 +29,21 @@ class AddUserToOrg(BaseModel):
 
 class UpdateOrganizationBudget(BaseModel):
     budget: float
+    envelopes: Optional[Dict[str, float]] = None
+
+class BudgetEnvelopeStatus(BaseModel):
+    scope: str  # "total" or an envelope key such as "platform:aws"
+    limit: float
+    monthly_rate: float
+    spent: float
+    projected: float  # Month-end spend at the current run rate
+    spent_ratio: float
+    projected_ratio: float
+
+class BudgetStatus(BaseModel):
+    month: str
+    month_elapsed: float
+    envelopes: List[BudgetEnvelopeStatus]
 
 class AddModeratorToOrg(BaseModel):
     user_email: str
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict
 from enum import Enum
 import uuid
 from datetime import datetime
@@ -1479,7 +1479,7 @@ class ServiceBase(BaseModel):
     
     # Additional metadata
     description: Optional[str] = None
-    tags: Optional[str] = None  # JSON string of tags
+    tags: Optional[str] = None  # JSON string of tags, normalized to a key/value object on write
     owner_email: Optional[str] = None
 
 class ServiceCreate(ServiceBase):
@@ -1537,3 +1537,48 @@ class ServiceAnalytics(BaseModel):
     cost_by_type: dict
     predicted_next_month: float
     cost_trend: list  # Historical cost data for predictions
+
+class SeriesForecast(BaseModel):
+    model: str  # linear, holt_winters or seasonal_naive (picked by backtest error), bottom_up for totals
+    forecast: List[float]
+    lower: List[float]  # 95% confidence interval
+    upper: List[float]
+    backtest_error: Optional[float] = None  # Mean absolute error over the held out months
+
+class CostForecast(BaseModel):
+    generated_at: str
+    history_months: List[str]
+    forecast_months: List[str]
+    total: SeriesForecast
+    platforms: Dict[str, SeriesForecast]
+    services: Dict[str, SeriesForecast]
+
+class CostAnomaly(BaseModel):
+    org_id: str
+    service_id: str
+    month: str  # YYYY-MM rollup bucket that jumped
+    cost: float
+    baseline: float  # Median of the trailing months
+    z_score: float
+    detected_at: str
+
+class ServiceSearchHit(BaseModel):
+    score: float
+    service: Service
+
+class ServiceSearchResults(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    hits: List[ServiceSearchHit]
+
+class TagValueCost(BaseModel):
+    value: str
+    cost: float  # Monthly cost of active services with this tag value
+    services: int
+
+class TagCostBreakdown(BaseModel):
+    key: str
+    values: List[TagValueCost]
+    untagged_cost: float  # Monthly cost of active services without this tag key
+    untagged_services: int
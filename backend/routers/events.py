@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import json
+import re
+
+from models.user import User
+from routers.auth import get_current_user
+from utils.analytics import get_org_revision
+from utils.change_feed import latest_change_id, is_resumable, read_changes
+
+router = APIRouter(tags=["events"])
+
+# A comment line is sent when nothing happened for this long, keeping proxies from closing idle streams
+HEARTBEAT_SECONDS = 15
+
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+def format_sse(event_type: str, data: dict, event_id: Optional[str] = None) -> str:
+    """Format a server-sent event"""
+    message = ""
+    if event_id:
+        message += f"id: {event_id}\n"
+    message += f"event: {event_type}\n"
+    message += f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+    return message
+
+@router.get("/organizations/{org_id}/stream")
+async def stream_organization_changes(
+    org_id: str,
+    request: Request,
+    since: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Push service, analytics and reminder deltas of an organization as server-sent events
+
+    Without a cursor the stream opens with a `ready` event carrying the current
+    revision; the client loads the full state once and then applies deltas. On
+    reconnect the Last-Event-ID header (or ?since=) resumes after the last seen
+    change, or a `reset` event asks the client to reload if it fell too far behind.
+    """
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    cursor = last_event_id or since
+    if cursor and not STREAM_ID_PATTERN.match(cursor):
+        raise HTTPException(status_code=400, detail="Invalid stream cursor")
+
+    async def event_stream():
+        last_id = cursor
+        if not last_id:
+            last_id = latest_change_id(org_id)
+            yield format_sse("ready", {"revision": get_org_revision(org_id)}, last_id)
+        elif not is_resumable(org_id, last_id):
+            last_id = latest_change_id(org_id)
+            yield format_sse("reset", {"revision": get_org_revision(org_id)}, last_id)
+
+        while not await request.is_disconnected():
+            changes = await read_changes(org_id, last_id, block_ms=HEARTBEAT_SECONDS * 1000)
+            if not changes:
+                yield ": heartbeat\n\n"
+                continue
+
+            for entry_id, event_type, data in changes:
+                last_id = entry_id
+                yield format_sse(event_type, data, entry_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable nginx response buffering
+        }
+    )
@@ -1,16 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List
+import math
 import uuid
 from datetime import datetime
 
 from models.integration import (
     Integration, IntegrationCreate, IntegrationUpdate, 
-    TestIntegrationRequest, IntegrationType
+    TestIntegrationRequest, IntegrationType, IntegrationMetrics, IntegrationMetricsReport,
+    AlertTemplateUpdate, EventWebhook, EventWebhookCreate, EventWebhookUpdate
 )
 from models.user import User
 from routers.auth import get_current_user
 from utils.redis_db import redis_db
 from utils.integrations import IntegrationService
+from utils.rate_limits import RateLimited
+from utils.dispatch import alert_target, load_alert_targets, dispatch_alert
+from utils.routing import compile_rules, RuleError
+from utils.delivery_metrics import MAX_METRICS_HOURS, get_org_metrics, failure_streak_key
+from utils.templates import (
+    DEFAULT_TEMPLATES, PLACEHOLDERS, TemplateError, AlertRenderer, load_template_overrides,
+    get_template_overrides, set_template_override, delete_template_override
+)
+from utils.event_webhooks import (
+    EventWebhookError, list_event_webhooks, create_event_webhook, update_event_webhook, delete_event_webhook
+)
 
 router = APIRouter(prefix="/integrations", tags=["integrations"])
 
@@ -39,6 +52,12 @@ async def create_integration(
     if redis_db.get(existing_key):
         raise HTTPException(status_code=400, detail=f"{integration.type.value} integration already exists for this organization")
     
+    # Reject routing rules that don't compile
+    try:
+        compile_rules(integration.config.get("rules"))
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid routing rules: {e}")
+    
     # Create integration
     integration_id = str(uuid.uuid4())
     integration_data = {
@@ -87,6 +106,256 @@ async def list_integrations(
     
     return integrations
 
+@router.get("/organizations/{org_id}/metrics", response_model=IntegrationMetricsReport)
+async def get_integration_metrics(
+    org_id: str,
+    hours: int = Query(24, ge=1, le=MAX_METRICS_HOURS),
+    current_user: User = Depends(get_current_user)
+):
+    """Get delivery counters and latency histograms of an organization's integrations"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can view integrations")
+    
+    keys = [f"integration:{org_id}:{integration_type.value}" for integration_type in IntegrationType]
+    integrations = [integration_data for integration_data in redis_db.mget(keys) if integration_data]
+    metrics = get_org_metrics(org_id, [integration_data["type"] for integration_data in integrations], hours)
+    
+    return IntegrationMetricsReport(
+        organization_id=org_id,
+        hours=hours,
+        integrations=[
+            IntegrationMetrics(
+                type=integration_data["type"],
+                enabled=integration_data.get("enabled", False),
+                disabled_reason=integration_data.get("disabled_reason"),
+                **metrics[integration_data["type"]]
+            )
+            for integration_data in integrations
+        ]
+    )
+
+@router.get("/organizations/{org_id}/templates")
+async def get_alert_templates(
+    org_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the alert template of every channel: the organization's override, if any, and the default"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can view integrations")
+    
+    overrides = get_template_overrides(org_id)
+    return {
+        "placeholders": PLACEHOLDERS,
+        "templates": {
+            channel: {"override": overrides.get(channel), "default": default}
+            for channel, default in DEFAULT_TEMPLATES.items()
+        }
+    }
+
+@router.put("/organizations/{org_id}/templates/{integration_type}")
+async def update_alert_template(
+    org_id: str,
+    integration_type: IntegrationType,
+    update: AlertTemplateUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Override the alert template of one channel for an organization"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can manage integrations")
+    
+    try:
+        set_template_override(org_id, integration_type.value, update.template)
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid template: {e}")
+    
+    return {"message": f"{integration_type.value} template updated", "template": update.template}
+
+@router.delete("/organizations/{org_id}/templates/{integration_type}")
+async def reset_alert_template(
+    org_id: str,
+    integration_type: IntegrationType,
+    current_user: User = Depends(get_current_user)
+):
+    """Go back to the default alert template of one channel"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can manage integrations")
+    
+    if not delete_template_override(org_id, integration_type.value):
+        raise HTTPException(status_code=404, detail="No template override for this integration type")
+    
+    return {"message": f"{integration_type.value} template reset to the default"}
+
+@router.get("/organizations/{org_id}/webhooks", response_model=List[EventWebhook])
+async def list_event_webhook_subscriptions(
+    org_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """List an organization's outbound event webhooks with their delivery state (secrets omitted)"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can view integrations")
+    
+    webhooks = list_event_webhooks(org_id)
+    for webhook in webhooks:
+        webhook.pop("secret", None)
+    return [EventWebhook(**webhook) for webhook in webhooks]
+
+@router.post("/organizations/{org_id}/webhooks", response_model=EventWebhook)
+async def create_event_webhook_subscription(
+    org_id: str,
+    subscription: EventWebhookCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Subscribe a URL to service, reminder and budget events, delivered in signed batches
+
+    The response holds the signing secret; it isn't shown again.
+    """
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can manage integrations")
+    
+    try:
+        webhook = create_event_webhook(
+            org_id,
+            subscription.url,
+            [event.value for event in subscription.events],
+            batch_size=subscription.batch_size,
+            batch_ms=subscription.batch_ms,
+            enabled=subscription.enabled
+        )
+    except EventWebhookError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return EventWebhook(**webhook)
+
+@router.put("/organizations/{org_id}/webhooks/{webhook_id}", response_model=EventWebhook)
+async def update_event_webhook_subscription(
+    org_id: str,
+    webhook_id: str,
+    update: EventWebhookUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Change an outbound event webhook or rotate its secret"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can manage integrations")
+    
+    changes = update.dict(exclude_unset=True, exclude={"rotate_secret"})
+    if update.events is not None:
+        changes["events"] = [event.value for event in update.events]
+    
+    try:
+        webhook = update_event_webhook(org_id, webhook_id, changes, rotate_secret=update.rotate_secret)
+    except EventWebhookError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not webhook:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    
+    if not update.rotate_secret:
+        webhook.pop("secret", None)
+    return EventWebhook(**webhook)
+
+@router.delete("/organizations/{org_id}/webhooks/{webhook_id}")
+async def delete_event_webhook_subscription(
+    org_id: str,
+    webhook_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Unsubscribe an outbound event webhook"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check if current user is owner of the organization
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    if org_data["owner_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only organization owner can manage integrations")
+    
+    if not delete_event_webhook(org_id, webhook_id):
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    
+    return {"message": "Webhook deleted successfully"}
+
 @router.get("/organizations/{org_id}/types/{integration_type}", response_model=Integration)
 async def get_integration(
     org_id: str,
@@ -144,11 +413,19 @@ async def update_integration(
     if not integration_data:
         raise HTTPException(status_code=404, detail="Integration not found")
     
-    # Update fields
+    # Update fields; the new updated_at makes the dispatcher recompile the routing rules
     if update_data.config is not None:
+        try:
+            compile_rules(update_data.config.get("rules"))
+        except RuleError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid routing rules: {e}")
         integration_data["config"] = update_data.config
     if update_data.enabled is not None:
         integration_data["enabled"] = update_data.enabled
+        if update_data.enabled:
+            # Re-enabling starts over after an automatic disable
+            integration_data.pop("disabled_reason", None)
+            redis_db.redis_client.delete(failure_streak_key(integration_key))
     
     integration_data["updated_at"] = datetime.utcnow().isoformat()
     
@@ -221,12 +498,23 @@ async def test_integration(
         raise HTTPException(status_code=400, detail="Integration is disabled")
     
     # Send test message
-    success = await IntegrationService.send_alert_to_integration(
-        integration_type=integration_type.value,
-        config=integration_data["config"],
-        message=test_request.message,
-        subject="🔥 BurnStop Test Alert"
-    )
+    # Render with the organization's template so overrides can be tried out
+    renderer = AlertRenderer(test_request.message, "🔥 BurnStop Test Alert", "test", load_template_overrides([org_id]))
+    try:
+        success = await IntegrationService.send_alert_to_integration(
+            integration_type=integration_type.value,
+            config=integration_data["config"],
+            message=test_request.message,
+            subject="🔥 BurnStop Test Alert",
+            rendered=renderer.render(integration_type.value, org_id)
+        )
+    except RateLimited as e:
+        # The destination (or our shared bucket for it) is throttling; tell the caller when to try again
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     
     if not success:
         raise HTTPException(status_code=400, detail="Failed to send test message")
@@ -254,25 +542,12 @@ async def send_alert_to_all_integrations(
     if org_data["owner_id"] != current_user.id:
         raise HTTPException(status_code=403, detail="Only organization owner can send alerts")
     
-    results = []
-    
-    # Send to all enabled integrations
-    for integration_type in IntegrationType:
-        integration_key = f"integration:{org_id}:{integration_type.value}"
-        integration_data = redis_db.get(integration_key)
-        
-        if integration_data and integration_data["enabled"]:
-            success = await IntegrationService.send_alert_to_integration(
-                integration_type=integration_type.value,
-                config=integration_data["config"],
-                message=alert_message,
-                subject="🔥 BurnStop Alert"
-            )
-            
-            results.append({
-                "type": integration_type.value,
-                "success": success
-            })
+    # Send to all enabled integrations concurrently
+    results = await dispatch_alert(
+        load_alert_targets([org_id]),
+        message=alert_message,
+        subject="🔥 BurnStop Alert"
+    )
     
     return {
         "message": "Alerts sent to all enabled integrations",
@@ -335,39 +610,31 @@ async def test_all_integration_types(
         raise HTTPException(status_code=403, detail="Only organization owner can test integrations")
     
     test_message = "🔥 This is a test alert from BurnStop! All integration types are working correctly."
+    targets = []
     results = []
     
     for integration_type in IntegrationType:
-        try:
-            test_config = IntegrationService.get_test_integration_config(integration_type.value)
-            if test_config:
-                success = await IntegrationService.send_alert_to_integration(
-                    integration_type=integration_type.value,
-                    config=test_config,
-                    message=test_message,
-                    subject="🔥 BurnStop Test Alert"
-                )
-                
-                results.append({
-                    "type": integration_type.value,
-                    "success": success,
-                    "config": test_config,
-                    "message": "Test completed successfully" if success else "Test failed"
-                })
-            else:
-                results.append({
-                    "type": integration_type.value,
-                    "success": False,
-                    "message": "No test configuration available"
-                })
-                
-        except Exception as e:
+        test_config = IntegrationService.get_test_integration_config(integration_type.value)
+        if test_config:
+            targets.append(alert_target(integration_type.value, integration_type.value, test_config))
+        else:
             results.append({
                 "type": integration_type.value,
                 "success": False,
-                "message": f"Test failed: {str(e)}"
+                "message": "No test configuration available"
             })
     
+    # Test every type concurrently
+    for result, target in zip(await dispatch_alert(targets, message=test_message, subject="🔥 BurnStop Test Alert"), targets):
+        results.append({
+            "type": result["type"],
+            "success": result["success"],
+            "config": target["config"],
+            "status": result["status"],
+            "elapsed_ms": result["elapsed_ms"],
+            "message": "Test completed successfully" if result["success"] else f"Test failed: {result.get('error', result['status'])}"
+        })
+    
     return {
         "message": "All integration types tested",
         "test_message": test_message,
@@ -6,10 +6,20 @@ import json
 import os
 import requests
 
-from models.organization import Organization, OrganizationCreate, AddUserToOrg, UpdateOrganizationBudget, AddModeratorToOrg, RemoveModeratorFromOrg
+from models.organization import Organization, OrganizationCreate, AddUserToOrg, UpdateOrganizationBudget, BudgetStatus, AddModeratorToOrg, RemoveModeratorFromOrg
 from models.user import User
 from routers.auth import get_current_user
 from utils.redis_db import redis_db
+from utils.analytics import delete_analytics_state
+from utils.tags import delete_tag_index
+from utils.search import delete_search_index
+from utils.ranking import delete_cost_rank
+from utils.dedup import delete_suppressed_counts
+from utils.delivery_metrics import delete_delivery_metrics
+from utils.templates import delete_template_overrides
+from utils.event_webhooks import delete_event_webhooks
+from utils.reminders import delete_org_reminders
+from utils.budgets import is_valid_envelope, get_budget_status, evaluate_budget_alerts, delete_budget_state
 
 router = APIRouter(prefix="/organizations", tags=["organizations"])
 
@@ -91,11 +101,43 @@ async def update_organization_budget(
     if not has_moderator_access(org_data, current_user.id):
         raise HTTPException(status_code=403, detail="Only organization owner or moderators can update budget")
     
+    if budget_data.envelopes is not None:
+        invalid = [scope for scope in budget_data.envelopes if not is_valid_envelope(scope)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid budget envelope(s): {', '.join(invalid)}")
+        org_data["budget_envelopes"] = budget_data.envelopes
+    
     # Update budget
     org_data["budget"] = budget_data.budget
     redis_db.set(org_key, org_data)
     
-    return {"message": "Budget updated successfully", "budget": budget_data.budget}
+    # A lower budget may already be crossed, a higher one re-arms its alerts
+    try:
+        evaluate_budget_alerts(org_id)
+    except Exception as e:
+        print(f"Error evaluating budget alerts for org {org_id}: {e}")
+    
+    return {
+        "message": "Budget updated successfully",
+        "budget": budget_data.budget,
+        "envelopes": org_data.get("budget_envelopes", {})
+    }
+
+@router.get("/{org_id}/budget/status", response_model=BudgetStatus)
+async def get_organization_budget_status(
+    org_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get spend to date and projected month-end spend for the budget and each envelope"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    org_data = redis_db.get(f"org:{org_id}")
+    if not org_data:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    
+    return BudgetStatus(**get_budget_status(org_id, org_data))
 
 @router.post("/{org_id}/users")
 async def add_user_to_organization(
@@ -173,6 +215,19 @@ async def delete_organization(
         reminder_data = redis_db.get(reminder_key)
         if reminder_data and reminder_data.get("organization_id") == org_id:
             redis_db.delete(reminder_key)
+    delete_org_reminders(org_id)
+    
+    # Delete running analytics, cached snapshots and the change feed
+    delete_analytics_state(org_id)
+    delete_budget_state(org_id)
+    delete_tag_index(org_id)
+    delete_search_index(org_id)
+    delete_cost_rank(org_id)
+    delete_suppressed_counts(org_id)
+    delete_delivery_metrics(org_id)
+    delete_template_overrides(org_id)
+    delete_event_webhooks(org_id)
+    redis_db.delete(f"changes:{org_id}")
     
     # Delete the organization itself
     redis_db.delete(org_key)
@@ -7,6 +7,7 @@ from models.service import Reminder, ReminderAcknowledge
 from models.user import User
 from routers.auth import get_current_user
 from utils.redis_db import redis_db
+from utils.reminders import clear_reminder
 
 router = APIRouter(tags=["reminders"])
 
@@ -102,7 +103,6 @@ async def acknowledge_reminder(
     redis_db.set(ack_key, ack_data)
     
     # Remove from active reminders
-    reminders_key = f"reminders:{org_id}"
-    redis_db.zrem(reminders_key, service_id)
+    clear_reminder(None, org_id, service_id)
     
     return {"message": "Reminder acknowledged successfully"}
@@ -1,17 +1,35 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Optional
 import uuid
 from datetime import datetime
 import time
 import json
-from collections import defaultdict
 
-from models.service import Service, ServiceCreate, ServiceUpdate, ServiceAnalytics
+from models.service import Service, ServiceCreate, ServiceUpdate, ServiceAnalytics, CostForecast, CostAnomaly, TagCostBreakdown, ServiceSearchResults
 from models.user import User
 from routers.auth import get_current_user
 from utils.redis_db import redis_db
-from utils.integrations import IntegrationService
-from models.service import ServiceType
+from utils.analytics import (
+    apply_service_change, service_contribution, ensure_analytics_counters, load_analytics_counters,
+    get_org_revision, get_analytics_snapshot, store_analytics_snapshot
+)
+from utils.rollups import record_cost_rollup
+from utils.forecasting import forecast_organization
+from utils.regression import append_service_point, append_org_point, predict_next_month
+from utils.anomalies import get_recent_anomalies
+from utils.change_feed import publish_service_change, publish_change
+from utils.event_webhooks import emit_service_event
+from utils.reminders import set_reminder, clear_reminder, reminder_event
+from utils.tags import normalize_tags, apply_tag_change, ensure_tag_index, get_tag_keys, get_cost_by_tag_value, get_tagged_service_ids
+from utils.search import apply_search_change, ensure_search_index, search_services
+from utils.ranking import apply_rank_change, ensure_cost_rank, get_top_service_ids
+from utils.dispatch import load_alert_targets
+from utils.notifications import enqueue_notification
+from utils.routing import alert_attributes
+from utils.alerts import build_service_creation_alert, build_service_deletion_alert, build_reminder_alert
+from utils.budgets import accrue_budget_burn, evaluate_budget_alerts
+from utils.downsampling import downsample_cost_trend, get_downsampled_trend, store_downsampled_trend
+from models.service import ServiceType, CloudPlatform
 
 router = APIRouter(tags=["services"])
 
@@ -35,6 +53,46 @@ def check_organization_moderator_access(org_id: str, current_user: User) -> dict
     
     return org_data
 
+def record_service_mutation(org_id: str, old_data: Optional[dict], new_data: dict, notification: Optional[dict] = None):
+    """Save a service body together with the running aggregate deltas and org revision bump in one transaction
+
+    `notification` holds enqueue_notification arguments for an alert that is
+    queued in the same transaction (outbox) and delivered by the worker.
+    """
+    ensure_analytics_counters(org_id)
+    ensure_tag_index(org_id)
+    ensure_search_index(org_id)
+    ensure_cost_rank(org_id)
+    
+    pipe = redis_db.pipeline()
+    pipe.set(f"service:{new_data['id']}", json.dumps(new_data))
+    
+    # Budget burn is accrued at the old run rate before the counters change
+    accrue_budget_burn(pipe, org_id, old_data, new_data)
+    analytics_deltas = apply_service_change(pipe, org_id, old_data, new_data)
+    apply_tag_change(pipe, org_id, old_data, new_data)
+    apply_search_change(pipe, org_id, old_data, new_data)
+    apply_rank_change(pipe, org_id, old_data, new_data)
+    
+    # Cost history appends also feed the monthly rollup and the online regression state
+    if old_data is None or old_data.get("cost") != new_data.get("cost"):
+        record_cost_rollup(org_id, new_data["id"], new_data["cost"], pipe=pipe)
+        append_service_point(pipe, org_id, new_data["id"], new_data["cost"])
+    if service_contribution(old_data).get("total_cost", 0) != service_contribution(new_data).get("total_cost", 0):
+        append_org_point(pipe, org_id)
+    
+    # Push compact deltas to live dashboards through the org change feed
+    publish_service_change(pipe, org_id, old_data, new_data, analytics_deltas)
+    
+    # Outbound event webhooks read the same transaction's outbox entry
+    emit_service_event(pipe, org_id, old_data, new_data)
+    
+    if notification:
+        enqueue_notification(pipe, **notification)
+    
+    pipe.incr(f"org_revision:{org_id}")
+    pipe.execute()
+
 @router.post("/organizations/{org_id}/services", response_model=Service)
 async def create_service(
     org_id: str,
@@ -46,6 +104,12 @@ async def create_service(
     if not has_moderator_access(org_data, current_user.id):
         raise HTTPException(status_code=403, detail="Only organization owner or moderators can create services")
     
+    # Normalize tags so they can be indexed
+    try:
+        tags = normalize_tags(service.tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Create service
     service_id = str(uuid.uuid4())
     service_data = {
@@ -73,14 +137,10 @@ async def create_service(
         
         # Additional metadata
         "description": service.description,
-        "tags": service.tags,
+        "tags": tags,
         "owner_email": service.owner_email
     }
     
-    # Save service
-    service_key = f"service:{service_id}"
-    redis_db.set(service_key, service_data)
-    
     # Add to organization's services list
     org_services_key = f"org_services:{org_id}"
     existing_services = redis_db.get(org_services_key) or []
@@ -95,8 +155,7 @@ async def create_service(
     print(f"Debug: Reminder timestamp: {reminder_timestamp}")
     print(f"Debug: Reminders key: {reminders_key}")
     
-    result = redis_db.zadd(reminders_key, {service_id: reminder_timestamp})
-    print(f"Debug: ZADD result: {result}")
+    set_reminder(None, org_id, service_id, reminder_timestamp)
     
     # Store cost history for analytics (with some sample historical data for better charts)
     cost_history_key = f"cost_history:{org_id}:{service_id}"
@@ -121,7 +180,8 @@ async def create_service(
             
             cost_entry = {
                 "date": historical_date.isoformat(),
-                "cost": round(historical_cost, 2)
+                "cost": round(historical_cost, 2),
+                "synthetic": True  # Kept out of the monthly rollups used for forecasting
             }
             existing_history.append(cost_entry)
     
@@ -133,15 +193,22 @@ async def create_service(
     existing_history.append(cost_entry)
     redis_db.set(cost_history_key, existing_history)
     
-    # Send alerts to all configured integrations (global for user)
-    print(f"DEBUG: About to send global service creation alert for user {current_user.email}")
+    # Save service and update running analytics; the creation alert goes out through
+    # the notification worker to the integrations of all the user's organizations
+    message, subject = build_service_creation_alert(org_id, service_data)
+    record_service_mutation(org_id, None, service_data, notification={
+        "org_ids": current_user.organizations,
+        "message": message,
+        "subject": subject,
+        "kind": "service.created",
+        "attributes": alert_attributes(service_data)
+    })
+    
+    # Spend projections changed, so check the org's budgets right away
     try:
-        await send_service_creation_alert(org_id, service_data, current_user)
-        print(f"DEBUG: Finished sending global service creation alert for user {current_user.email}")
+        evaluate_budget_alerts(org_id)
     except Exception as e:
-        print(f"DEBUG: Error in service creation alert: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error evaluating budget alerts for org {org_id}: {e}")
     
     return Service(**service_data)
 
@@ -185,8 +252,17 @@ async def update_service(
     if not has_moderator_access(org_data, current_user.id):
         raise HTTPException(status_code=403, detail="Only organization owner or moderators can update services")
     
+    previous_data = dict(service_data)
+    
     # Update fields
     update_data = service_update.dict(exclude_unset=True)
+    if update_data.get("tags") is not None:
+        try:
+            update_data["tags"] = normalize_tags(update_data["tags"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        service_data["tags"] = update_data.pop("tags")
+    
     for field, value in update_data.items():
         if field in ["platform", "service_type"] and value:
             service_data[field] = value.value
@@ -208,14 +284,18 @@ async def update_service(
     
     # If reminder_date was updated, update the sorted set
     if "reminder_date" in update_data:
-        reminders_key = f"reminders:{org_id}"
-        # Remove old entry and add new one
-        redis_db.zrem(reminders_key, service_id)
+        # Moving the reminder replaces its entry (and re-arms it if it was already sent)
         reminder_timestamp = int(datetime.fromisoformat(service_data["reminder_date"]).timestamp())
-        redis_db.zadd(reminders_key, {service_id: reminder_timestamp})
+        set_reminder(None, org_id, service_id, reminder_timestamp)
+    
+    # Save updated service and update running analytics
+    record_service_mutation(org_id, previous_data, service_data)
     
-    # Save updated service
-    redis_db.set(service_key, service_data)
+    # Spend projections changed, so check the org's budgets right away
+    try:
+        evaluate_budget_alerts(org_id)
+    except Exception as e:
+        print(f"Error evaluating budget alerts for org {org_id}: {e}")
     
     return Service(**service_data)
 
@@ -241,64 +321,70 @@ async def delete_service(
         raise HTTPException(status_code=403, detail="Only organization owner or moderators can delete services")
     
     # Mark for deletion instead of actual deletion
+    previous_data = dict(service_data)
     service_data["status"] = "pending_deletion"
     service_data["updated_at"] = datetime.utcnow().isoformat()
-    redis_db.set(service_key, service_data)
-    
-    # Remove from reminders
-    reminders_key = f"reminders:{org_id}"
-    redis_db.zrem(reminders_key, service_id)
-    
-    # Send deletion alerts to all configured integrations (global for user)
-    print(f"DEBUG: About to send global service deletion alert for user {current_user.email}")
+    message, subject = build_service_deletion_alert(org_id, service_data)
+    record_service_mutation(org_id, previous_data, service_data, notification={
+        "org_ids": current_user.organizations,
+        "message": message,
+        "subject": subject,
+        "kind": "service.deleted",
+        "attributes": alert_attributes(service_data)
+    })
+    
+    # Spend projections changed, so check the org's budgets right away
     try:
-        await send_service_deletion_alert(org_id, service_data, current_user)
-        print(f"DEBUG: Finished sending global service deletion alert for user {current_user.email}")
+        evaluate_budget_alerts(org_id)
     except Exception as e:
-        print(f"DEBUG: Error in service deletion alert: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error evaluating budget alerts for org {org_id}: {e}")
+    
+    # Remove from reminders
+    clear_reminder(None, org_id, service_id)
     
     return {"message": "Service marked for deletion"}
 
 @router.get("/organizations/{org_id}/analytics", response_model=ServiceAnalytics)
 async def get_service_analytics(
     org_id: str,
+    max_points: Optional[int] = None,
     current_user: User = Depends(get_current_user)
 ):
     # Check if user has access to this organization
     if org_id not in current_user.organizations:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Get all services for the organization
-    org_services_key = f"org_services:{org_id}"
-    service_ids = redis_db.get(org_services_key) or []
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
     
-    total_cost = 0
-    active_services = 0
-    cost_by_platform = defaultdict(float)
-    cost_by_type = defaultdict(float)
-    cost_trend = []
+    # Serve the materialized snapshot while nothing in the organization has changed
+    revision = get_org_revision(org_id)
+    snapshot = get_analytics_snapshot(org_id, revision)
+    analytics = ServiceAnalytics(**snapshot) if snapshot else build_service_analytics(org_id, revision)
     
-    for service_id in service_ids:
-        service_key = f"service:{service_id}"
-        service_data = redis_db.get(service_key)
-        
-        if service_data and service_data.get("status") == "active":
-            active_services += 1
-            cost = service_data.get("cost", 0)
-            total_cost += cost
-            
-            platform = service_data.get("platform", "unknown")
-            service_type = service_data.get("service_type", "unknown")
-            
-            cost_by_platform[platform] += cost
-            cost_by_type[service_type] += cost
-            
-            # Get cost history for this service
-            cost_history_key = f"cost_history:{org_id}:{service_id}"
-            history = redis_db.get(cost_history_key) or []
-            cost_trend.extend(history)
+    # Charts only need max_points points; the downsampled trend is cached per revision as well
+    if max_points and len(analytics.cost_trend) > max_points:
+        points = get_downsampled_trend(org_id, revision, max_points)
+        if points is None:
+            points = downsample_cost_trend(analytics.cost_trend, max_points)
+            store_downsampled_trend(org_id, revision, max_points, points)
+        analytics.cost_trend = points
+    
+    return analytics
+
+def build_service_analytics(org_id: str, revision: int) -> ServiceAnalytics:
+    """Compute the analytics of an organization and materialize them for the given revision"""
+    # Summary figures come from the running aggregates instead of every service body
+    counters = load_analytics_counters(org_id)
+    total_cost = counters["total_monthly_cost"]
+    active_services = counters["total_services"]
+    
+    # Only the cost histories of active services are needed for the trend
+    active_service_ids = redis_db.smembers(f"org_active_services:{org_id}")
+    history_keys = [f"cost_history:{org_id}:{service_id}" for service_id in active_service_ids]
+    cost_trend = []
+    for history in redis_db.mget(history_keys):
+        cost_trend.extend(history or [])
     
     # Sort cost trend by date
     cost_trend.sort(key=lambda x: x.get("date", ""))
@@ -329,321 +415,184 @@ async def get_service_analytics(
         if len(monthly_costs) > len(cost_trend):
             cost_trend = monthly_costs
     
-    # Simple linear regression for prediction
-    predicted_next_month = total_cost  # Default to current cost
-    if len(cost_trend) >= 2:
-        # Get last 6 months of data for trend analysis
-        recent_trend = cost_trend[-6:] if len(cost_trend) >= 6 else cost_trend
-        
-        if len(recent_trend) >= 2:
-            # Simple linear regression: y = mx + b
-            x_values = list(range(len(recent_trend)))
-            y_values = [entry.get("cost", 0) for entry in recent_trend]
-            
-            n = len(recent_trend)
-            sum_x = sum(x_values)
-            sum_y = sum(y_values)
-            sum_xy = sum(x * y for x, y in zip(x_values, y_values))
-            sum_x_squared = sum(x * x for x in x_values)
-            
-            # Calculate slope (m) and intercept (b)
-            if n * sum_x_squared - sum_x * sum_x != 0:
-                m = (n * sum_xy - sum_x * sum_y) / (n * sum_x_squared - sum_x * sum_x)
-                b = (sum_y - m * sum_x) / n
-                
-                # Predict next month (next x value)
-                next_x = len(recent_trend)
-                predicted_next_month = m * next_x + b
-                predicted_next_month = max(0, predicted_next_month)  # Don't predict negative costs
+    # Constant time prediction from the org's online regression state, current cost until it has enough history
+    predicted_next_month = predict_next_month(org_id)
+    if predicted_next_month is None:
+        predicted_next_month = total_cost
     
-    return ServiceAnalytics(
+    analytics = ServiceAnalytics(
         total_monthly_cost=total_cost,
         total_services=active_services,
-        cost_by_platform=dict(cost_by_platform),
-        cost_by_type=dict(cost_by_type),
+        cost_by_platform=counters["cost_by_platform"],
+        cost_by_type=counters["cost_by_type"],
         predicted_next_month=predicted_next_month,
         cost_trend=cost_trend
     )
+    store_analytics_snapshot(org_id, revision, analytics.dict())
+    
+    return analytics
 
-@router.post("/reminder-alerts")
-async def trigger_reminder_alerts(
-    days_ahead: int = 7,
+@router.get("/organizations/{org_id}/forecast", response_model=CostForecast)
+async def get_cost_forecast(
+    org_id: str,
+    horizon: int = 3,
     current_user: User = Depends(get_current_user)
 ):
-    """Manually trigger reminder alerts for upcoming service reminders"""
-    try:
-        await send_reminder_alerts(current_user, days_ahead)
-        return {"message": f"Reminder alerts sent for upcoming reminders in the next {days_ahead} days"}
-    except Exception as e:
-        print(f"Error triggering reminder alerts: {e}")
-        raise HTTPException(status_code=500, detail="Failed to send reminder alerts")
+    """Forecast monthly cost per service, per platform and for the whole organization"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if horizon < 1 or horizon > 12:
+        raise HTTPException(status_code=400, detail="Horizon must be between 1 and 12 months")
+    
+    ensure_analytics_counters(org_id)
+    return CostForecast(**forecast_organization(org_id, horizon))
 
-async def send_service_creation_alert(org_id: str, service_data: dict, current_user: User):
-    """Send alerts to all configured integrations for the user (global across all organizations)"""
-    try:
-        print(f"DEBUG: Starting global service creation alert for user {current_user.email}")
-        
-        # Get all integrations for ALL organizations that this user belongs to
-        all_integration_keys = []
-        
-        for user_org_id in current_user.organizations:
-            try:
-                org_integration_keys = redis_db.keys(f"integration:{user_org_id}:*")
-                all_integration_keys.extend(org_integration_keys)
-                print(f"DEBUG: Found {len(org_integration_keys)} integrations for org {user_org_id}")
-            except Exception as e:
-                print(f"DEBUG: Error getting integration keys for org {user_org_id}: {e}")
-        
-        print(f"DEBUG: Total global integration keys found: {len(all_integration_keys)}")
-        
-        if not all_integration_keys:
-            print(f"DEBUG: No integrations configured for user {current_user.email} across all organizations")
-            print(f"DEBUG: User organizations: {current_user.organizations}")
-            return
-        
-        # Format service metadata for the alert
-        platform_emojis = {
-            "aws": "🟠 Amazon Web Services",
-            "gcp": "🔵 Google Cloud Platform", 
-            "azure": "🔷 Microsoft Azure",
-            "other": "⚡ Other Platform"
-        }
-        
-        service_type_emojis = {
-            "ec2": "🖥️", "s3": "🗄️", "rds": "🗃️", "lambda": "⚡", "eks": "☸️",
-            "compute_engine": "🖥️", "cloud_storage": "🗄️", "cloud_sql": "🗃️",
-            "virtual_machines": "🖥️", "blob_storage": "🗄️", "sql_database": "🗃️",
-            "cloud": "☁️", "api": "🔌", "database": "🗃️", "storage": "🗄️"
-        }
-        
-        platform_name = platform_emojis.get(service_data["platform"], f"⚡ {service_data['platform'].title()}")
-        service_emoji = service_type_emojis.get(service_data["service_type"], "📦")
-        
-        # Get organization name for context
-        org_key = f"org:{org_id}"
-        org_data = redis_db.get(org_key)
-        org_name = org_data.get('name', 'Unknown Organization') if org_data else 'Unknown Organization'
-        
-        # Create rich alert message with organization context
-        alert_message = f"""🎉 **New Service Created!**
+@router.get("/organizations/{org_id}/anomalies", response_model=List[CostAnomaly])
+async def list_cost_anomalies(
+    org_id: str,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """List the most recent cost anomalies found by the anomaly detection job"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return [CostAnomaly(**anomaly) for anomaly in get_recent_anomalies(org_id, min(max(limit, 1), 500))]
 
-{service_emoji} **Service:** {service_data['name']}
-🏢 **Organization:** {org_name}
-{platform_name}
-📊 **Type:** {service_data['service_type'].replace('_', ' ').title()}
-💰 **Monthly Cost:** ${service_data['cost']:.2f}
-📅 **Next Reminder:** {service_data['reminder_date'][:10]}
-👤 **Owner:** {service_data.get('owner_email', 'Not specified')}"""
+@router.get("/organizations/{org_id}/tags")
+async def list_tag_keys(
+    org_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """List the tag keys in use and how many active services carry each"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    ensure_analytics_counters(org_id)
+    return get_tag_keys(org_id)
 
-        # Add optional metadata if present
-        if service_data.get('instance_type'):
-            alert_message += f"\n🖥️ **Instance Type:** {service_data['instance_type'].replace('_', ' ').title()}"
-        
-        if service_data.get('description'):
-            alert_message += f"\n📝 **Description:** {service_data['description']}"
-        
-        if service_data.get('region'):
-            alert_message += f"\n🌍 **Region:** {service_data['region']}"
-        
-        if service_data.get('instance_id'):
-            alert_message += f"\n🏷️ **Instance ID:** {service_data['instance_id']}"
-        
-        if service_data.get('iam_number'):
-            alert_message += f"\n🔐 **IAM Number:** {service_data['iam_number']}"
-        
-        if service_data.get('api_quota_tokens'):
-            alert_message += f"\n🎫 **API Quota:** {service_data['api_quota_tokens']:,} tokens"
-        
-        if service_data.get('tags'):
-            tags = ', '.join(service_data['tags']) if isinstance(service_data['tags'], list) else str(service_data['tags'])
-            alert_message += f"\n🏷️ **Tags:** {tags}"
-        
-        alert_message += f"\n\n⏰ **Created:** {service_data['created_at'][:19]} UTC"
-        alert_message += f"\n🆔 **Service ID:** {service_data['id']}"
-        
-        # Send to all configured integrations (global across user's organizations)
-        success_count = 0
-        total_count = 0
-        
-        for integration_key in all_integration_keys:
-            try:
-                integration_data = redis_db.get(integration_key)
-                print(f"DEBUG: Processing integration {integration_key}: {integration_data}")
-                
-                if not integration_data or not integration_data.get('enabled', False):
-                    print(f"DEBUG: Skipping disabled integration {integration_key}")
-                    continue
-                
-                total_count += 1
-                integration_type = integration_data['type']
-                config = integration_data['config']
-                
-                print(f"DEBUG: Sending alert via {integration_type} integration")
-                
-                # Send alert based on integration type
-                success = await IntegrationService.send_alert_to_integration(
-                    integration_type=integration_type,
-                    config=config,
-                    message=alert_message,
-                    subject="🎉 New Service Created - BurnStop Alert"
-                )
-                
-                if success:
-                    success_count += 1
-                    print(f"Service creation alert sent successfully via {integration_type}")
-                else:
-                    print(f"Failed to send service creation alert via {integration_type}")
-                    
-            except Exception as e:
-                print(f"Error sending alert via integration {integration_key}: {e}")
-        
-        print(f"Global service creation alerts: {success_count}/{total_count} integrations notified successfully across user's organizations")
-        
-    except Exception as e:
-        print(f"Error sending global service creation alerts: {e}")
-        # Don't raise the exception to avoid breaking service creation
+@router.get("/organizations/{org_id}/costs/by-tag", response_model=TagCostBreakdown)
+async def get_cost_by_tag(
+    org_id: str,
+    key: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Break the monthly cost down by the values of one tag key (showback)"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    counters = load_analytics_counters(org_id)
+    values = get_cost_by_tag_value(org_id, key)
+    tagged_services = get_tag_keys(org_id).get(key.strip().lower(), 0)
+    
+    return TagCostBreakdown(
+        key=key.strip().lower(),
+        values=values,
+        untagged_cost=round(max(counters["total_monthly_cost"] - sum(item["cost"] for item in values), 0), 2),
+        untagged_services=max(counters["total_services"] - tagged_services, 0)
+    )
 
-async def send_service_deletion_alert(org_id: str, service_data: dict, current_user: User):
-    """Send alerts to all configured integrations for the user when a service is deleted (global across all organizations)"""
-    try:
-        print(f"DEBUG: Starting global service deletion alert for user {current_user.email}")
-        
-        # Get all integrations for ALL organizations that this user belongs to
-        all_integration_keys = []
-        
-        for user_org_id in current_user.organizations:
-            try:
-                org_integration_keys = redis_db.keys(f"integration:{user_org_id}:*")
-                all_integration_keys.extend(org_integration_keys)
-                print(f"DEBUG: Found {len(org_integration_keys)} integrations for org {user_org_id}")
-            except Exception as e:
-                print(f"DEBUG: Error getting integration keys for org {user_org_id}: {e}")
-        
-        print(f"DEBUG: Total global integration keys found for deletion: {len(all_integration_keys)}")
-        
-        if not all_integration_keys:
-            print(f"DEBUG: No integrations configured for user {current_user.email} across all organizations")
-            print(f"DEBUG: User organizations: {current_user.organizations}")
-            return
-        
-        # Format service metadata for the deletion alert
-        platform_emojis = {
-            "aws": "🟠 Amazon Web Services",
-            "gcp": "🔵 Google Cloud Platform", 
-            "azure": "🔷 Microsoft Azure",
-            "other": "⚡ Other Platform"
-        }
-        
-        service_type_emojis = {
-            "ec2": "🖥️", "s3": "��️", "rds": "🗃️", "lambda": "⚡", "eks": "☸️",
-            "compute_engine": "🖥️", "cloud_storage": "🗄️", "cloud_sql": "🗃️",
-            "virtual_machines": "🖥️", "blob_storage": "🗄️", "sql_database": "🗃️",
-            "cloud": "☁️", "api": "🔌", "database": "🗃️", "storage": "🗄️"
-        }
-        
-        platform_name = platform_emojis.get(service_data["platform"], f"⚡ {service_data['platform'].title()}")
-        service_emoji = service_type_emojis.get(service_data["service_type"], "📦")
-        
-        # Get organization name for context
-        org_key = f"org:{org_id}"
-        org_data = redis_db.get(org_key)
-        org_name = org_data.get('name', 'Unknown Organization') if org_data else 'Unknown Organization'
-        
-        # Create rich deletion alert message with organization context
-        alert_message = f"""🗑️ **Service Deleted!**
+@router.get("/organizations/{org_id}/services/top", response_model=List[Service])
+async def list_top_services(
+    org_id: str,
+    n: int = 10,
+    platform: Optional[CloudPlatform] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """List the most expensive active services, optionally on a single platform"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    ensure_analytics_counters(org_id)
+    top = get_top_service_ids(org_id, min(max(n, 1), 100), platform.value if platform else None)
+    services = redis_db.mget([f"service:{service_id}" for service_id, _ in top])
+    return [Service(**service_data) for service_data in services if service_data]
 
-{service_emoji} **Service:** {service_data['name']}
-🏢 **Organization:** {org_name}
-{platform_name}
-📊 **Type:** {service_data['service_type'].replace('_', ' ').title()}
-💰 **Monthly Cost Saved:** ${service_data['cost']:.2f}
-👤 **Owner:** {service_data.get('owner_email', 'Not specified')}"""
+@router.get("/organizations/{org_id}/services/search", response_model=ServiceSearchResults)
+async def search_organization_services(
+    org_id: str,
+    q: str,
+    offset: int = 0,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Search active services by name, description, owner email, instance id and region
 
-        # Add optional metadata if present
-        if service_data.get('instance_type'):
-            alert_message += f"\n🖥️ **Instance Type:** {service_data['instance_type'].replace('_', ' ').title()}"
-        
-        if service_data.get('description'):
-            alert_message += f"\n📝 **Description:** {service_data['description']}"
-        
-        if service_data.get('region'):
-            alert_message += f"\n🌍 **Region:** {service_data['region']}"
-        
-        if service_data.get('instance_id'):
-            alert_message += f"\n🏷️ **Instance ID:** {service_data['instance_id']}"
-        
-        if service_data.get('iam_number'):
-            alert_message += f"\n🔐 **IAM Number:** {service_data['iam_number']}"
-        
-        if service_data.get('tags'):
-            tags = ', '.join(service_data['tags']) if isinstance(service_data['tags'], list) else str(service_data['tags'])
-            alert_message += f"\n🏷️ **Tags:** {tags}"
-        
-        alert_message += f"\n\n🗑️ **Deleted:** {service_data['updated_at'][:19]} UTC"
-        alert_message += f"\n🆔 **Service ID:** {service_data['id']}"
-        alert_message += f"\n⚠️ **Status:** Marked for deletion"
-        
-        # Send to all configured integrations (global across user's organizations)
-        success_count = 0
-        total_count = 0
-        
-        for integration_key in all_integration_keys:
-            try:
-                integration_data = redis_db.get(integration_key)
-                print(f"DEBUG: Processing deletion integration {integration_key}: {integration_data}")
-                
-                if not integration_data or not integration_data.get('enabled', False):
-                    print(f"DEBUG: Skipping disabled integration {integration_key}")
-                    continue
-                
-                total_count += 1
-                integration_type = integration_data['type']
-                config = integration_data['config']
-                
-                print(f"DEBUG: Sending deletion alert via {integration_type} integration")
-                
-                # Send alert based on integration type
-                success = await IntegrationService.send_alert_to_integration(
-                    integration_type=integration_type,
-                    config=config,
-                    message=alert_message,
-                    subject="🗑️ Service Deleted - BurnStop Alert"
-                )
-                
-                if success:
-                    success_count += 1
-                    print(f"Service deletion alert sent successfully via {integration_type}")
-                else:
-                    print(f"Failed to send service deletion alert via {integration_type}")
-                    
-            except Exception as e:
-                print(f"Error sending deletion alert via integration {integration_key}: {e}")
-        
-        print(f"Global service deletion alerts: {success_count}/{total_count} integrations notified successfully across user's organizations")
-        
+    Every word of the query must match a word of the service or the start of
+    one; hits are ranked by which fields matched.
+    """
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), 100)
+    
+    ensure_analytics_counters(org_id)
+    total, hits = search_services(org_id, q, offset, limit, revision=get_org_revision(org_id))
+    services = redis_db.mget([f"service:{service_id}" for service_id, _ in hits])
+    
+    return ServiceSearchResults(
+        total=total,
+        offset=offset,
+        limit=limit,
+        hits=[
+            {"score": round(score, 2), "service": Service(**service_data)}
+            for (_, score), service_data in zip(hits, services)
+            if service_data
+        ]
+    )
+
+@router.get("/organizations/{org_id}/services/by-tag", response_model=List[Service])
+async def list_services_by_tag(
+    org_id: str,
+    key: str,
+    value: str = "",
+    current_user: User = Depends(get_current_user)
+):
+    """List the active services tagged key=value"""
+    # Check if user has access to this organization
+    if org_id not in current_user.organizations:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    ensure_analytics_counters(org_id)
+    service_ids = get_tagged_service_ids(org_id, key, value)
+    services = redis_db.mget([f"service:{service_id}" for service_id in service_ids])
+    return [Service(**service_data) for service_data in services if service_data and service_data.get("status") == "active"]
+
+@router.post("/reminder-alerts")
+async def trigger_reminder_alerts(
+    days_ahead: int = 7,
+    current_user: User = Depends(get_current_user)
+):
+    """Manually send a digest of the reminders coming up in the next days
+
+    Reminders are alerted automatically when they fall due by the worker's
+    reminder scheduler (utils/reminders.py); this only sends an early overview.
+    """
+    try:
+        queue_reminder_alerts(current_user, days_ahead)
+        return {"message": f"Reminder alerts queued for upcoming reminders in the next {days_ahead} days"}
     except Exception as e:
-        print(f"Error sending global service deletion alerts: {e}")
-        # Don't raise the exception to avoid breaking service deletion
+        print(f"Error triggering reminder alerts: {e}")
+        raise HTTPException(status_code=500, detail="Failed to send reminder alerts")
 
-async def send_reminder_alerts(current_user: User, days_ahead: int = 7):
-    """Send alerts for upcoming service reminders (global across all user's organizations)"""
+def queue_reminder_alerts(current_user: User, days_ahead: int = 7):
+    """Queue alerts for upcoming service reminders (global across all user's organizations)"""
     try:
         print(f"DEBUG: Starting global reminder alerts for user {current_user.email} - checking {days_ahead} days ahead")
         
-        # Get all integrations for ALL organizations that this user belongs to
-        all_integration_keys = []
+        # Get the enabled integrations of ALL organizations that this user belongs to
+        targets = load_alert_targets(current_user.organizations)
+        print(f"DEBUG: Total global integrations found for reminders: {len(targets)}")
         
-        for user_org_id in current_user.organizations:
-            try:
-                org_integration_keys = redis_db.keys(f"integration:{user_org_id}:*")
-                all_integration_keys.extend(org_integration_keys)
-                print(f"DEBUG: Found {len(org_integration_keys)} integrations for org {user_org_id}")
-            except Exception as e:
-                print(f"DEBUG: Error getting integration keys for org {user_org_id}: {e}")
-        
-        print(f"DEBUG: Total global integration keys found for reminders: {len(all_integration_keys)}")
-        
-        if not all_integration_keys:
+        if not targets:
             print(f"DEBUG: No integrations configured for user {current_user.email} across all organizations")
             return
         
@@ -682,6 +631,11 @@ async def send_reminder_alerts(current_user: User, days_ahead: int = 7):
                         }
                         all_upcoming_reminders.append(reminder_info)
                         
+                        # Let open dashboards show the reminder without polling; "reminder.due" (and
+                        # its outbound webhook event) is only sent by the scheduler once it falls due
+                        event = reminder_event(service_id, service_data, reminder_timestamp, current_timestamp)
+                        publish_change(None, user_org_id, "reminder.upcoming", event)
+                        
             except Exception as e:
                 print(f"DEBUG: Error getting reminders for org {user_org_id}: {e}")
         
@@ -694,97 +648,9 @@ async def send_reminder_alerts(current_user: User, days_ahead: int = 7):
         
         print(f"DEBUG: Found {len(all_upcoming_reminders)} upcoming reminders")
         
-        # Create rich reminder alert message
-        alert_message = f"""⏰ **Upcoming Service Reminders**
-
-You have {len(all_upcoming_reminders)} service reminder(s) in the next {days_ahead} days:
-
-"""
-        
-        platform_emojis = {
-            "aws": "🟠", "gcp": "🔵", "azure": "🔷", "other": "⚡"
-        }
-        
-        service_type_emojis = {
-            "ec2": "🖥️", "s3": "🗄️", "rds": "🗃️", "lambda": "⚡", "eks": "☸️",
-            "compute_engine": "🖥️", "cloud_storage": "🗄️", "cloud_sql": "🗃️",
-            "virtual_machines": "🖥️", "blob_storage": "🗄️", "sql_database": "🗃️",
-            "cloud": "☁️", "api": "🔌", "database": "🗃️", "storage": "🗄️"
-        }
-        
-        total_cost = 0
-        
-        for i, reminder in enumerate(all_upcoming_reminders, 1):
-            service_data = reminder['service_data']
-            platform_emoji = platform_emojis.get(service_data["platform"], "⚡")
-            service_emoji = service_type_emojis.get(service_data["service_type"], "📦")
-            total_cost += service_data.get('cost', 0)
-            
-            days_until = reminder['days_until']
-            urgency_indicator = "🔴" if days_until <= 1 else "🟡" if days_until <= 3 else "🟢"
-            
-            alert_message += f"""
-{urgency_indicator} **{i}. {service_data['name']}**
-   {service_emoji} {service_data['service_type'].replace('_', ' ').title()} • {platform_emoji} {service_data['platform'].upper()}
-   🏢 {reminder['org_name']}
-   💰 ${service_data['cost']:.2f}/month
-   📅 Due in {days_until} day(s) - {datetime.fromtimestamp(reminder['reminder_timestamp']).strftime('%Y-%m-%d')}"""
-   
-            # Add instance type if available
-            if service_data.get('instance_type'):
-                alert_message += f"\n   🖥️ {service_data['instance_type'].replace('_', ' ').title()}"
-            
-            # Add region if available  
-            if service_data.get('region'):
-                alert_message += f"\n   🌍 {service_data['region']}"
-            
-            alert_message += f"""
-"""
-        
-        alert_message += f"""
-📊 **Summary:**
-• Total services: {len(all_upcoming_reminders)}
-• Total monthly cost: ${total_cost:.2f}
-• Most urgent: {all_upcoming_reminders[0]['days_until']} day(s)
-
-🎯 **Action Required:** Review and update these services to avoid cost overruns!
-"""
-        
-        # Send to all configured integrations
-        success_count = 0
-        total_count = 0
-        
-        for integration_key in all_integration_keys:
-            try:
-                integration_data = redis_db.get(integration_key)
-                
-                if not integration_data or not integration_data.get('enabled', False):
-                    continue
-                
-                total_count += 1
-                integration_type = integration_data['type']
-                config = integration_data['config']
-                
-                print(f"DEBUG: Sending reminder alert via {integration_type} integration")
-                
-                # Send alert based on integration type
-                success = await IntegrationService.send_alert_to_integration(
-                    integration_type=integration_type,
-                    config=config,
-                    message=alert_message,
-                    subject=f"⏰ {len(all_upcoming_reminders)} Upcoming Service Reminders - BurnStop Alert"
-                )
-                
-                if success:
-                    success_count += 1
-                    print(f"Reminder alert sent successfully via {integration_type}")
-                else:
-                    print(f"Failed to send reminder alert via {integration_type}")
-                    
-            except Exception as e:
-                print(f"Error sending reminder alert via integration {integration_key}: {e}")
-        
-        print(f"Global reminder alerts: {success_count}/{total_count} integrations notified successfully")
+        # Queue one digest for the integrations of all the user's organizations
+        message, subject = build_reminder_alert(all_upcoming_reminders, days_ahead)
+        enqueue_notification(None, current_user.organizations, message, subject, kind="reminders")
         
     except Exception as e:
         print(f"Error sending global reminder alerts: {e}")
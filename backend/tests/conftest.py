@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:
+    fakeredis = None
+
+if fakeredis is not None:
+    # Swap in an in-memory Redis before any module registers its Lua scripts on the clients
+    from utils.redis_db import redis_db
+
+    _server = fakeredis.FakeServer()
+    redis_db.redis_client = fakeredis.FakeRedis(server=_server, decode_responses=True)
+    redis_db.async_client = fakeredis.aioredis.FakeRedis(server=_server, decode_responses=True)
+
+    @pytest.fixture(autouse=True)
+    def empty_redis():
+        redis_db.redis_client.flushall()
+        # Async connections belong to one event loop, and each test runs its own
+        redis_db.async_client = fakeredis.aioredis.FakeRedis(server=_server, decode_responses=True)
+        yield
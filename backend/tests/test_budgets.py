@@ -0,0 +1,64 @@
+import calendar
+
+import pytest
+
+pytest.importorskip("fakeredis")
+
+from utils import budgets
+from utils.redis_db import redis_db
+
+DAY = 24 * 60 * 60
+
+# June has 30 days, so a $300/month run rate burns $10 a day
+MONTH_START = calendar.timegm((2026, 6, 1, 0, 0, 0))
+
+def service(cost):
+    return {"status": "active", "cost": cost, "platform": "aws", "service_type": "ec2"}
+
+def change_cost(old_cost, new_cost, now):
+    """Apply a cost change the way a service mutation does: accrual first, then the counter delta"""
+    pipe = redis_db.pipeline()
+    budgets.accrue_budget_burn(pipe, "org1", service(old_cost), service(new_cost), now=now)
+    pipe.hset("analytics_counters:org1", "total_cost", new_cost)
+    pipe.execute()
+
+def envelope(spent_ratio, projected_ratio=0.0):
+    return {"scope": "total", "spent_ratio": spent_ratio, "projected_ratio": projected_ratio}
+
+def crossed_thresholds(spent_ratio):
+    status = {"month": "2026-06", "envelopes": [envelope(spent_ratio)]}
+    return [alert["threshold"] for alert in budgets.claim_budget_alerts("org1", status)]
+
+def test_spend_accrues_at_the_rate_in_effect_before_each_change():
+    redis_db.redis_client.hset("analytics_counters:org1", "total_cost", 300)
+    redis_db.redis_client.hset("budget_burn:org1:2026-06", "total:at", MONTH_START)
+
+    change_cost(300, 600, MONTH_START + 10 * DAY)
+
+    status = budgets.get_budget_status("org1", {"budget": 1000}, now=MONTH_START + 20 * DAY)
+    [total] = status["envelopes"]
+    assert status["month"] == "2026-06"
+    assert total["spent"] == pytest.approx(100 + 200)
+    assert total["projected"] == pytest.approx(300 + 200)
+
+def test_accrual_starts_at_the_month_boundary():
+    redis_db.redis_client.hset("analytics_counters:org1", "total_cost", 300)
+    redis_db.redis_client.hset("budget_burn:org1:2026-06", "total:at", MONTH_START - 5 * DAY)
+
+    change_cost(300, 0, MONTH_START + DAY)
+
+    assert float(redis_db.hgetall("budget_burn:org1:2026-06")["total:accrued"]) == pytest.approx(10)
+
+def test_threshold_fires_once_per_crossing():
+    assert crossed_thresholds(0.82) == [0.5, 0.8]
+    assert crossed_thresholds(0.85) == []
+
+def test_threshold_rearms_only_past_the_hysteresis_band():
+    crossed_thresholds(0.82)
+
+    # Wobbling just under the threshold doesn't re-arm it
+    assert crossed_thresholds(0.78) == []
+    assert crossed_thresholds(0.82) == []
+
+    assert crossed_thresholds(0.8 - budgets.HYSTERESIS - 0.01) == []
+    assert crossed_thresholds(0.82) == [0.8]
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("fakeredis")
+
+from utils import dedup
+
+def alert_event():
+    return {"kind": "alert", "subject": "Budget", "message": "Over  budget", "created_at": "2026-01-01T00:00:00"}
+
+def test_reprocessing_the_same_entry_is_not_a_duplicate():
+    targets = [{"id": "integration:org1:slack"}]
+
+    fresh, duplicates = dedup.claim_first_delivery(targets, alert_event(), "1-0")
+    assert fresh == targets and duplicates == []
+
+    # The worker crashed before acknowledging; the entry is claimed and processed again
+    fresh, duplicates = dedup.claim_first_delivery(targets, alert_event(), "1-0")
+    assert fresh == targets and duplicates == []
+
+def test_another_entry_with_the_same_alert_is_suppressed():
+    targets = [{"id": "integration:org1:slack"}]
+    dedup.claim_first_delivery(targets, alert_event(), "1-0")
+
+    fresh, duplicates = dedup.claim_first_delivery(targets, alert_event(), "2-0")
+    assert fresh == [] and duplicates == targets
+    assert dedup.get_suppressed_counts("org1") == {"alert": 1}
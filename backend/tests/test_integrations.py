@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+import pytest
+
+pytest.importorskip("fakeredis")
+
+from main import app
+from models.user import User
+from routers.auth import get_current_user
+from utils import rate_limits
+from utils.redis_db import redis_db
+
+SLACK_URL = "https://hooks.slack.com/services/T1/B1/secret"
+
+@pytest.fixture
+def owner():
+    user = User(id="user1", email="owner@example.com", organizations=["org1"], created_at="2026-01-01T00:00:00")
+    redis_db.set("org:org1", {"id": "org1", "name": "Acme", "owner_id": user.id})
+    redis_db.set("integration:org1:slack", {
+        "id": "i1", "organization_id": "org1", "type": "slack",
+        "config": {"webhook_url": SLACK_URL}, "enabled": True,
+    })
+    app.dependency_overrides[get_current_user] = lambda: user
+    yield user
+    app.dependency_overrides.clear()
+
+def post(path: str, times: int = 1) -> list:
+    """POST to the app `times` times in one event loop"""
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return [await client.post(path, json={}) for _ in range(times)]
+    return asyncio.run(send())
+
+def test_rate_limited_test_message_returns_429(owner, monkeypatch):
+    async def slack_429(url, payload, headers=None):
+        return httpx.Response(429, headers={"Retry-After": "30"}, request=httpx.Request("POST", url))
+    monkeypatch.setattr(rate_limits, "post_json", slack_429)
+
+    # The call that gets the 429, then one refused by the blocked bucket without reaching Slack
+    for response in post("/integrations/organizations/org1/types/slack/test", times=2):
+        assert response.status_code == 429
+        assert 29 <= int(response.headers["Retry-After"]) <= 30
+
+def test_test_message_is_sent(owner, monkeypatch):
+    async def slack_ok(url, payload, headers=None):
+        return httpx.Response(200, request=httpx.Request("POST", url))
+    monkeypatch.setattr(rate_limits, "post_json", slack_ok)
+
+    [response] = post("/integrations/organizations/org1/types/slack/test")
+    assert response.status_code == 200
@@ -0,0 +1,80 @@
+import pytest
+import redis
+
+pytest.importorskip("fakeredis")
+
+from utils.leases import Lease, LeaseLost, WorkGroup, rendezvous_owner, run_exclusively
+from utils.redis_db import redis_db
+
+def test_lease_is_exclusive_and_renewal_keeps_the_token():
+    first, second = Lease("job", "a"), Lease("job", "b")
+
+    assert first.acquire() and first.token == 1
+    assert not second.acquire() and second.token is None
+    assert first.acquire() and first.token == 1
+
+    first.release()
+    assert second.acquire() and second.token == 2
+
+def test_lapsed_holder_is_fenced_off():
+    first, second = Lease("job", "a"), Lease("job", "b")
+    first.acquire()
+
+    # The lease expires while its holder is paused, and someone else takes it
+    redis_db.redis_client.delete(first.key)
+    assert second.acquire() and second.token > first.token
+
+    with redis_db.redis_client.pipeline() as pipe:
+        with pytest.raises(LeaseLost):
+            first.guard(pipe)
+
+    # Releasing the stale grant leaves the new holder's lease alone
+    first.release()
+    assert redis_db.redis_client.get(second.key) == second.value
+
+def test_guarded_transaction_fails_once_the_lease_changes_hands():
+    lease = Lease("job", "a")
+    lease.acquire()
+
+    with redis_db.redis_client.pipeline() as pipe:
+        lease.guard(pipe)
+        redis_db.redis_client.set(lease.key, "b 99")
+        pipe.multi()
+        pipe.set("written", 1)
+        with pytest.raises(redis.WatchError):
+            pipe.execute()
+    assert redis_db.redis_client.get("written") is None
+
+def test_run_exclusively_skips_while_another_replica_runs():
+    holder = Lease("nightly", "other", ttl_seconds=60)
+    holder.acquire()
+    assert run_exclusively("nightly", 60, lambda: "ran") is None
+
+    holder.release()
+    assert run_exclusively("nightly", 60, lambda: "ran") == "ran"
+    assert redis_db.redis_client.get(holder.key) is None
+
+def test_rendezvous_owner_moves_only_the_leaving_members_units():
+    members = ["a", "b", "c"]
+    units = [f"org{index}" for index in range(200)]
+    before = {unit: rendezvous_owner(unit, members) for unit in units}
+    assert set(before.values()) == set(members)
+
+    after = {unit: rendezvous_owner(unit, ["a", "c"]) for unit in units}
+    assert all(after[unit] == owner for unit, owner in before.items() if owner != "b")
+    assert rendezvous_owner("org1", []) is None
+
+def test_work_group_drops_members_that_stop_heartbeating():
+    first, second = WorkGroup("background", "a"), WorkGroup("background", "b")
+    first.heartbeat()
+    assert second.heartbeat() and second.members == ["a", "b"]
+
+    # "a" last heartbeated longer ago than the membership TTL
+    redis_db.redis_client.zadd(first.key, {"a": 0})
+    assert second.heartbeat() and second.members == ["b"]
+    assert all(second.owns(f"org{index}") for index in range(20))
+
+    first.heartbeat()
+    assert second.heartbeat() and second.members == ["a", "b"]
+    second.leave()
+    assert first.heartbeat() and first.members == ["a"]
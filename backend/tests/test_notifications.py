@@ -0,0 +1,90 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+pytest.importorskip("fakeredis")
+
+from utils import notifications
+from utils.redis_db import redis_db
+
+TARGET = "integration:org1:slack"
+
+@pytest.fixture
+def delivery(monkeypatch):
+    """An enabled Slack integration whose deliveries end with the status the test sets"""
+    redis_db.set(TARGET, {"type": "slack", "enabled": True, "config": {"webhook_url": "https://hooks.slack.com/services/T1/B1/x"}})
+    notifications.ensure_consumer_group()
+    outcome = {"status": "failed"}
+
+    async def dispatch_alert(targets, message, subject, kind="alert"):
+        result = {"target": TARGET, "type": "slack", "success": outcome["status"] == "sent", "status": outcome["status"]}
+        if outcome["status"] == "rate_limited":
+            result["retry_after"] = 60
+        return [result for target in targets if target["id"] == TARGET]
+
+    monkeypatch.setattr(notifications, "dispatch_alert", dispatch_alert)
+    return outcome
+
+def deliver_next(**event):
+    """Queue a notification, read it as a consumer and process it"""
+    notifications.enqueue_notification(None, ["org1"], "Over budget", "Budget", **event)
+    [(_, entries)] = redis_db.redis_client.xreadgroup(
+        notifications.CONSUMER_GROUP, "test", {notifications.NOTIFICATION_STREAM: ">"}, count=1
+    )
+    entry_id, fields = entries[0]
+    asyncio.run(notifications.process_notification(entry_id, fields))
+    return entry_id
+
+def queued_retries():
+    return [json.loads(event) for event in redis_db.redis_client.zrange(notifications.RETRY_QUEUE, 0, -1)]
+
+def test_failed_delivery_is_retried_and_acknowledged(delivery):
+    deliver_next()
+
+    [retry] = queued_retries()
+    assert retry["attempt"] == 1 and retry["targets"] == [TARGET] and retry["deduplicated"]
+    assert redis_db.redis_client.keys("alert_dedup:*")
+    assert redis_db.redis_client.xpending(notifications.NOTIFICATION_STREAM, notifications.CONSUMER_GROUP)["pending"] == 0
+
+def test_rate_limited_delivery_is_held_without_using_an_attempt(delivery):
+    delivery["status"] = "rate_limited"
+    deliver_next()
+
+    [(held, due)] = redis_db.redis_client.zrange(notifications.RETRY_QUEUE, 0, -1, withscores=True)
+    assert json.loads(held)["attempt"] == 0
+    assert due >= time.time() + 59
+
+def test_last_attempt_is_dead_lettered_and_releases_its_claim(delivery):
+    deliver_next(attempt=notifications.MAX_ATTEMPTS - 1)
+
+    assert queued_retries() == []
+    [(_, fields)] = redis_db.redis_client.xrange(notifications.DEAD_LETTER_STREAM)
+    dead = json.loads(fields["event"])
+    assert dead["attempt"] == notifications.MAX_ATTEMPTS
+    assert dead["failures"] == [{"target": TARGET, "status": "failed", "error": None}]
+    # The alert never arrived, so the same alert queued again isn't suppressed as a duplicate
+    assert not redis_db.redis_client.keys("alert_dedup:*")
+
+def test_replayed_dead_letter_gets_a_fresh_retry_budget(delivery):
+    deliver_next(attempt=notifications.MAX_ATTEMPTS - 1)
+    delivery["status"] = "sent"
+
+    assert notifications.replay_dead_letters() == 1
+    assert redis_db.redis_client.xlen(notifications.DEAD_LETTER_STREAM) == 0
+    [(_, entries)] = redis_db.redis_client.xreadgroup(
+        notifications.CONSUMER_GROUP, "test", {notifications.NOTIFICATION_STREAM: ">"}
+    )
+    replayed = json.loads(entries[-1][1]["event"])
+    assert replayed["attempt"] == 0 and replayed["targets"] == [TARGET]
+
+def test_due_retries_are_promoted_once(delivery):
+    deliver_next()
+    redis_db.redis_client.zadd(notifications.RETRY_QUEUE, {redis_db.redis_client.zrange(notifications.RETRY_QUEUE, 0, 0)[0]: 0})
+    stream_length = redis_db.redis_client.xlen(notifications.NOTIFICATION_STREAM)
+
+    assert notifications.promote_due_retries() == 1
+    assert notifications.promote_due_retries() == 0
+    assert redis_db.redis_client.xlen(notifications.NOTIFICATION_STREAM) == stream_length + 1
+    assert queued_retries() == []
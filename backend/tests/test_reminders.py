@@ -0,0 +1,93 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("fakeredis")
+
+from utils import reminders
+from utils.leases import Lease, LeaseLost, WorkGroup
+from utils.notifications import NOTIFICATION_STREAM
+from utils.redis_db import redis_db
+
+NOW = time.time()
+
+def add_service(org_id, service_id, due_in, status="active"):
+    redis_db.set(f"service:{service_id}", {
+        "name": service_id, "status": status, "platform": "aws", "service_type": "ec2", "cost": 10.0
+    })
+    redis_db.set(f"org:{org_id}", {"name": org_id})
+    reminders.set_reminder(None, org_id, service_id, NOW + due_in)
+
+def queued_reminder_alerts():
+    return [
+        json.loads(fields["event"]) for _, fields in redis_db.redis_client.xrange(NOTIFICATION_STREAM)
+        if json.loads(fields["event"])["kind"] == "reminders"
+    ]
+
+def test_due_reminders_are_popped_from_the_set_and_the_index():
+    add_service("org1", "s1", -60)
+    add_service("org1", "s2", 3600)
+    add_service("org2", "s3", -30)
+
+    alerted, next_due = reminders.run_due_reminders(NOW)
+
+    assert alerted == 2
+    assert next_due == pytest.approx(NOW + 3600)
+    assert redis_db.redis_client.zrange("reminders:org1", 0, -1) == ["s2"]
+    assert redis_db.redis_client.zrange("reminders:due", 0, -1) == ["org1:s2"]
+    assert sorted(event["org_ids"][0] for event in queued_reminder_alerts()) == ["org1", "org2"]
+
+    # Nothing is due any more, so a second pass sends nothing
+    assert reminders.run_due_reminders(NOW) == (0, pytest.approx(NOW + 3600))
+
+def test_inactive_services_are_popped_without_an_alert():
+    add_service("org1", "s1", -60, status="inactive")
+
+    assert reminders.run_due_reminders(NOW) == (0, None)
+    assert redis_db.redis_client.zcard("reminders:org1") == 0
+    assert queued_reminder_alerts() == []
+
+def test_stale_index_entries_are_resynced_from_the_org_set():
+    add_service("org1", "moved", -60)
+    add_service("org1", "gone", -60)
+    # The org sets were changed without the index, e.g. by a rebuild racing a user
+    redis_db.redis_client.zadd("reminders:org1", {"moved": NOW + 600})
+    redis_db.redis_client.zrem("reminders:org1", "gone")
+
+    assert reminders.run_due_reminders(NOW) == (0, pytest.approx(NOW + 600))
+    assert redis_db.redis_client.zrange("reminders:due", 0, -1, withscores=True) == [("org1:moved", pytest.approx(NOW + 600))]
+
+def test_rebuild_copies_the_org_sets_and_drops_stale_shards():
+    redis_db.redis_client.zadd("reminders:org1", {"s1": NOW - 60})
+    redis_db.redis_client.zadd("reminders:due:3", {"org9:old": NOW})
+
+    assert reminders.ensure_reminder_index()
+    assert redis_db.redis_client.zrange("reminders:due", 0, -1) == ["org1:s1"]
+    assert not redis_db.redis_client.exists("reminders:due:3")
+    assert not redis_db.redis_client.keys("reminders:due:rebuild:*")
+
+def test_workers_of_a_group_split_the_organizations():
+    for index in range(20):
+        add_service(f"org{index}", f"s{index}", -60)
+    first, second = WorkGroup("background", "a"), WorkGroup("background", "b")
+    first.heartbeat()
+    second.heartbeat()
+    first.heartbeat()
+
+    sent_first, _ = reminders.run_due_reminders(NOW, group=first)
+    sent_second, _ = reminders.run_due_reminders(NOW, group=second)
+
+    assert sent_first and sent_second
+    assert sent_first + sent_second == 20
+    assert redis_db.redis_client.zcard("reminders:due") == 0
+
+def test_a_scheduler_that_lost_its_lease_pops_nothing():
+    add_service("org1", "s1", -60)
+    lease = Lease("reminder-scheduler", "a")
+    lease.acquire()
+    redis_db.redis_client.delete(lease.key)
+
+    with pytest.raises(LeaseLost):
+        reminders.run_due_reminders(NOW, lease=lease)
+    assert redis_db.redis_client.zcard("reminders:org1") == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from utils.routing import RuleError, compile_rules, route_alert
+
+def matches(rules, **attributes):
+    return compile_rules(rules)(attributes)
+
+def test_without_rules_every_alert_matches():
+    assert compile_rules(None) is None
+    assert compile_rules([]) is None
+
+def test_precedence_of_not_and_or():
+    rule = "platform == aws and cost > 500 or not region == us-east-1"
+    assert matches(rule, platform="aws", cost=600, region="us-east-1")
+    assert not matches(rule, platform="aws", cost=100, region="us-east-1")
+    assert matches(rule, platform="gcp", cost=100, region="eu-west-1")
+    assert not matches("platform == aws and (cost > 500 or region == eu-west-1)", platform="aws", cost=100, region="us-east-1")
+
+def test_text_comparisons_ignore_case_and_accept_quotes():
+    assert matches("name == 'Main DB'", name="main db")
+    assert matches('kind in (service.deleted, "budget")', kind="budget")
+    assert matches("platform != aws", platform="gcp")
+
+def test_tag_attributes():
+    assert matches("tag.team == data", tags={"team": "data"})
+    assert not matches("tag.team == data", tags={})
+
+def test_numeric_in_compares_numbers():
+    assert matches("cost in (500, 1000)", cost=500.0)
+    assert matches("cost in ($500, 1000)", cost="1000")
+    assert not matches("cost in (500, 1000)", cost=750)
+
+def test_textual_comparison_matches_numbers_written_differently():
+    assert matches("tag.tier == 1", tags={"tier": "1.0"})
+
+def test_missing_attribute_never_matches():
+    assert not matches("cost > 0", platform="aws")
+    assert not matches("region != us-east-1", platform="aws")
+
+def test_any_rule_in_a_list_may_match():
+    rules = ["platform == aws", "cost >= 1000"]
+    assert matches(rules, platform="gcp", cost=1000)
+    assert not matches(rules, platform="gcp", cost=10)
+
+@pytest.mark.parametrize("rule", [
+    "platform ==",
+    "owner == alice",
+    "platform > aws",
+    "cost > lots",
+    "cost in (500, many)",
+    "(platform == aws",
+    "platform == aws extra",
+    "platform == aws ;",
+    "tag. == x",
+])
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(RuleError):
+        compile_rules(rule)
+
+def test_routing_keeps_matching_targets_and_skips_digests():
+    targets = [
+        {"id": "integration:org1:slack", "config": {"rules": "org == org1 and platform == aws"}, "updated_at": "1"},
+        {"id": "integration:org1:email", "config": {"rules": "platform == gcp"}, "updated_at": "1"},
+        {"id": "integration:org1:discord", "config": {}, "updated_at": "1"},
+    ]
+    event = {"kind": "service.created", "attributes": {"platform": "aws"}}
+
+    routed = route_alert(targets, event)
+    assert [target["id"] for target in routed] == ["integration:org1:slack", "integration:org1:discord"]
+    assert route_alert(targets, dict(event, kind="digest")) == targets
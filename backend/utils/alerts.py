@@ -0,0 +1,191 @@
+from datetime import datetime
+from typing import List, Tuple
+
+from utils.redis_db import redis_db
+from utils.tags import format_tags
+
+def build_service_creation_alert(org_id: str, service_data: dict) -> Tuple[str, str]:
+    """Build the message and subject announcing a new service"""
+    # Format service metadata for the alert
+    platform_emojis = {
+        "aws": "🟠 Amazon Web Services",
+        "gcp": "🔵 Google Cloud Platform", 
+        "azure": "🔷 Microsoft Azure",
+        "other": "⚡ Other Platform"
+    }
+    
+    service_type_emojis = {
+        "ec2": "🖥️", "s3": "🗄️", "rds": "🗃️", "lambda": "⚡", "eks": "☸️",
+        "compute_engine": "🖥️", "cloud_storage": "🗄️", "cloud_sql": "🗃️",
+        "virtual_machines": "🖥️", "blob_storage": "🗄️", "sql_database": "🗃️",
+        "cloud": "☁️", "api": "🔌", "database": "🗃️", "storage": "🗄️"
+    }
+    
+    platform_name = platform_emojis.get(service_data["platform"], f"⚡ {service_data['platform'].title()}")
+    service_emoji = service_type_emojis.get(service_data["service_type"], "📦")
+    
+    # Get organization name for context
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    org_name = org_data.get('name', 'Unknown Organization') if org_data else 'Unknown Organization'
+    
+    # Create rich alert message with organization context
+    alert_message = f"""🎉 **New Service Created!**
+
+{service_emoji} **Service:** {service_data['name']}
+🏢 **Organization:** {org_name}
+{platform_name}
+📊 **Type:** {service_data['service_type'].replace('_', ' ').title()}
+💰 **Monthly Cost:** ${service_data['cost']:.2f}
+📅 **Next Reminder:** {service_data['reminder_date'][:10]}
+👤 **Owner:** {service_data.get('owner_email', 'Not specified')}"""
+
+    # Add optional metadata if present
+    if service_data.get('instance_type'):
+        alert_message += f"\n🖥️ **Instance Type:** {service_data['instance_type'].replace('_', ' ').title()}"
+    
+    if service_data.get('description'):
+        alert_message += f"\n📝 **Description:** {service_data['description']}"
+    
+    if service_data.get('region'):
+        alert_message += f"\n🌍 **Region:** {service_data['region']}"
+    
+    if service_data.get('instance_id'):
+        alert_message += f"\n🏷️ **Instance ID:** {service_data['instance_id']}"
+    
+    if service_data.get('iam_number'):
+        alert_message += f"\n🔐 **IAM Number:** {service_data['iam_number']}"
+    
+    if service_data.get('api_quota_tokens'):
+        alert_message += f"\n🎫 **API Quota:** {service_data['api_quota_tokens']:,} tokens"
+    
+    if service_data.get('tags'):
+        tags = format_tags(service_data['tags'])
+        alert_message += f"\n🏷️ **Tags:** {tags}"
+    
+    alert_message += f"\n\n⏰ **Created:** {service_data['created_at'][:19]} UTC"
+    alert_message += f"\n🆔 **Service ID:** {service_data['id']}"
+    
+    return alert_message, "🎉 New Service Created - BurnStop Alert"
+
+def build_service_deletion_alert(org_id: str, service_data: dict) -> Tuple[str, str]:
+    """Build the message and subject announcing a service marked for deletion"""
+    # Format service metadata for the deletion alert
+    platform_emojis = {
+        "aws": "🟠 Amazon Web Services",
+        "gcp": "🔵 Google Cloud Platform", 
+        "azure": "🔷 Microsoft Azure",
+        "other": "⚡ Other Platform"
+    }
+    
+    service_type_emojis = {
+        "ec2": "🖥️", "s3": "��️", "rds": "🗃️", "lambda": "⚡", "eks": "☸️",
+        "compute_engine": "🖥️", "cloud_storage": "🗄️", "cloud_sql": "🗃️",
+        "virtual_machines": "🖥️", "blob_storage": "🗄️", "sql_database": "🗃️",
+        "cloud": "☁️", "api": "🔌", "database": "🗃️", "storage": "🗄️"
+    }
+    
+    platform_name = platform_emojis.get(service_data["platform"], f"⚡ {service_data['platform'].title()}")
+    service_emoji = service_type_emojis.get(service_data["service_type"], "📦")
+    
+    # Get organization name for context
+    org_key = f"org:{org_id}"
+    org_data = redis_db.get(org_key)
+    org_name = org_data.get('name', 'Unknown Organization') if org_data else 'Unknown Organization'
+    
+    # Create rich deletion alert message with organization context
+    alert_message = f"""🗑️ **Service Deleted!**
+
+{service_emoji} **Service:** {service_data['name']}
+🏢 **Organization:** {org_name}
+{platform_name}
+📊 **Type:** {service_data['service_type'].replace('_', ' ').title()}
+💰 **Monthly Cost Saved:** ${service_data['cost']:.2f}
+👤 **Owner:** {service_data.get('owner_email', 'Not specified')}"""
+
+    # Add optional metadata if present
+    if service_data.get('instance_type'):
+        alert_message += f"\n🖥️ **Instance Type:** {service_data['instance_type'].replace('_', ' ').title()}"
+    
+    if service_data.get('description'):
+        alert_message += f"\n📝 **Description:** {service_data['description']}"
+    
+    if service_data.get('region'):
+        alert_message += f"\n🌍 **Region:** {service_data['region']}"
+    
+    if service_data.get('instance_id'):
+        alert_message += f"\n🏷️ **Instance ID:** {service_data['instance_id']}"
+    
+    if service_data.get('iam_number'):
+        alert_message += f"\n🔐 **IAM Number:** {service_data['iam_number']}"
+    
+    if service_data.get('tags'):
+        tags = format_tags(service_data['tags'])
+        alert_message += f"\n🏷️ **Tags:** {tags}"
+    
+    alert_message += f"\n\n🗑️ **Deleted:** {service_data['updated_at'][:19]} UTC"
+    alert_message += f"\n🆔 **Service ID:** {service_data['id']}"
+    alert_message += f"\n⚠️ **Status:** Marked for deletion"
+    
+    return alert_message, "🗑️ Service Deleted - BurnStop Alert"
+
+def build_reminder_alert(all_upcoming_reminders: List[dict], days_ahead: int) -> Tuple[str, str]:
+    """Build the message and subject listing upcoming reminders, most urgent first"""
+    # Create rich reminder alert message; days_ahead 0 means the reminders are due now
+    when = f"in the next {days_ahead} days" if days_ahead > 0 else "due now"
+    alert_message = f"""⏰ **Upcoming Service Reminders**
+
+You have {len(all_upcoming_reminders)} service reminder(s) {when}:
+
+"""
+    
+    platform_emojis = {
+        "aws": "🟠", "gcp": "🔵", "azure": "🔷", "other": "⚡"
+    }
+    
+    service_type_emojis = {
+        "ec2": "🖥️", "s3": "🗄️", "rds": "🗃️", "lambda": "⚡", "eks": "☸️",
+        "compute_engine": "🖥️", "cloud_storage": "🗄️", "cloud_sql": "🗃️",
+        "virtual_machines": "🖥️", "blob_storage": "🗄️", "sql_database": "🗃️",
+        "cloud": "☁️", "api": "🔌", "database": "🗃️", "storage": "🗄️"
+    }
+    
+    total_cost = 0
+    
+    for i, reminder in enumerate(all_upcoming_reminders, 1):
+        service_data = reminder['service_data']
+        platform_emoji = platform_emojis.get(service_data["platform"], "⚡")
+        service_emoji = service_type_emojis.get(service_data["service_type"], "📦")
+        total_cost += service_data.get('cost', 0)
+        
+        days_until = reminder['days_until']
+        urgency_indicator = "🔴" if days_until <= 1 else "🟡" if days_until <= 3 else "🟢"
+        
+        alert_message += f"""
+{urgency_indicator} **{i}. {service_data['name']}**
+   {service_emoji} {service_data['service_type'].replace('_', ' ').title()} • {platform_emoji} {service_data['platform'].upper()}
+   🏢 {reminder['org_name']}
+   💰 ${service_data['cost']:.2f}/month
+   📅 Due in {days_until} day(s) - {datetime.fromtimestamp(reminder['reminder_timestamp']).strftime('%Y-%m-%d')}"""
+   
+        # Add instance type if available
+        if service_data.get('instance_type'):
+            alert_message += f"\n   🖥️ {service_data['instance_type'].replace('_', ' ').title()}"
+        
+        # Add region if available  
+        if service_data.get('region'):
+            alert_message += f"\n   🌍 {service_data['region']}"
+        
+        alert_message += f"""
+"""
+    
+    alert_message += f"""
+📊 **Summary:**
+• Total services: {len(all_upcoming_reminders)}
+• Total monthly cost: ${total_cost:.2f}
+• Most urgent: {all_upcoming_reminders[0]['days_until']} day(s)
+
+🎯 **Action Required:** Review and update these services to avoid cost overruns!
+"""
+    
+    return alert_message, f"⏰ {len(all_upcoming_reminders)} Upcoming Service Reminders - BurnStop Alert"
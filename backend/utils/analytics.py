@@ -0,0 +1,238 @@
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable, TypeVar
+
+import redis
+
+from utils.redis_db import redis_db
+from utils.leases import run_exclusively
+
+T = TypeVar("T")
+
+# Analytics snapshots also contain time dependent data (filler trend points), so
+# even an unchanged organization gets a fresh snapshot once a day
+SNAPSHOT_TTL_SECONDS = 24 * 60 * 60
+
+# Cost sums are kept with HINCRBYFLOAT, so allow for float noise when comparing
+DRIFT_TOLERANCE = 0.01
+
+# A lazy index build holds its lease at most this long
+INDEX_BUILD_LEASE_SECONDS = 5 * 60
+
+# Times a build starts over because a service mutation committed under it; after that the
+# marker stays unset and the next caller tries again
+MAX_INDEX_BUILD_ATTEMPTS = 5
+
+def ensure_org_index(org_id: str, name: str, marker: str, rebuild: Callable[[str], Any]):
+    """Build one of an organization's derived indexes if its marker is missing
+
+    One caller builds it under a lease and checks the marker again once it
+    holds it, so concurrent first callers don't build twice. The others go
+    ahead; their mutations make the builder start over (build_unless_changed)
+    instead of being lost or counted twice.
+    """
+    if redis_db.exists(marker):
+        return
+
+    def build():
+        # Another caller may have finished the build while this one waited for the lease
+        if not redis_db.exists(marker):
+            print(f"Rebuilding {name} for org {org_id}")
+            rebuild(org_id)
+
+    run_exclusively(f"index-build:{name}:{org_id}", INDEX_BUILD_LEASE_SECONDS, build)
+
+def build_unless_changed(org_id: str, build: Callable[[], T], commit: Callable[[Any, T], None]) -> Optional[T]:
+    """Run an index build and commit it only if no service mutation committed meanwhile
+
+    Every mutation bumps org_revision:{org} in its transaction, so watching it
+    across the build tells whether a mutation's delta landed before or after
+    the build read the services. The build starts over when one did; returns
+    its result, or None after MAX_INDEX_BUILD_ATTEMPTS.
+    """
+    with redis_db.redis_client.pipeline() as pipe:
+        for _ in range(MAX_INDEX_BUILD_ATTEMPTS):
+            try:
+                pipe.watch(f"org_revision:{org_id}")
+                result = build()
+                pipe.multi()
+                commit(pipe, result)
+                pipe.execute()
+                return result
+            except redis.WatchError:
+                continue
+    print(f"Gave up building an index for org {org_id}: services kept changing")
+    return None
+
+def service_contribution(service_data: Optional[dict]) -> Dict[str, float]:
+    """Get the counter fields a single service contributes to its organization's aggregates"""
+    if not service_data or service_data.get("status") != "active":
+        return {}
+
+    cost = float(service_data.get("cost", 0) or 0)
+    platform = service_data.get("platform", "unknown")
+    service_type = service_data.get("service_type", "unknown")
+
+    return {
+        "active_count": 1,
+        "total_cost": cost,
+        f"platform:{platform}": cost,
+        f"platform_count:{platform}": 1,
+        f"type:{service_type}": cost,
+        f"type_count:{service_type}": 1,
+    }
+
+def apply_service_change(pipe, org_id: str, old_data: Optional[dict], new_data: Optional[dict]) -> Dict[str, float]:
+    """Queue the counter deltas for a service going from old_data to new_data on a pipeline and return them"""
+    counters_key = f"analytics_counters:{org_id}"
+    active_key = f"org_active_services:{org_id}"
+
+    old_fields = service_contribution(old_data)
+    new_fields = service_contribution(new_data)
+
+    deltas = {}
+    for field in set(old_fields) | set(new_fields):
+        delta = new_fields.get(field, 0) - old_fields.get(field, 0)
+        if delta:
+            pipe.hincrbyfloat(counters_key, field, delta)
+            deltas[field] = delta
+
+    # Keep the set of active service ids next to the counters so readers that
+    # only need active services don't have to load every service body
+    if old_fields and not new_fields:
+        pipe.srem(active_key, old_data["id"])
+    elif new_fields and not old_fields:
+        pipe.sadd(active_key, new_data["id"])
+
+    return deltas
+
+def compute_counters_from_source(org_id: str) -> tuple:
+    """Recompute the counter fields and active service ids of an organization from the stored service bodies"""
+    service_ids = redis_db.get(f"org_services:{org_id}") or []
+    service_keys = [f"service:{service_id}" for service_id in service_ids]
+
+    counters = defaultdict(float)
+    counters["active_count"] = 0
+    counters["total_cost"] = 0
+    active_ids = []
+
+    for service_data in redis_db.mget(service_keys):
+        fields = service_contribution(service_data)
+        if not fields:
+            continue
+        active_ids.append(service_data["id"])
+        for field, value in fields.items():
+            counters[field] += value
+
+    return dict(counters), active_ids
+
+def rebuild_analytics_counters(org_id: str):
+    """Replace an organization's counters and active service set with values recomputed from source"""
+    def commit(pipe, computed):
+        counters, active_ids = computed
+        pipe.delete(f"analytics_counters:{org_id}", f"org_active_services:{org_id}")
+        pipe.hset(f"analytics_counters:{org_id}", mapping=counters)
+        if active_ids:
+            pipe.sadd(f"org_active_services:{org_id}", *active_ids)
+        pipe.set(f"analytics_built:{org_id}", 1)
+        pipe.incr(f"org_revision:{org_id}")
+
+    computed = build_unless_changed(org_id, lambda: compute_counters_from_source(org_id), commit)
+    return computed[0] if computed else None
+
+def ensure_analytics_counters(org_id: str):
+    """Build the counters for organizations created before running aggregates existed"""
+    ensure_org_index(org_id, "analytics counters", f"analytics_built:{org_id}", rebuild_analytics_counters)
+
+def load_analytics_counters(org_id: str) -> Dict[str, Any]:
+    """Read an organization's running aggregates in a single HGETALL"""
+    ensure_analytics_counters(org_id)
+    raw = redis_db.hgetall(f"analytics_counters:{org_id}")
+
+    cost_by_platform = {}
+    cost_by_type = {}
+
+    for field, value in raw.items():
+        name, _, label = field.partition(":")
+        if name == "platform" and float(raw.get(f"platform_count:{label}", 0)) > 0:
+            cost_by_platform[label] = round(float(value), 2)
+        elif name == "type" and float(raw.get(f"type_count:{label}", 0)) > 0:
+            cost_by_type[label] = round(float(value), 2)
+
+    return {
+        "total_services": int(round(float(raw.get("active_count", 0)))),
+        "total_monthly_cost": round(float(raw.get("total_cost", 0)), 2),
+        "cost_by_platform": cost_by_platform,
+        "cost_by_type": cost_by_type,
+    }
+
+def get_org_revision(org_id: str) -> int:
+    """Get the organization revision, bumped on every service mutation"""
+    return int(redis_db.get(f"org_revision:{org_id}") or 0)
+
+def get_analytics_snapshot(org_id: str, revision: int) -> Optional[dict]:
+    """Get the materialized analytics for an organization if it is still at the given revision"""
+    snapshot = redis_db.get(f"analytics_snapshot:{org_id}")
+    if not snapshot or snapshot.get("revision") != revision:
+        return None
+    return snapshot["analytics"]
+
+def store_analytics_snapshot(org_id: str, revision: int, analytics: dict):
+    """Materialize the analytics of an organization for the given revision"""
+    redis_db.set(
+        f"analytics_snapshot:{org_id}",
+        {"revision": revision, "analytics": analytics},
+        ex=SNAPSHOT_TTL_SECONDS
+    )
+
+def verify_analytics_counters(org_id: str, repair: bool = False) -> dict:
+    """Recompute an organization's counters from source and report any drift from the running values"""
+    expected, _ = compute_counters_from_source(org_id)
+    stored = {
+        field: float(value)
+        for field, value in redis_db.hgetall(f"analytics_counters:{org_id}").items()
+    }
+
+    drift = {}
+    for field in set(expected) | set(stored):
+        expected_value = expected.get(field, 0)
+        stored_value = stored.get(field, 0)
+        if abs(expected_value - stored_value) > DRIFT_TOLERANCE:
+            drift[field] = {"stored": stored_value, "expected": expected_value}
+
+    if drift and repair:
+        rebuild_analytics_counters(org_id)
+
+    return {
+        "org_id": org_id,
+        "checked_at": datetime.utcnow().isoformat(),
+        "drift": drift,
+        "repaired": bool(drift and repair),
+    }
+
+def delete_analytics_state(org_id: str):
+    """Remove the aggregates, revision and snapshot of a deleted organization"""
+    redis_db.redis_client.delete(
+        f"analytics_counters:{org_id}",
+        f"analytics_built:{org_id}",
+        f"org_active_services:{org_id}",
+        f"org_revision:{org_id}",
+        f"analytics_snapshot:{org_id}",
+        f"regression:{org_id}",
+    )
+
+if __name__ == "__main__":
+    # Verification job: python -m utils.analytics [--repair]
+    repair = "--repair" in sys.argv
+    drifted = 0
+
+    for org_key in redis_db.redis_client.scan_iter(match="org:*"):
+        org_id = org_key.split(":", 1)[1]
+        report = verify_analytics_counters(org_id, repair=repair)
+        if report["drift"]:
+            drifted += 1
+            print(json.dumps(report))
+
+    print(f"Analytics verification finished: {drifted} organization(s) with drift")
@@ -0,0 +1,242 @@
+import argparse
+import json
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.redis_db import redis_db
+from utils.leases import SCHEDULED_JOB_LEASE_SECONDS, run_exclusively
+from utils.notifications import enqueue_notification
+from utils.rollups import month_range, load_rollup_observations, forward_fill
+
+# Months of rollup history loaded per service
+SCAN_HISTORY_MONTHS = 12
+
+# Trailing months the median/MAD baseline is computed over
+BASELINE_MONTHS = 6
+MIN_BASELINE_POINTS = 3
+
+# Robust z-score above which a month counts as an anomaly
+Z_THRESHOLD = 3.5
+
+# A flat cost history has a MAD of 0, so the scale never drops below 5% of the
+# baseline median or $1; small wobbles on steady services are not anomalies
+MIN_RELATIVE_SCALE = 0.05
+MIN_ABSOLUTE_SCALE = 1.0
+
+# Services handed to one worker process at a time
+CHUNK_SIZE = 5000
+
+# Anomalies kept per organization
+MAX_ANOMALIES_PER_ORG = 1000
+
+# Drops the oldest anomalies past the cap along with their details
+_TRIM_ANOMALIES_LUA = """
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[1])
+if overflow <= 0 then
+    return 0
+end
+local trimmed = redis.call('ZRANGE', KEYS[1], 0, overflow - 1)
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, overflow - 1)
+redis.call('HDEL', KEYS[2], unpack(trimmed))
+return overflow
+"""
+
+_trim_anomalies = redis_db.redis_client.register_script(_TRIM_ANOMALIES_LUA)
+
+def changed_months(observed: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Mask of the months whose recorded cost differs from the month before
+
+    Forward-filled months and re-recorded unchanged costs are not changes, so a
+    step in the cost is scored in the month it happens only.
+    """
+    changed = ~np.isnan(observed)
+    changed[:, 1:] &= matrix[:, 1:] != matrix[:, :-1]
+    return changed
+
+def detect_anomalies(matrix: np.ndarray, scan_months: int = 1, changed: Optional[np.ndarray] = None) -> List[tuple]:
+    """Score the last `scan_months` of every row against its trailing median/MAD baseline
+
+    With a `changed` mask, only months marked in it can be flagged.
+    Returns (row, column, value, baseline_median, z_score) tuples for anomalous points.
+    """
+    n, T = matrix.shape
+    if n == 0 or T <= BASELINE_MONTHS:
+        return []
+    scan_months = min(scan_months, T - BASELINE_MONTHS)
+
+    # windows[:, j] is the baseline for column BASELINE_MONTHS + j
+    windows = sliding_window_view(matrix[:, :-1], BASELINE_MONTHS, axis=1)[:, -scan_months:]
+    targets = matrix[:, -scan_months:]
+
+    with warnings.catch_warnings():
+        # Services younger than the baseline produce all-NaN windows
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=2)
+
+    enough_points = (~np.isnan(windows)).sum(axis=2) >= MIN_BASELINE_POINTS
+    scale = np.maximum.reduce([
+        1.4826 * np.nan_to_num(mad),
+        MIN_RELATIVE_SCALE * np.abs(np.nan_to_num(median)),
+        np.full(median.shape, MIN_ABSOLUTE_SCALE),
+    ])
+    z_scores = (targets - median) / scale
+
+    flagged = enough_points & ~np.isnan(targets) & (np.abs(np.nan_to_num(z_scores)) > Z_THRESHOLD)
+    if changed is not None:
+        flagged &= changed[:, -scan_months:]
+    rows, columns = np.nonzero(flagged)
+    offset = T - scan_months
+
+    return [
+        (int(row), int(offset + column), float(targets[row, column]), float(median[row, column]), float(z_scores[row, column]))
+        for row, column in zip(rows, columns)
+    ]
+
+def scan_chunk(org_id: str, service_ids: List[str], months: List[str], scan_months: int) -> List[dict]:
+    """Load one chunk of service rollups and return its anomalies (runs in a worker process)
+
+    The scan only reads: services without a rollup are scored from their cost
+    history without storing it. Only months whose cost changed are scored, so
+    a step change is flagged once rather than every month until the baseline
+    catches up.
+    """
+    observed = load_rollup_observations(org_id, service_ids, months)
+    matrix = forward_fill(observed)
+    return [
+        {
+            "org_id": org_id,
+            "service_id": service_ids[row],
+            "month": months[column],
+            "cost": round(value, 2),
+            "baseline": round(baseline, 2),
+            "z_score": round(z_score, 2),
+        }
+        for row, column, value, baseline, z_score in detect_anomalies(matrix, scan_months, changed_months(observed, matrix))
+    ]
+
+def record_anomalies(org_id: str, anomalies: List[dict]) -> List[dict]:
+    """Add anomalies to the org's anomaly index and return the ones not seen before"""
+    if not anomalies:
+        return []
+
+    detected_at = time.time()
+    pipe = redis_db.pipeline(transaction=False)
+    for anomaly in anomalies:
+        member = f"{anomaly['service_id']}:{anomaly['month']}"
+        pipe.zadd(f"anomalies:{org_id}", {member: detected_at}, nx=True)
+    added = pipe.execute()
+
+    new_anomalies = [anomaly for anomaly, was_added in zip(anomalies, added) if was_added]
+    if not new_anomalies:
+        return []
+
+    pipe = redis_db.pipeline()
+    for anomaly in new_anomalies:
+        anomaly["detected_at"] = datetime.utcfromtimestamp(detected_at).isoformat()
+        member = f"{anomaly['service_id']}:{anomaly['month']}"
+        pipe.hset(f"anomaly_details:{org_id}", member, json.dumps(anomaly))
+    _trim_anomalies(keys=[f"anomalies:{org_id}", f"anomaly_details:{org_id}"], args=[MAX_ANOMALIES_PER_ORG], client=pipe)
+    pipe.execute()
+
+    return new_anomalies
+
+def get_recent_anomalies(org_id: str, limit: int = 50) -> List[dict]:
+    """Get the most recently detected anomalies of an organization"""
+    members = redis_db.redis_client.zrevrange(f"anomalies:{org_id}", 0, limit - 1)
+    if not members:
+        return []
+    details = redis_db.redis_client.hmget(f"anomaly_details:{org_id}", members)
+    return [json.loads(detail) for detail in details if detail]
+
+def queue_anomaly_alerts(org_id: str, anomalies: List[dict]):
+    """Queue an alert for newly detected anomalies to the organization's integrations"""
+    if not anomalies:
+        return
+
+    org_data = redis_db.get(f"org:{org_id}") or {}
+    services = redis_db.mget([f"service:{anomaly['service_id']}" for anomaly in anomalies])
+
+    alert_message = f"""📈 **Cost Anomalies Detected**
+
+🏢 **Organization:** {org_data.get('name', 'Unknown Organization')}
+{len(anomalies)} service(s) changed cost well outside their recent range:
+"""
+    ranked = sorted(zip(anomalies, services), key=lambda pair: -abs(pair[0]["z_score"]))
+    for anomaly, service_data in ranked[:20]:
+        name = (service_data or {}).get("name", anomaly["service_id"])
+        alert_message += f"\n• **{name}** ({anomaly['month']}): ${anomaly['cost']:.2f} vs usual ${anomaly['baseline']:.2f} (z={anomaly['z_score']})"
+    if len(ranked) > 20:
+        alert_message += f"\n• ...and {len(ranked) - 20} more"
+
+    enqueue_notification(
+        None,
+        [org_id],
+        alert_message,
+        subject=f"📈 {len(anomalies)} Cost Anomalies - BurnStop Alert",
+        kind="anomalies"
+    )
+
+def run_anomaly_scan(workers: int = None, scan_months: int = 1) -> Dict[str, int]:
+    """Scan every organization's services for cost anomalies using a process pool"""
+    months = month_range(datetime.utcnow(), SCAN_HISTORY_MONTHS)
+    stats = {"organizations": 0, "services": 0, "anomalies": 0, "new_anomalies": 0}
+    found = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for org_key in redis_db.redis_client.scan_iter(match="org:*"):
+            org_id = org_key.split(":", 1)[1]
+            stats["organizations"] += 1
+
+            chunk = []
+            for service_id in redis_db.redis_client.sscan_iter(f"org_active_services:{org_id}", count=CHUNK_SIZE):
+                chunk.append(service_id)
+                if len(chunk) == CHUNK_SIZE:
+                    futures.append(pool.submit(scan_chunk, org_id, chunk, months, scan_months))
+                    stats["services"] += len(chunk)
+                    chunk = []
+            if chunk:
+                futures.append(pool.submit(scan_chunk, org_id, chunk, months, scan_months))
+                stats["services"] += len(chunk)
+
+        for future in futures:
+            for anomaly in future.result():
+                found.setdefault(anomaly["org_id"], []).append(anomaly)
+
+    for org_id, anomalies in found.items():
+        stats["anomalies"] += len(anomalies)
+        new_anomalies = record_anomalies(org_id, anomalies)
+        stats["new_anomalies"] += len(new_anomalies)
+        try:
+            queue_anomaly_alerts(org_id, new_anomalies)
+        except Exception as e:
+            print(f"Error queueing anomaly alerts for org {org_id}: {e}")
+
+    return stats
+
+if __name__ == "__main__":
+    # Scheduled job: python -m utils.anomalies [--workers N] [--every SECONDS]
+    parser = argparse.ArgumentParser(description="Detect cost anomalies across all organizations")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--scan-months", type=int, default=1, help="trailing months to score")
+    parser.add_argument("--every", type=int, default=0, help="repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    while True:
+        started = time.time()
+        # Replicas running the same schedule take turns instead of scanning twice
+        result = run_exclusively(
+            "anomaly-scan", SCHEDULED_JOB_LEASE_SECONDS, lambda: run_anomaly_scan(args.workers, args.scan_months)
+        )
+        if result is not None:
+            print(f"Anomaly scan finished in {time.time() - started:.1f}s: {result}")
+        if not args.every:
+            break
+        time.sleep(max(0, args.every - (time.time() - started)))
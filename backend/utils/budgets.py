@@ -0,0 +1,294 @@
+import argparse
+import calendar
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+
+from utils.redis_db import redis_db
+from utils.leases import SCHEDULED_JOB_LEASE_SECONDS, run_exclusively
+from utils.notifications import enqueue_notification
+from utils.event_webhooks import emit_event
+from utils.analytics import service_contribution
+from utils.tags import tag_contribution
+
+# Fraction of a budget spent that raises an alert, once per month and envelope
+BUDGET_THRESHOLDS = (0.5, 0.8, 1.0)
+
+# An alert only re-arms after spend drops this far below its threshold (e.g. after a budget raise)
+HYSTERESIS = 0.05
+
+# Burn and alert state of a month is kept a little longer than the month itself
+BURN_STATE_TTL_SECONDS = 62 * 24 * 60 * 60
+
+# Envelope prefixes a budget can be split by: "platform:aws" or "tag:team=payments"
+ENVELOPE_PREFIXES = ("platform:", "tag:")
+
+# Integrates each scope's monthly run rate over the time since its last accrual.
+# KEYS[1] is the month's burn hash, KEYS[2..] the hashes holding each scope's
+# current rate; ARGV: now, month start, month length, ttl, then (scope, rate field)
+# pairs. Queued before the counter deltas of a mutation so the old rate is used.
+_ACCRUE_LUA = """
+local now = tonumber(ARGV[1])
+local month_start = tonumber(ARGV[2])
+local month_seconds = tonumber(ARGV[3])
+for i = 2, #KEYS do
+    local scope = ARGV[3 + (i - 1) * 2]
+    local field = ARGV[4 + (i - 1) * 2]
+    local at = tonumber(redis.call('HGET', KEYS[1], scope .. ':at') or month_start)
+    if at < month_start then
+        at = month_start
+    end
+    if now > at then
+        local rate = tonumber(redis.call('HGET', KEYS[i], field) or '0')
+        redis.call('HINCRBYFLOAT', KEYS[1], scope .. ':accrued', rate * (now - at) / month_seconds)
+    end
+    redis.call('HSET', KEYS[1], scope .. ':at', now)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+_accrue = redis_db.redis_client.register_script(_ACCRUE_LUA)
+
+def month_bounds(now: Optional[float] = None) -> Tuple[str, float, float]:
+    """Get the UTC month bucket (YYYY-MM) and its start and end timestamps"""
+    now = now if now is not None else time.time()
+    moment = datetime.utcfromtimestamp(now)
+    start = calendar.timegm((moment.year, moment.month, 1, 0, 0, 0))
+    days = calendar.monthrange(moment.year, moment.month)[1]
+    return moment.strftime("%Y-%m"), float(start), float(start + days * 24 * 60 * 60)
+
+def envelope_rate_source(org_id: str, scope: str) -> Tuple[str, str]:
+    """Get the hash and field holding the current monthly run rate of a budget scope"""
+    if scope == "total":
+        return f"analytics_counters:{org_id}", "total_cost"
+    if scope.startswith("tag:"):
+        key, _, value = scope[len("tag:"):].partition("=")
+        return f"tag_costs:{org_id}:{key}", f"cost:{value}"
+    return f"analytics_counters:{org_id}", scope
+
+def is_valid_envelope(scope: str) -> bool:
+    """Check that a budget envelope key names something the counters track"""
+    if scope.startswith("tag:"):
+        key, separator, _ = scope[len("tag:"):].partition("=")
+        return bool(separator and key and key == key.strip().lower())
+    return any(scope.startswith(prefix) and len(scope) > len(prefix) for prefix in ENVELOPE_PREFIXES)
+
+def changed_scopes(old_data: Optional[dict], new_data: Optional[dict]) -> List[str]:
+    """Get the budget scopes whose run rate a service mutation changes"""
+    old_fields = service_contribution(old_data)
+    new_fields = service_contribution(new_data)
+
+    scopes = []
+    for field in sorted(set(old_fields) | set(new_fields)):
+        if old_fields.get(field, 0) == new_fields.get(field, 0):
+            continue
+        if field == "total_cost":
+            scopes.append("total")
+        elif is_valid_envelope(field):
+            scopes.append(field)
+
+    old_tags = tag_contribution(old_data)
+    new_tags = tag_contribution(new_data)
+    for key, value in sorted(set(old_tags) | set(new_tags)):
+        if old_tags.get((key, value), 0) != new_tags.get((key, value), 0):
+            scopes.append(f"tag:{key}={value}")
+    return scopes
+
+def accrue_budget_burn(pipe, org_id: str, old_data: Optional[dict], new_data: Optional[dict], now: Optional[float] = None):
+    """Queue the burn accrual of every scope a service mutation touches
+
+    Must be queued before the counter deltas of the same transaction, so spend
+    up to now is accrued at the rate that was in effect.
+    """
+    scopes = changed_scopes(old_data, new_data)
+    if not scopes:
+        return
+
+    now = now if now is not None else time.time()
+    month, start, end = month_bounds(now)
+
+    keys = [f"budget_burn:{org_id}:{month}"]
+    args = [now, start, end - start, BURN_STATE_TTL_SECONDS]
+    for scope in scopes:
+        rate_key, rate_field = envelope_rate_source(org_id, scope)
+        keys.append(rate_key)
+        args.extend([scope, rate_field])
+
+    _accrue(keys=keys, args=args, client=pipe)
+
+def get_budget_limits(org_data: dict) -> Dict[str, float]:
+    """Get the monthly limit of every budgeted scope of an organization"""
+    limits = {}
+    if org_data.get("budget"):
+        limits["total"] = float(org_data["budget"])
+    for scope, limit in (org_data.get("budget_envelopes") or {}).items():
+        if limit:
+            limits[scope] = float(limit)
+    return limits
+
+def get_budget_status(org_id: str, org_data: Optional[dict] = None, now: Optional[float] = None) -> dict:
+    """Get spend to date and projected month-end spend of every budgeted scope
+
+    Reads the month's burn hash and the current run rates; the cost is
+    independent of the number of services.
+    """
+    org_data = org_data if org_data is not None else (redis_db.get(f"org:{org_id}") or {})
+    limits = get_budget_limits(org_data)
+
+    now = now if now is not None else time.time()
+    month, start, end = month_bounds(now)
+    month_seconds = end - start
+
+    burn = redis_db.hgetall(f"budget_burn:{org_id}:{month}")
+    pipe = redis_db.pipeline(transaction=False)
+    for scope in limits:
+        rate_key, rate_field = envelope_rate_source(org_id, scope)
+        pipe.hget(rate_key, rate_field)
+    rates = pipe.execute() if limits else []
+
+    envelopes = []
+    for (scope, limit), rate in zip(limits.items(), rates):
+        rate = float(rate or 0)
+        at = max(float(burn.get(f"{scope}:at", start)), start)
+        spent = float(burn.get(f"{scope}:accrued", 0)) + rate * (now - at) / month_seconds
+        projected = spent + rate * (end - now) / month_seconds
+
+        envelopes.append({
+            "scope": scope,
+            "limit": round(limit, 2),
+            "monthly_rate": round(rate, 2),
+            "spent": round(spent, 2),
+            "projected": round(projected, 2),
+            "spent_ratio": round(spent / limit, 4),
+            "projected_ratio": round(projected / limit, 4),
+        })
+
+    return {
+        "month": month,
+        "month_elapsed": round((now - start) / month_seconds, 4),
+        "envelopes": envelopes,
+    }
+
+def claim_budget_alerts(org_id: str, status: dict) -> List[dict]:
+    """Record which thresholds each envelope is past and return the ones newly crossed
+
+    Threshold alerts follow spend to date, the pace alert follows projected
+    month-end spend. A crossing is claimed with HSETNX so it fires once per
+    month; it is released once the ratio falls HYSTERESIS below the threshold.
+    """
+    alerts_key = f"budget_alerts:{org_id}:{status['month']}"
+
+    checks = []
+    for envelope in status["envelopes"]:
+        for threshold in BUDGET_THRESHOLDS:
+            checks.append((envelope, f"{envelope['scope']}:{int(threshold * 100)}", envelope["spent_ratio"], threshold))
+        checks.append((envelope, f"{envelope['scope']}:pace", envelope["projected_ratio"], 1.0))
+
+    pipe = redis_db.pipeline(transaction=False)
+    claimed = []
+    for envelope, field, ratio, threshold in checks:
+        if ratio >= threshold:
+            pipe.hsetnx(alerts_key, field, int(time.time()))
+            claimed.append((envelope, field, threshold))
+    for envelope, field, ratio, threshold in checks:
+        if ratio < threshold - HYSTERESIS:
+            pipe.hdel(alerts_key, field)
+    pipe.expire(alerts_key, BURN_STATE_TTL_SECONDS)
+    results = pipe.execute()
+
+    crossed = []
+    for (envelope, field, threshold), was_set in zip(claimed, results):
+        if was_set:
+            crossed.append({
+                "scope": envelope["scope"],
+                "kind": "pace" if field.endswith(":pace") else "threshold",
+                "threshold": threshold,
+                "envelope": envelope,
+            })
+    return crossed
+
+def queue_budget_alerts(org_id: str, org_data: dict, crossed: List[dict]):
+    """Queue an alert for newly crossed budget thresholds to the organization's integrations
+
+    Each crossing is also emitted as a budget.crossed event for outbound webhooks.
+    """
+    if not crossed:
+        return
+
+    alert_message = f"""💸 **Budget Alert**
+
+🏢 **Organization:** {org_data.get('name', 'Unknown Organization')}
+"""
+    for alert in crossed:
+        envelope = alert["envelope"]
+        label = "Total budget" if envelope["scope"] == "total" else envelope["scope"]
+        if alert["kind"] == "pace":
+            alert_message += f"\n• **{label}**: on pace to spend ${envelope['projected']:.2f} this month, over the ${envelope['limit']:.2f} budget"
+        else:
+            alert_message += f"\n• **{label}**: ${envelope['spent']:.2f} spent, {int(alert['threshold'] * 100)}% of the ${envelope['limit']:.2f} budget"
+
+    pipe = redis_db.pipeline()
+    for alert in crossed:
+        envelope = alert["envelope"]
+        emit_event(pipe, org_id, "budget.crossed", {
+            "scope": envelope["scope"],
+            "kind": alert["kind"],
+            "threshold": alert["threshold"],
+            "limit": envelope["limit"],
+            "spent": envelope["spent"],
+            "projected": envelope.get("projected"),
+        })
+
+    enqueue_notification(
+        pipe,
+        [org_id],
+        alert_message,
+        subject=f"💸 Budget Alert for {org_data.get('name', 'your organization')} - BurnStop Alert",
+        kind="budget"
+    )
+    pipe.execute()
+
+def evaluate_budget_alerts(org_id: str, now: Optional[float] = None) -> List[dict]:
+    """Evaluate an organization's budgets and alert on newly crossed thresholds"""
+    org_data = redis_db.get(f"org:{org_id}")
+    if not org_data or not get_budget_limits(org_data):
+        return []
+
+    status = get_budget_status(org_id, org_data, now)
+    crossed = claim_budget_alerts(org_id, status)
+    queue_budget_alerts(org_id, org_data, crossed)
+    return crossed
+
+def delete_budget_state(org_id: str):
+    """Remove the current month's burn and alert state of a deleted organization (older months expire)"""
+    month, _, _ = month_bounds()
+    redis_db.redis_client.delete(f"budget_burn:{org_id}:{month}", f"budget_alerts:{org_id}:{month}")
+
+def evaluate_all_budgets() -> Dict[str, int]:
+    """Evaluate the budgets of every organization; spend accrues with time, not only on mutations"""
+    stats = {"organizations": 0, "alerts": 0}
+    for org_key in redis_db.redis_client.scan_iter(match="org:*"):
+        org_id = org_key.split(":", 1)[1]
+        stats["organizations"] += 1
+        try:
+            stats["alerts"] += len(evaluate_budget_alerts(org_id))
+        except Exception as e:
+            print(f"Error evaluating budget for org {org_id}: {e}")
+    return stats
+
+if __name__ == "__main__":
+    # Scheduled job: python -m utils.budgets [--every SECONDS]
+    parser = argparse.ArgumentParser(description="Evaluate budget thresholds across all organizations")
+    parser.add_argument("--every", type=int, default=0, help="repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    while True:
+        started = time.time()
+        # Replicas running the same schedule take turns instead of evaluating twice
+        result = run_exclusively("budget-evaluation", SCHEDULED_JOB_LEASE_SECONDS, evaluate_all_budgets)
+        if result is not None:
+            print(f"Budget evaluation finished in {time.time() - started:.1f}s: {result}")
+        if not args.every:
+            break
+        time.sleep(max(0, args.every - (time.time() - started)))
@@ -0,0 +1,68 @@
+import json
+from typing import Optional, Dict, Any
+
+from utils.redis_db import redis_db
+
+# Entries kept per organization stream; clients further behind get a reset event
+CHANGE_STREAM_MAXLEN = 10000
+
+# Fields of a service pushed to dashboards on upsert
+COMPACT_SERVICE_FIELDS = (
+    "id", "name", "platform", "service_type", "cost", "status",
+    "reminder_date", "region", "owner_email", "updated_at"
+)
+
+def compact_service(service_data: dict) -> Dict[str, Any]:
+    """Reduce a service body to the fields the dashboard list renders"""
+    return {field: service_data.get(field) for field in COMPACT_SERVICE_FIELDS}
+
+def publish_change(pipe, org_id: str, event_type: str, data: Dict[str, Any]):
+    """Queue a change event on the organization's change stream
+
+    Use the same pipeline as the mutation so the event exists if and only if
+    the mutation was committed.
+    """
+    target = pipe if pipe is not None else redis_db.redis_client
+    target.xadd(
+        f"changes:{org_id}",
+        {"type": event_type, "data": json.dumps(data)},
+        maxlen=CHANGE_STREAM_MAXLEN,
+        approximate=True
+    )
+
+def publish_service_change(pipe, org_id: str, old_data: Optional[dict], new_data: dict, analytics_deltas: dict):
+    """Queue the compact deltas for one service mutation"""
+    if new_data.get("status") == "active":
+        publish_change(pipe, org_id, "service.upserted", compact_service(new_data))
+    elif old_data and old_data.get("status") == "active":
+        publish_change(pipe, org_id, "service.deleted", {"id": new_data["id"]})
+
+    if analytics_deltas:
+        publish_change(pipe, org_id, "analytics.changed", {
+            field: round(delta, 2) for field, delta in analytics_deltas.items()
+        })
+
+def latest_change_id(org_id: str) -> str:
+    """Get the id of the newest change of an organization, or 0-0 when there is none"""
+    newest = redis_db.redis_client.xrevrange(f"changes:{org_id}", count=1)
+    return newest[0][0] if newest else "0-0"
+
+def is_resumable(org_id: str, last_id: str) -> bool:
+    """Check that the client's last seen change is still in the stream, i.e. nothing after it was trimmed"""
+    oldest = redis_db.redis_client.xrange(f"changes:{org_id}", count=1)
+    if not oldest:
+        return True
+    return _stream_id(oldest[0][0]) <= _stream_id(last_id)
+
+def _stream_id(entry_id: str) -> tuple:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+async def read_changes(org_id: str, last_id: str, block_ms: int, count: int = 100) -> list:
+    """Block until changes after last_id arrive or block_ms passes; returns [(id, type, data)]"""
+    response = await redis_db.async_client.xread({f"changes:{org_id}": last_id}, count=count, block=block_ms)
+    changes = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            changes.append((entry_id, fields.get("type"), json.loads(fields.get("data") or "{}")))
+    return changes
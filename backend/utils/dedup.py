@@ -0,0 +1,83 @@
+import hashlib
+import os
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils.redis_db import redis_db
+from utils.delivery_metrics import count_outcome
+
+# How long an alert suppresses identical copies to the same integration (0 turns dedup off)
+ALERT_DEDUP_TTL_SECONDS = int(os.getenv("ALERT_DEDUP_TTL_SECONDS", 600))
+
+# Suppressed deliveries by notification kind, overall and per organization
+SUPPRESSED_TOTALS = "alerts:suppressed"
+
+# Claims each key for the stream entry unless another entry holds it; the entry that already
+# holds a claim (a redelivery after a crash) still counts as the first delivery
+_CLAIM_LUA = """
+local claimed = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('SET', key, ARGV[1], 'NX', 'EX', ARGV[2]) or redis.call('GET', key) == ARGV[1] then
+        claimed[i] = 1
+    else
+        claimed[i] = 0
+    end
+end
+return claimed
+"""
+
+_claim = redis_db.redis_client.register_script(_CLAIM_LUA)
+
+def suppressed_key(org_id: str) -> str:
+    return f"alerts_suppressed:{org_id}"
+
+def normalize_body(message: str) -> str:
+    """Ignore case and whitespace differences between otherwise identical alerts"""
+    return " ".join(message.split()).casefold()
+
+def dedup_key(target_id: str, event: Dict[str, Any]) -> str:
+    """Key of one alert for one integration: a hash of integration, kind, subject and normalized body"""
+    fingerprint = "\x1f".join([target_id, event["kind"], event["subject"], normalize_body(event["message"])])
+    return f"alert_dedup:{hashlib.sha256(fingerprint.encode()).hexdigest()}"
+
+def claim_first_delivery(
+    targets: List[Dict[str, Any]],
+    event: Dict[str, Any],
+    entry_id: str
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split targets into those seeing this alert for the first time within the TTL and the duplicates
+
+    Each target claims the alert for the notification stream entry; a claim
+    already held by the same entry (it was read again after a crash before
+    its acknowledgement) is not a duplicate. Duplicates are counted in the
+    suppressed metrics.
+    """
+    if ALERT_DEDUP_TTL_SECONDS <= 0 or not targets:
+        return targets, []
+
+    claimed = _claim(keys=[dedup_key(target["id"], event) for target in targets], args=[entry_id, ALERT_DEDUP_TTL_SECONDS])
+
+    fresh = [target for target, is_new in zip(targets, claimed) if is_new]
+    duplicates = [target for target, is_new in zip(targets, claimed) if not is_new]
+
+    if duplicates:
+        pipe = redis_db.redis_client.pipeline(transaction=False)
+        pipe.hincrby(SUPPRESSED_TOTALS, event["kind"], len(duplicates))
+        for target in duplicates:
+            pipe.hincrby(suppressed_key(target["id"].split(":")[1]), event["kind"], 1)
+            count_outcome(pipe, target["id"], "suppressed")
+        pipe.execute()
+
+    return fresh, duplicates
+
+def release_delivery_claims(pipe, target_ids: List[str], event: Dict[str, Any]):
+    """Forget the claims of targets that never got the alert, so it can be sent again"""
+    for target_id in target_ids:
+        pipe.delete(dedup_key(target_id, event))
+
+def get_suppressed_counts(org_id: Optional[str] = None) -> Dict[str, int]:
+    """Get suppressed duplicate deliveries by notification kind, overall or for one organization"""
+    counts = redis_db.redis_client.hgetall(suppressed_key(org_id) if org_id else SUPPRESSED_TOTALS)
+    return {kind: int(count) for kind, count in counts.items()}
+
+def delete_suppressed_counts(org_id: str):
+    redis_db.redis_client.delete(suppressed_key(org_id))
@@ -0,0 +1,201 @@
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+import redis
+
+from utils.redis_db import redis_db
+
+# Outcome counters kept per integration and per integration type
+COUNTERS = ["sent", "failed", "rate_limited", "retried", "suppressed"]
+
+# Upper bounds of the latency histogram buckets in milliseconds; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Metrics are kept in hourly buckets for a week
+METRICS_TTL_SECONDS = 8 * 24 * 60 * 60
+MAX_METRICS_HOURS = 7 * 24
+
+# An integration that failed this many deliveries in a row, for at least this long, is disabled
+AUTO_DISABLE_AFTER_FAILURES = 20
+AUTO_DISABLE_AFTER_SECONDS = 60 * 60
+
+def hour_bucket(at: Optional[datetime] = None) -> str:
+    return (at or datetime.utcnow()).strftime("%Y%m%d%H")
+
+def org_metrics_key(org_id: str, bucket: str) -> str:
+    return f"delivery_metrics:{org_id}:{bucket}"
+
+def type_metrics_key(bucket: str) -> str:
+    return f"delivery_metrics:all:{bucket}"
+
+def failure_streak_key(target_id: str) -> str:
+    return f"delivery_failures:{target_id}"
+
+def latency_bucket(latency_ms: float) -> str:
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return str(bound)
+    return "inf"
+
+def _target_parts(target_id: str) -> Optional[tuple]:
+    """Get (org_id, type) of an integration key; None for ad-hoc targets like test configs"""
+    parts = target_id.split(":")
+    return (parts[1], parts[2]) if len(parts) == 3 and parts[0] == "integration" else None
+
+def count_outcome(pipe, target_id: str, counter: str, latency_ms: Optional[float] = None):
+    """Count one delivery outcome (and its latency) in the current hour, for the integration and its type"""
+    parts = _target_parts(target_id)
+    if not parts:
+        return
+    org_id, integration_type = parts
+    bucket = hour_bucket()
+
+    for key in (org_metrics_key(org_id, bucket), type_metrics_key(bucket)):
+        pipe.hincrby(key, f"{integration_type}:{counter}", 1)
+        if latency_ms is not None:
+            pipe.hincrby(key, f"{integration_type}:lat:{latency_bucket(latency_ms)}", 1)
+            pipe.hincrbyfloat(key, f"{integration_type}:lat_sum", latency_ms)
+        pipe.expire(key, METRICS_TTL_SECONDS)
+
+def record_dispatch_results(pipe, results: List[Dict[str, Any]]):
+    """Count the outcomes of one fan-out and track each integration's run of failures"""
+    now = time.time()
+    for result in results:
+        if result["success"]:
+            count_outcome(pipe, result["target"], "sent", result.get("latency_ms"))
+            pipe.delete(failure_streak_key(result["target"]))
+        elif result["status"] == "rate_limited":
+            count_outcome(pipe, result["target"], "rate_limited")
+        else:
+            count_outcome(pipe, result["target"], "failed", result.get("latency_ms"))
+            streak = failure_streak_key(result["target"])
+            pipe.hincrby(streak, "count", 1)
+            pipe.hsetnx(streak, "since", now)
+            pipe.expire(streak, METRICS_TTL_SECONDS)
+
+def failing_integrations(target_ids: List[str]) -> List[Dict[str, Any]]:
+    """Get the integrations whose failures have lasted long enough to disable them"""
+    pipe = redis_db.redis_client.pipeline(transaction=False)
+    for target_id in target_ids:
+        pipe.hgetall(failure_streak_key(target_id))
+    failing = []
+    now = time.time()
+    for target_id, streak in zip(target_ids, pipe.execute()):
+        if not streak:
+            continue
+        count, since = int(streak.get("count", 0)), float(streak.get("since", now))
+        if count >= AUTO_DISABLE_AFTER_FAILURES and now - since >= AUTO_DISABLE_AFTER_SECONDS:
+            failing.append({"target": target_id, "failures": count, "since": since})
+    return failing
+
+def disable_failing_integration(target_id: str, failures: int, since: float) -> Optional[str]:
+    """Disable an integration after sustained failures; returns the reason, or None if it was already off
+
+    The integration is rewritten in a WATCH transaction, so a concurrent edit
+    (or re-enable) by a user isn't overwritten, and of two workers disabling
+    it at once only one gets the reason back and notifies.
+    """
+    started = datetime.utcfromtimestamp(since).strftime("%Y-%m-%d %H:%M")
+    reason = f"Disabled after {failures} consecutive failed deliveries since {started} UTC"
+    with redis_db.redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(target_id)
+                raw = pipe.get(target_id)
+                integration_data = json.loads(raw) if raw else None
+                if not integration_data or not integration_data.get("enabled", False):
+                    pipe.unwatch()
+                    return None
+
+                integration_data["enabled"] = False
+                integration_data["disabled_reason"] = reason
+                integration_data["updated_at"] = datetime.utcnow().isoformat()
+                pipe.multi()
+                pipe.set(target_id, json.dumps(integration_data))
+                pipe.delete(failure_streak_key(target_id))
+                pipe.execute()
+                return reason
+            except redis.WatchError:
+                continue
+
+def _percentile(histogram: Dict[str, int], fraction: float) -> Optional[float]:
+    """Estimate a latency percentile as the upper bound of the bucket it falls in"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bound in [str(bound) for bound in LATENCY_BUCKETS_MS] + ["inf"]:
+        seen += histogram.get(bound, 0)
+        if seen >= total * fraction:
+            return float(bound) if bound != "inf" else None
+    return None
+
+def summarize_metrics(buckets: List[tuple], integration_type: str) -> Dict[str, Any]:
+    """Fold hourly hashes into counters, a latency histogram and a per-hour timeline for one type"""
+    totals = {counter: 0 for counter in COUNTERS}
+    histogram = {str(bound): 0 for bound in LATENCY_BUCKETS_MS}
+    histogram["inf"] = 0
+    latency_sum = 0.0
+    timeline = []
+
+    for bucket, fields in buckets:
+        hour = {counter: int(fields.get(f"{integration_type}:{counter}", 0)) for counter in COUNTERS}
+        if any(hour.values()):
+            timeline.append({"hour": datetime.strptime(bucket, "%Y%m%d%H").isoformat(), **hour})
+        for counter, value in hour.items():
+            totals[counter] += value
+        for bound in histogram:
+            histogram[bound] += int(fields.get(f"{integration_type}:lat:{bound}", 0))
+        latency_sum += float(fields.get(f"{integration_type}:lat_sum", 0))
+
+    measured = sum(histogram.values())
+    return {
+        **totals,
+        "latency": {
+            "buckets_ms": histogram,
+            "mean_ms": round(latency_sum / measured, 1) if measured else None,
+            "p50_ms": _percentile(histogram, 0.5),
+            "p95_ms": _percentile(histogram, 0.95),
+        },
+        "timeline": timeline,
+    }
+
+def _load_buckets(key_of, hours: int) -> List[tuple]:
+    now = datetime.utcnow()
+    buckets = [hour_bucket(now - timedelta(hours=offset)) for offset in range(hours - 1, -1, -1)]
+    pipe = redis_db.redis_client.pipeline(transaction=False)
+    for bucket in buckets:
+        pipe.hgetall(key_of(bucket))
+    return list(zip(buckets, pipe.execute()))
+
+def get_org_metrics(org_id: str, integration_types: List[str], hours: int) -> Dict[str, Dict[str, Any]]:
+    """Get delivery metrics of an organization's integrations over the last `hours` hours"""
+    buckets = _load_buckets(lambda bucket: org_metrics_key(org_id, bucket), hours)
+    streaks = redis_db.redis_client.pipeline(transaction=False)
+    for integration_type in integration_types:
+        streaks.hget(failure_streak_key(f"integration:{org_id}:{integration_type}"), "count")
+
+    metrics = {}
+    for integration_type, streak in zip(integration_types, streaks.execute()):
+        metrics[integration_type] = summarize_metrics(buckets, integration_type)
+        metrics[integration_type]["consecutive_failures"] = int(streak or 0)
+    return metrics
+
+def get_type_metrics(integration_types: List[str], hours: int) -> Dict[str, Dict[str, Any]]:
+    """Get delivery metrics of every integration type across all organizations"""
+    buckets = _load_buckets(type_metrics_key, hours)
+    metrics = {}
+    for integration_type in integration_types:
+        summary = summarize_metrics(buckets, integration_type)
+        summary.pop("timeline")
+        metrics[integration_type] = summary
+    return metrics
+
+def delete_delivery_metrics(org_id: str):
+    """Delete an organization's metric buckets and failure streaks"""
+    keys = list(redis_db.redis_client.scan_iter(match=f"delivery_metrics:{org_id}:*"))
+    keys += list(redis_db.redis_client.scan_iter(match=f"delivery_failures:integration:{org_id}:*"))
+    if keys:
+        redis_db.redis_client.delete(*keys)
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+from utils.redis_db import redis_db
+
+# Kinds of notification buffered per integration and delivered as one digest
+COALESCED_KINDS = {"service.created", "service.deleted"}
+
+DIGEST_KIND_LABELS = {
+    "service.created": "service created",
+    "service.deleted": "service deleted",
+}
+
+# How long an integration's buffer collects events after its first one;
+# integrations override it with config["digest_window_seconds"] (0 sends every event right away)
+DIGEST_WINDOW_SECONDS = int(os.getenv("DIGEST_WINDOW_SECONDS", 30))
+
+# A buffer holding this many events is flushed without waiting for its window
+DIGEST_MAX_EVENTS = 50
+
+# Safety net so a buffer nobody flushes doesn't live forever
+DIGEST_BUFFER_TTL_SECONDS = 24 * 60 * 60
+
+# Buffers waiting to be flushed, scored by the time their window closes
+DIGEST_DUE = "digest:due"
+
+# Largest message each platform accepts, in characters (None means no practical limit)
+PLATFORM_MESSAGE_LIMITS = {
+    "discord": 2000,
+    "slack": 3000,
+    "google_workspace": 4000,
+    "teams": 20000,
+    "email": None,
+}
+
+DIGEST_SEPARATOR = "\n\n─────────\n\n"
+
+# Appends an event to an integration's buffer and schedules the buffer's flush:
+# at the end of the window opened by its first event, or right away once it is full
+_BUFFER_LUA = """
+local size = redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+if size >= tonumber(ARGV[4]) then
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[6])
+else
+    redis.call('ZADD', KEYS[2], 'NX', ARGV[3], ARGV[6])
+end
+return size
+"""
+
+# Claims the buffers whose window has closed; ZREM first so only one worker flushes each
+_CLAIM_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local claimed = {}
+for _, target_id in ipairs(due) do
+    if redis.call('ZREM', KEYS[1], target_id) == 1 then
+        table.insert(claimed, target_id)
+    end
+end
+return claimed
+"""
+
+_buffer = redis_db.redis_client.register_script(_BUFFER_LUA)
+_claim_due = redis_db.redis_client.register_script(_CLAIM_DUE_LUA)
+
+def digest_buffer_key(target_id: str) -> str:
+    return f"digest:{target_id}"
+
+def digest_window(target: Dict[str, Any]) -> int:
+    """Get the coalescing window of an integration, 0 when it isn't coalesced"""
+    try:
+        return max(int(target["config"].get("digest_window_seconds", DIGEST_WINDOW_SECONDS)), 0)
+    except (TypeError, ValueError):
+        return DIGEST_WINDOW_SECONDS
+
+def buffer_digest_event(pipe, target: Dict[str, Any], event: Dict[str, Any]):
+    """Add an event to the integration's digest buffer as part of the pipeline's transaction"""
+    now = time.time()
+    entry = {"kind": event["kind"], "message": event["message"], "subject": event["subject"]}
+    _buffer(
+        keys=[digest_buffer_key(target["id"]), DIGEST_DUE],
+        args=[json.dumps(entry), now, now + digest_window(target), DIGEST_MAX_EVENTS,
+              DIGEST_BUFFER_TTL_SECONDS, target["id"]],
+        client=pipe
+    )
+
+def render_digest(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Render buffered events as the header and message sections of one digest"""
+    if len(entries) == 1:
+        return {"subject": entries[0]["subject"], "header": None, "sections": [entries[0]["message"]]}
+
+    counts = Counter(DIGEST_KIND_LABELS.get(entry["kind"], entry["kind"]) for entry in entries)
+    summary = ", ".join(f"{count} {label}" for label, count in counts.most_common())
+    return {
+        "subject": f"📬 BurnStop Digest - {len(entries)} events",
+        "header": f"📬 **BurnStop Digest** - {len(entries)} events ({summary})",
+        "sections": [entry["message"] for entry in entries],
+    }
+
+def _split_section(section: str, limit: int) -> List[str]:
+    """Split one section that is longer than the limit at line breaks, or mid-line as a last resort"""
+    pieces, current = [], ""
+    for line in section.split("\n"):
+        while len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            pieces.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_digest(header: Optional[str], sections: List[str], limit: Optional[int]) -> List[str]:
+    """Pack digest sections into as few messages as fit the platform limit
+
+    Sections are only split when one alone exceeds the limit; when there are
+    several chunks each one repeats the header with its part number.
+    """
+    if limit is None:
+        return [DIGEST_SEPARATOR.join(([header] if header else []) + sections)]
+
+    # Leave room for the "(part n/m)" suffix added below
+    reserve = len(header) + len(DIGEST_SEPARATOR) + 16 if header else 0
+    budget = max(limit - reserve, 1)
+
+    pieces = []
+    for section in sections:
+        pieces.extend(_split_section(section, budget) if len(section) > budget else [section])
+
+    chunks, current = [], []
+    for piece in pieces:
+        if current and len(DIGEST_SEPARATOR.join(current + [piece])) > budget:
+            chunks.append(current)
+            current = []
+        current.append(piece)
+    if current:
+        chunks.append(current)
+
+    if not header:
+        return [DIGEST_SEPARATOR.join(chunk) for chunk in chunks]
+
+    messages = []
+    for index, chunk in enumerate(chunks):
+        title = header if len(chunks) == 1 else f"{header} (part {index + 1}/{len(chunks)})"
+        messages.append(DIGEST_SEPARATOR.join([title] + chunk))
+    return messages
+
+def claim_due_digests(count: int = 100) -> List[str]:
+    """Claim the integrations whose digest window has closed"""
+    return _claim_due(keys=[DIGEST_DUE], args=[time.time(), count])
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import List, Dict, Any, Iterable, Optional
+from urllib.parse import urlsplit
+
+from utils.redis_db import redis_db
+from utils.integrations import IntegrationService
+from utils.rate_limits import RateLimited
+from utils.templates import AlertRenderer, load_template_overrides
+from models.integration import IntegrationType
+
+# Deliveries in flight at once for one fan-out
+DISPATCH_CONCURRENCY = 20
+
+# Deliveries in flight at once to the same webhook host or SMTP server
+DESTINATION_CONCURRENCY = 4
+
+# The whole fan-out gives up after this long; targets still running are reported as timed out
+DISPATCH_DEADLINE_SECONDS = 15.0
+
+def alert_target(
+    target_id: str,
+    integration_type: str,
+    config: Dict[str, Any],
+    updated_at: Optional[str] = None
+) -> Dict[str, Any]:
+    """Describe one delivery: an integration type and its config (updated_at versions its compiled rules)"""
+    return {"id": target_id, "type": integration_type, "config": config, "updated_at": updated_at}
+
+def load_alert_targets(org_ids: Iterable[str]) -> List[Dict[str, Any]]:
+    """Get the enabled integrations of the given organizations with a single MGET"""
+    keys = [
+        f"integration:{org_id}:{integration_type.value}"
+        for org_id in dict.fromkeys(org_ids)
+        for integration_type in IntegrationType
+    ]
+    targets = []
+    for key, integration_data in zip(keys, redis_db.mget(keys)):
+        if integration_data and integration_data.get("enabled", False):
+            targets.append(alert_target(
+                key, integration_data["type"], integration_data["config"], integration_data.get("updated_at")
+            ))
+    return targets
+
+def target_org(target: Dict[str, Any]) -> Optional[str]:
+    """Get the organization of a stored integration, None for ad-hoc targets like test configs"""
+    parts = target["id"].split(":")
+    return parts[1] if len(parts) == 3 and parts[0] == "integration" else None
+
+def destination_of(target: Dict[str, Any]) -> str:
+    """Get the host a target delivers to, used for the per-destination cap"""
+    config = target["config"]
+    if config.get("webhook_url"):
+        return urlsplit(config["webhook_url"]).netloc.lower()
+    return str(config.get("smtp_server", target["type"])).lower()
+
+async def dispatch_alert(
+    targets: List[Dict[str, Any]],
+    message: str,
+    subject: str,
+    deadline: float = DISPATCH_DEADLINE_SECONDS,
+    concurrency: int = DISPATCH_CONCURRENCY,
+    per_destination: int = DESTINATION_CONCURRENCY,
+    kind: str = "alert"
+) -> List[Dict[str, Any]]:
+    """Send one alert to every target concurrently and report the outcome per target
+
+    The alert is rendered once per integration type (and organization template
+    override) and the payload shared by every target using it.
+
+    Each result has the target id and type, success, a status of sent, failed,
+    error, rate_limited (with the retry_after seconds) or timeout, the time the
+    send itself took (latency_ms) and the time since the fan-out started (elapsed_ms).
+    """
+    if not targets:
+        return []
+
+    org_ids = [target_org(target) for target in targets if target_org(target)]
+    overrides = await asyncio.to_thread(load_template_overrides, org_ids) if org_ids else None
+    renderer = AlertRenderer(message, subject, kind, overrides)
+
+    global_limit = asyncio.Semaphore(concurrency)
+    destination_limits: Dict[str, asyncio.Semaphore] = {}
+    results = [
+        {"target": target["id"], "type": target["type"], "success": False, "status": "timeout", "elapsed_ms": None}
+        for target in targets
+    ]
+    started = time.perf_counter()
+
+    async def deliver(index: int, target: Dict[str, Any]):
+        destination = destination_of(target)
+        if destination not in destination_limits:
+            destination_limits[destination] = asyncio.Semaphore(per_destination)
+
+        async with global_limit, destination_limits[destination]:
+            sending = time.perf_counter()
+            try:
+                success = await IntegrationService.send_alert_to_integration(
+                    integration_type=target["type"],
+                    config=target["config"],
+                    message=message,
+                    subject=subject,
+                    rendered=renderer.render(target["type"], target_org(target))
+                )
+                results[index].update(success=success, status="sent" if success else "failed")
+            except RateLimited as e:
+                results[index].update(status="rate_limited", retry_after=e.retry_after, error=str(e))
+            except Exception as e:
+                results[index].update(status="error", error=str(e))
+            finished = time.perf_counter()
+            results[index]["latency_ms"] = round((finished - sending) * 1000, 1)
+            results[index]["elapsed_ms"] = round((finished - started) * 1000, 1)
+
+    tasks = [asyncio.create_task(deliver(index, target)) for index, target in enumerate(targets)]
+    _, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return results
+
+def summarize_dispatch(results: List[Dict[str, Any]]) -> str:
+    """Render dispatch results as "sent/total" for logs"""
+    return f"{sum(1 for result in results if result['success'])}/{len(results)}"
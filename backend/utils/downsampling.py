@@ -0,0 +1,71 @@
+from typing import List, Optional
+
+import numpy as np
+
+from utils.redis_db import redis_db
+
+# Downsampled series are cached per org revision; the TTL only bounds memory
+# for point counts that are requested once and never again
+DOWNSAMPLE_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Pick `threshold` points of a series with Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept. Each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries over the points between the first and the last one
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    # Averages of every bucket, used as the third corner for the previous bucket
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    average_x = np.append(sums_x / counts, x[-1])
+    average_y = np.append(sums_y / counts, y[-1])
+
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = average_x[bucket + 1], average_y[bucket + 1]
+        ax, ay = x[selected], y[selected]
+
+        areas = np.abs(
+            (ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay)
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+def downsample_cost_trend(cost_trend: List[dict], max_points: int) -> List[dict]:
+    """Downsample a date-sorted cost trend to at most max_points entries"""
+    if len(cost_trend) <= max_points:
+        return cost_trend
+
+    x = np.array([entry.get("date", "") for entry in cost_trend], dtype="datetime64[us]").astype(np.float64)
+    y = np.array([entry.get("cost", 0) for entry in cost_trend], dtype=np.float64)
+    return [cost_trend[i] for i in lttb_indices(x, y, max_points)]
+
+def get_downsampled_trend(org_id: str, revision: int, max_points: int) -> Optional[List[dict]]:
+    """Get a cached downsampled cost trend if it was built at the given org revision"""
+    cached = redis_db.get(f"cost_trend_lttb:{org_id}:{max_points}")
+    if not cached or cached.get("revision") != revision:
+        return None
+    return cached["points"]
+
+def store_downsampled_trend(org_id: str, revision: int, max_points: int, points: List[dict]):
+    """Cache a downsampled cost trend for the given org revision"""
+    redis_db.set(
+        f"cost_trend_lttb:{org_id}:{max_points}",
+        {"revision": revision, "points": points},
+        ex=DOWNSAMPLE_CACHE_TTL_SECONDS
+    )
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+# SMTP work runs on these threads so a slow mail server never blocks the event loop
+SMTP_WORKER_THREADS = 8
+
+# Open sessions allowed per SMTP account; providers like Gmail cap concurrent connections
+MAX_SESSIONS_PER_ACCOUNT = 3
+
+# Idle sessions older than this are closed instead of reused (servers drop them anyway)
+SESSION_IDLE_SECONDS = 60
+
+SMTP_TIMEOUT_SECONDS = 10
+
+# Errors meaning the session is gone, not that the message was rejected
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+# One outgoing email: sender address, recipient addresses and the rendered message
+Envelope = Tuple[str, List[str], str]
+
+class SMTPAccount:
+    """Connection settings of one SMTP login"""
+
+    def __init__(self, server: str, port: int, username: str, password: Optional[str], use_tls: bool = True):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+
+    @property
+    def key(self) -> str:
+        """Identify the account without keeping its password in the pool's keys"""
+        secret = hashlib.sha256((self.password or "").encode()).hexdigest()[:16]
+        return f"{self.server}:{self.port}:{self.username}:{secret}:{self.use_tls}"
+
+    def connect(self) -> smtplib.SMTP:
+        """Open an authenticated session"""
+        session = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if self.use_tls:
+                session.starttls()
+            if self.password:
+                session.login(self.username, self.password)
+        except Exception:
+            session.close()
+            raise
+        return session
+
+class _SessionPool:
+    """Idle sessions of one account, plus a cap on how many exist at once"""
+
+    def __init__(self, account: SMTPAccount):
+        self.account = account
+        self.slots = threading.BoundedSemaphore(MAX_SESSIONS_PER_ACCOUNT)
+        self.idle: Deque[Tuple[smtplib.SMTP, float]] = deque()
+        self.lock = threading.Lock()
+
+    def checkout(self) -> smtplib.SMTP:
+        """Take an idle session (newest first) or open a new one; call with a slot held"""
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                session, released_at = self.idle.pop()
+                if now - released_at < SESSION_IDLE_SECONDS:
+                    return session
+                _quit(session)
+        return self.account.connect()
+
+    def checkin(self, session: smtplib.SMTP):
+        with self.lock:
+            self.idle.append((session, time.monotonic()))
+
+    def close(self):
+        with self.lock:
+            while self.idle:
+                _quit(self.idle.pop()[0])
+
+def _quit(session: smtplib.SMTP):
+    try:
+        session.quit()
+    except Exception:
+        session.close()
+
+_executor = ThreadPoolExecutor(max_workers=SMTP_WORKER_THREADS, thread_name_prefix="smtp")
+_pools: Dict[str, _SessionPool] = {}
+_pools_lock = threading.Lock()
+
+def _pool_for(account: SMTPAccount) -> _SessionPool:
+    with _pools_lock:
+        if account.key not in _pools:
+            _pools[account.key] = _SessionPool(account)
+        return _pools[account.key]
+
+def send_envelopes(account: SMTPAccount, envelopes: List[Envelope]) -> int:
+    """Send several emails over one pooled session (blocking; runs on an SMTP thread)
+
+    A session that turns out to be dead is replaced and the message retried
+    once. Returns the number of emails sent.
+    """
+    pool = _pool_for(account)
+    with pool.slots:
+        session = pool.checkout()
+        try:
+            for from_addr, to_addrs, message in envelopes:
+                try:
+                    session.sendmail(from_addr, to_addrs, message)
+                except _CONNECTION_ERRORS:
+                    session.close()
+                    session = account.connect()
+                    session.sendmail(from_addr, to_addrs, message)
+        except Exception:
+            session.close()
+            raise
+        pool.checkin(session)
+    return len(envelopes)
+
+async def send_emails(account: SMTPAccount, envelopes: List[Envelope]) -> int:
+    """Send several emails over one pooled session without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, send_envelopes, account, envelopes)
+
+def close_email_transport():
+    """Log out of every idle pooled session"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
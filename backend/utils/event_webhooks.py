@@ -0,0 +1,398 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import secrets
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from utils.redis_db import redis_db
+from utils.http_client import post_content
+from utils.rate_limits import retry_after_from_headers
+
+# Events an outbound webhook can subscribe to
+EVENT_TYPES = ["service.created", "service.updated", "service.deleted", "reminder.due", "budget.crossed"]
+
+MAX_EVENT_WEBHOOKS = 10
+DEFAULT_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 1000
+DEFAULT_BATCH_MS = 1000
+MAX_BATCH_MS = 60000
+
+# Events kept per organization outbox; a subscriber further behind than this skips the trimmed ones
+OUTBOX_MAXLEN = 100000
+OUTBOX_READ_COUNT = 1000
+
+# Organizations with outbox events to look at, scored by when to look
+OUTBOX_DUE = "event_outbox:due"
+
+# One flusher per organization at a time keeps each subscriber's batches in order. A flush
+# starts no batch after FLUSH_DEADLINE_SECONDS and gives each POST at most POST_TIMEOUT_SECONDS
+# in total (httpx's read timeout is per read, so a trickling subscriber could hold it longer),
+# so it ends well before the lock expires
+FLUSH_LOCK_SECONDS = 60
+FLUSH_DEADLINE_SECONDS = 30
+POST_TIMEOUT_SECONDS = 15
+MAX_BATCHES_PER_FLUSH = 4
+
+BASE_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 15 * 60
+
+SIGNATURE_HEADER = "X-BurnStop-Signature"
+SIGNATURE_TOLERANCE_SECONDS = 5 * 60
+
+# Deletes the flush lock only if this flusher still holds it
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Writes a subscriber's delivery state only while the flush lock is still held:
+# ARGV = token, number of fields to set, field/value pairs, then fields to delete
+_WRITE_STATE_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+local pairs_end = 2 + tonumber(ARGV[2]) * 2
+for i = 3, pairs_end, 2 do
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+if #ARGV > pairs_end then
+    redis.call('HDEL', KEYS[2], unpack(ARGV, pairs_end + 1))
+end
+return 1
+"""
+
+_release_lock = redis_db.redis_client.register_script(_RELEASE_LOCK_LUA)
+_write_state = redis_db.redis_client.register_script(_WRITE_STATE_LUA)
+
+class FlushLockLost(Exception):
+    """The flush lock expired mid-flush; another flusher may own the outbox now"""
+
+class EventWebhookError(ValueError):
+    """An invalid webhook subscription"""
+
+def webhooks_key(org_id: str) -> str:
+    return f"event_webhooks:{org_id}"
+
+def webhook_state_key(org_id: str) -> str:
+    return f"event_webhook_state:{org_id}"
+
+def outbox_key(org_id: str) -> str:
+    return f"event_outbox:{org_id}"
+
+def flush_lock_key(org_id: str) -> str:
+    return f"event_outbox_lock:{org_id}"
+
+def sign_payload(secret: str, timestamp: int, body: bytes) -> str:
+    """Get the signature header value of a delivery: HMAC-SHA256 over "<timestamp>.<body>" """
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+def verify_signature(secret: str, header: str, body: bytes, now: Optional[float] = None) -> bool:
+    """Check a delivery's signature header, rejecting ones older than SIGNATURE_TOLERANCE_SECONDS"""
+    parts = dict(part.split("=", 1) for part in header.split(",") if "=" in part)
+    try:
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > SIGNATURE_TOLERANCE_SECONDS:
+        return False
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), f"t={timestamp},v1={parts.get('v1', '')}")
+
+def has_event_webhooks(org_id: str) -> bool:
+    return bool(redis_db.redis_client.exists(webhooks_key(org_id)))
+
+def emit_event(pipe, org_id: str, event_type: str, data: Dict[str, Any]):
+    """Append an event to the organization's outbox if anything subscribes to outbound webhooks
+
+    Use the same pipeline as the mutation so the event exists if and only if
+    the mutation was committed.
+    """
+    if not has_event_webhooks(org_id):
+        return
+    target = pipe if pipe is not None else redis_db.pipeline()
+    target.xadd(outbox_key(org_id), {
+        "type": event_type,
+        "data": json.dumps(data),
+        "created_at": datetime.utcnow().isoformat(),
+    }, maxlen=OUTBOX_MAXLEN, approximate=True)
+    # LT only moves the organization earlier, never delays a batch already due
+    target.zadd(OUTBOX_DUE, {org_id: time.time()}, lt=True)
+    if pipe is None:
+        target.execute()
+
+def emit_service_event(pipe, org_id: str, old_data: Optional[dict], new_data: dict):
+    """Emit service.created, service.updated or service.deleted for one service mutation"""
+    if old_data is None:
+        event_type = "service.created"
+    elif new_data.get("status") == "active":
+        event_type = "service.updated"
+    elif old_data.get("status") == "active":
+        event_type = "service.deleted"
+    else:
+        return
+    emit_event(pipe, org_id, event_type, new_data)
+
+def _validate(url: str, events: List[str], batch_size: int, batch_ms: int):
+    if not url.startswith(("https://", "http://")):
+        raise EventWebhookError("The webhook URL must be http(s)")
+    unknown = set(events) - set(EVENT_TYPES)
+    if unknown or not events:
+        raise EventWebhookError(f"Subscribe to one or more of: {', '.join(EVENT_TYPES)}")
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise EventWebhookError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    if not 0 <= batch_ms <= MAX_BATCH_MS:
+        raise EventWebhookError(f"batch_ms must be between 0 and {MAX_BATCH_MS}")
+
+def _latest_event_id(org_id: str) -> str:
+    newest = redis_db.redis_client.xrevrange(outbox_key(org_id), count=1)
+    return newest[0][0] if newest else "0-0"
+
+def list_event_webhooks(org_id: str) -> List[Dict[str, Any]]:
+    """Get an organization's subscriptions, oldest first, with their delivery state"""
+    pipe = redis_db.redis_client.pipeline(transaction=False)
+    pipe.hvals(webhooks_key(org_id))
+    pipe.hgetall(webhook_state_key(org_id))
+    raw_webhooks, state = pipe.execute()
+
+    webhooks = []
+    for raw in raw_webhooks:
+        webhook = json.loads(raw)
+        retry_at = state.get(f"{webhook['id']}:retry_at")
+        webhook["failures"] = int(state.get(f"{webhook['id']}:failures", 0))
+        webhook["last_error"] = state.get(f"{webhook['id']}:last_error")
+        webhook["next_retry_at"] = datetime.utcfromtimestamp(float(retry_at)).isoformat() if retry_at else None
+        webhooks.append(webhook)
+    return sorted(webhooks, key=lambda webhook: webhook["created_at"])
+
+def get_event_webhook(org_id: str, webhook_id: str) -> Optional[Dict[str, Any]]:
+    raw = redis_db.redis_client.hget(webhooks_key(org_id), webhook_id)
+    return json.loads(raw) if raw else None
+
+def create_event_webhook(org_id: str, url: str, events: List[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                         batch_ms: int = DEFAULT_BATCH_MS, enabled: bool = True) -> Dict[str, Any]:
+    """Subscribe a URL to an organization's events, starting after the newest one
+
+    The returned subscription holds the signing secret.
+    """
+    _validate(url, events, batch_size, batch_ms)
+    if redis_db.redis_client.hlen(webhooks_key(org_id)) >= MAX_EVENT_WEBHOOKS:
+        raise EventWebhookError(f"Organizations are limited to {MAX_EVENT_WEBHOOKS} webhooks")
+
+    now = datetime.utcnow().isoformat()
+    webhook = {
+        "id": str(uuid.uuid4()),
+        "organization_id": org_id,
+        "url": url,
+        "events": list(dict.fromkeys(events)),
+        "batch_size": batch_size,
+        "batch_ms": batch_ms,
+        "enabled": enabled,
+        "secret": secrets.token_urlsafe(32),
+        "created_at": now,
+        "updated_at": now,
+    }
+    pipe = redis_db.pipeline()
+    pipe.hset(webhooks_key(org_id), webhook["id"], json.dumps(webhook))
+    pipe.hset(webhook_state_key(org_id), f"{webhook['id']}:cursor", _latest_event_id(org_id))
+    pipe.execute()
+    return webhook
+
+def update_event_webhook(org_id: str, webhook_id: str, changes: Dict[str, Any],
+                         rotate_secret: bool = False) -> Optional[Dict[str, Any]]:
+    """Change a subscription; re-enabling it skips the events emitted while it was off"""
+    webhook = get_event_webhook(org_id, webhook_id)
+    if not webhook:
+        return None
+
+    was_enabled = webhook["enabled"]
+    webhook.update({field: value for field, value in changes.items() if value is not None})
+    _validate(webhook["url"], webhook["events"], webhook["batch_size"], webhook["batch_ms"])
+    if rotate_secret:
+        webhook["secret"] = secrets.token_urlsafe(32)
+    webhook["updated_at"] = datetime.utcnow().isoformat()
+
+    pipe = redis_db.pipeline()
+    pipe.hset(webhooks_key(org_id), webhook_id, json.dumps(webhook))
+    if webhook["enabled"] and not was_enabled:
+        pipe.hset(webhook_state_key(org_id), f"{webhook_id}:cursor", _latest_event_id(org_id))
+        pipe.hdel(webhook_state_key(org_id), f"{webhook_id}:failures", f"{webhook_id}:retry_at", f"{webhook_id}:last_error")
+    pipe.execute()
+    return webhook
+
+def delete_event_webhook(org_id: str, webhook_id: str) -> bool:
+    pipe = redis_db.pipeline()
+    pipe.hdel(webhooks_key(org_id), webhook_id)
+    pipe.hdel(webhook_state_key(org_id), *(f"{webhook_id}:{field}" for field in ("cursor", "failures", "retry_at", "last_error")))
+    pipe.hlen(webhooks_key(org_id))
+    deleted, _, remaining = pipe.execute()
+    if not remaining:
+        delete_event_webhooks(org_id)
+    return bool(deleted)
+
+def delete_event_webhooks(org_id: str):
+    """Delete an organization's subscriptions and its outbox"""
+    redis_db.redis_client.delete(webhooks_key(org_id), webhook_state_key(org_id), outbox_key(org_id))
+    redis_db.redis_client.zrem(OUTBOX_DUE, org_id)
+
+def _entry_seconds(entry_id: str) -> float:
+    return int(entry_id.split("-", 1)[0]) / 1000
+
+def _stream_id(entry_id: str) -> tuple:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+def backoff_seconds(failures: int) -> float:
+    return min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (failures - 1))
+
+def _save_state(org_id: str, token: str, webhook_id: str, values: Dict[str, Any], cleared: Tuple[str, ...] = ()):
+    """Write a subscriber's delivery state, or raise FlushLockLost if this flusher no longer holds the lock"""
+    args = [token, len(values)]
+    for field, value in values.items():
+        args += [f"{webhook_id}:{field}", value]
+    args += [f"{webhook_id}:{field}" for field in cleared]
+    if not _write_state(keys=[flush_lock_key(org_id), webhook_state_key(org_id)], args=args):
+        raise FlushLockLost(f"Lost the outbox lock of org {org_id}")
+
+async def post_event_batch(webhook: Dict[str, Any], events: List[Dict[str, Any]],
+                           timeout: float = POST_TIMEOUT_SECONDS) -> Tuple[bool, Optional[float], Optional[str]]:
+    """POST one signed batch within `timeout` seconds; returns (delivered, retry_after, error)"""
+    body = json.dumps({
+        "delivery_id": str(uuid.uuid4()),
+        "organization_id": webhook["organization_id"],
+        "events": events,
+    }, separators=(",", ":")).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": "BurnStop-Webhooks/1.0",
+        SIGNATURE_HEADER: sign_payload(webhook["secret"], int(time.time()), body),
+    }
+    try:
+        response = await asyncio.wait_for(post_content(webhook["url"], body, headers), timeout)
+    except Exception as e:
+        return False, None, f"{type(e).__name__}: {e}"
+    if 200 <= response.status_code < 300:
+        return True, None, None
+    return False, retry_after_from_headers(response.headers), f"HTTP {response.status_code}"
+
+async def _flush_webhook(org_id: str, token: str, webhook: Dict[str, Any], state: Dict[str, str],
+                         now: float, deadline: float) -> Tuple[int, Optional[float]]:
+    """Deliver a subscriber's ready batches in order until the deadline; returns (events sent, when to look again or None)"""
+    webhook_id = webhook["id"]
+    retry_at = float(state.get(f"{webhook_id}:retry_at", 0))
+    if retry_at > now:
+        return 0, retry_at
+
+    cursor = state.get(f"{webhook_id}:cursor", "0-0")
+    wanted = set(webhook["events"])
+    sent = 0
+    for _ in range(MAX_BATCHES_PER_FLUSH):
+        if time.time() + POST_TIMEOUT_SECONDS > deadline:
+            break
+        entries = redis_db.redis_client.xrange(outbox_key(org_id), min=f"({cursor}", count=OUTBOX_READ_COUNT)
+        if not entries:
+            return sent, None
+
+        events, last_id = [], entries[-1][0]
+        for entry_id, fields in entries:
+            if fields["type"] in wanted:
+                events.append({
+                    "id": entry_id,
+                    "type": fields["type"],
+                    "created_at": fields["created_at"],
+                    "data": json.loads(fields["data"]),
+                })
+                if len(events) == webhook["batch_size"]:
+                    last_id = entry_id
+                    break
+
+        if not events:
+            # Nothing this subscriber wants; move past it
+            cursor = last_id
+            _save_state(org_id, token, webhook_id, {"cursor": cursor})
+            continue
+
+        window_closes = _entry_seconds(events[0]["id"]) + webhook["batch_ms"] / 1000
+        backlog = len(entries) == OUTBOX_READ_COUNT
+        if len(events) < webhook["batch_size"] and not backlog and window_closes > now:
+            return sent, window_closes
+
+        delivered, retry_after, error = await post_event_batch(webhook, events)
+        if delivered:
+            cursor = last_id
+            _save_state(org_id, token, webhook_id, {"cursor": cursor}, ("failures", "retry_at", "last_error"))
+            sent += len(events)
+            continue
+
+        # The cursor stays put, so the same events are sent again (at least once)
+        failures = int(state.get(f"{webhook_id}:failures", 0)) + 1
+        retry_at = time.time() + max(backoff_seconds(failures), retry_after or 0)
+        _save_state(org_id, token, webhook_id, {"failures": failures, "retry_at": retry_at, "last_error": error})
+        print(f"Event webhook {webhook_id} of org {org_id} failed ({error}), attempt {failures}; retrying in {retry_at - time.time():.0f}s")
+        return sent, retry_at
+
+    # More ready batches are waiting (or the flush ran out of time); come back right away
+    return sent, now
+
+async def flush_outbox(org_id: str) -> int:
+    """Deliver an organization's ready event batches to its subscribers and schedule the next look"""
+    token = uuid.uuid4().hex
+    lock = flush_lock_key(org_id)
+    if not redis_db.redis_client.set(lock, token, nx=True, ex=FLUSH_LOCK_SECONDS):
+        return 0
+
+    try:
+        head = _latest_event_id(org_id)
+        pipe = redis_db.redis_client.pipeline(transaction=False)
+        pipe.hvals(webhooks_key(org_id))
+        pipe.hgetall(webhook_state_key(org_id))
+        raw_webhooks, state = pipe.execute()
+        webhooks = [webhook for webhook in map(json.loads, raw_webhooks) if webhook["enabled"]]
+
+        now = time.time()
+        deadline = now + FLUSH_DEADLINE_SECONDS
+        outcomes = await asyncio.gather(
+            *(_flush_webhook(org_id, token, webhook, state, now, deadline) for webhook in webhooks),
+            return_exceptions=True
+        )
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            # The outbox belongs to whoever took the lock over (its cursors didn't move)
+            if any(isinstance(error, FlushLockLost) for error in errors):
+                print(f"Event outbox flush of org {org_id} lost its lock; leaving the outbox to the new flusher")
+                return 0
+            raise errors[0]
+        next_due = min((due for _, due in outcomes if due is not None), default=None)
+
+        if next_due is None:
+            redis_db.redis_client.zrem(OUTBOX_DUE, org_id)
+        else:
+            redis_db.redis_client.zadd(OUTBOX_DUE, {org_id: next_due})
+        # An event emitted while we were flushing may have had its due time overwritten above
+        if _latest_event_id(org_id) != head:
+            redis_db.redis_client.zadd(OUTBOX_DUE, {org_id: time.time()}, lt=True)
+
+        # Events every enabled subscriber has received are no longer needed
+        delivered_up_to = redis_db.redis_client.hmget(webhook_state_key(org_id), [f"{webhook['id']}:cursor" for webhook in webhooks]) if webhooks else []
+        if delivered_up_to and all(delivered_up_to):
+            redis_db.redis_client.xtrim(outbox_key(org_id), minid=min(delivered_up_to, key=_stream_id), approximate=False)
+        return sum(sent for sent, _ in outcomes)
+    finally:
+        _release_lock(keys=[lock], args=[token])
+
+async def deliver_due_event_webhooks(count: int = 50, owns: Optional[Callable[[str], bool]] = None) -> int:
+    """Flush the outboxes of organizations whose batches are due, each under its own lock
+
+    `owns` limits the flush to the organizations this worker owns in a work group.
+    """
+    due = redis_db.redis_client.zrangebyscore(OUTBOX_DUE, "-inf", time.time(), start=0, num=count)
+    if owns is not None:
+        due = [org_id for org_id in due if owns(org_id)]
+    if not due:
+        return 0
+    return sum(await asyncio.gather(*(flush_outbox(org_id) for org_id in due)))
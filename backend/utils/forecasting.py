@@ -0,0 +1,236 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from utils.redis_db import redis_db
+from utils.rollups import month_range, load_rollup_matrix
+
+# Months of rollup history fed into the models
+FORECAST_HISTORY_MONTHS = 24
+
+# Months held out at the end of each series to score the models
+BACKTEST_MONTHS = 3
+
+SEASON_LENGTH = 12
+
+# Holt-Winters smoothing factors (level, trend, season)
+HW_ALPHA = 0.5
+HW_BETA = 0.1
+HW_GAMMA = 0.2
+
+# Two sided 95% interval
+CONFIDENCE_Z = 1.96
+
+MODELS = ("linear", "holt_winters", "seasonal_naive")
+
+def _fill_leading(Y: np.ndarray) -> np.ndarray:
+    """Replace leading NaNs with the first observed value of each row (all-NaN rows become 0)"""
+    Y = Y.copy()
+    valid = ~np.isnan(Y)
+    has_value = valid.any(axis=1)
+    first = np.argmax(valid, axis=1)
+    first_value = np.where(has_value, Y[np.arange(Y.shape[0]), first], 0.0)
+    return np.where(valid, Y, first_value[:, None])
+
+def linear_forecast(Y: np.ndarray, horizon: int) -> np.ndarray:
+    """Least-squares trend line per row over its observed points"""
+    n, T = Y.shape
+    valid = ~np.isnan(Y)
+    w = valid.astype(float)
+    y = np.where(valid, Y, 0.0)
+    x = np.arange(T, dtype=float)
+
+    count = w.sum(axis=1)
+    sum_x = w @ x
+    sum_y = y.sum(axis=1)
+    sum_xy = y @ x
+    sum_xx = w @ (x * x)
+
+    denominator = count * sum_xx - sum_x * sum_x
+    safe = np.abs(denominator) > 1e-12
+    slope = np.where(safe, (count * sum_xy - sum_x * sum_y) / np.where(safe, denominator, 1.0), 0.0)
+    intercept = np.where(count > 0, (sum_y - slope * sum_x) / np.maximum(count, 1.0), 0.0)
+
+    future_x = T - 1 + np.arange(1, horizon + 1, dtype=float)
+    return intercept[:, None] + slope[:, None] * future_x[None, :]
+
+def holt_winters_forecast(Y: np.ndarray, horizon: int) -> np.ndarray:
+    """Additive Holt-Winters per row; falls back to Holt's linear trend without two full seasons"""
+    Y = _fill_leading(Y)
+    n, T = Y.shape
+    steps = np.arange(1, horizon + 1)
+
+    if T == 1:
+        return np.repeat(Y[:, :1], horizon, axis=1)
+
+    seasonal = T >= 2 * SEASON_LENGTH
+    if seasonal:
+        first_season = Y[:, :SEASON_LENGTH].mean(axis=1)
+        second_season = Y[:, SEASON_LENGTH:2 * SEASON_LENGTH].mean(axis=1)
+        level = first_season
+        trend = (second_season - first_season) / SEASON_LENGTH
+        season = Y[:, :SEASON_LENGTH] - first_season[:, None]
+        start = SEASON_LENGTH
+    else:
+        level = Y[:, 0].copy()
+        trend = Y[:, 1] - Y[:, 0]
+        season = np.zeros((n, 1))
+        start = 1
+
+    # The recursion runs over time only; every step updates all series at once
+    for t in range(start, T):
+        slot = t % season.shape[1]
+        previous_level = level
+        level = HW_ALPHA * (Y[:, t] - season[:, slot]) + (1 - HW_ALPHA) * (level + trend)
+        trend = HW_BETA * (level - previous_level) + (1 - HW_BETA) * trend
+        if seasonal:
+            season[:, slot] = HW_GAMMA * (Y[:, t] - level) + (1 - HW_GAMMA) * season[:, slot]
+
+    forecast = level[:, None] + trend[:, None] * steps[None, :]
+    if seasonal:
+        forecast += season[:, (T + steps - 1) % SEASON_LENGTH]
+    return forecast
+
+def seasonal_naive_forecast(Y: np.ndarray, horizon: int) -> np.ndarray:
+    """Repeat the value from one season earlier, or the last value for series shorter than a season"""
+    Y = _fill_leading(Y)
+    T = Y.shape[1]
+    if T < SEASON_LENGTH:
+        return np.repeat(Y[:, -1:], horizon, axis=1)
+    columns = T - SEASON_LENGTH + (np.arange(horizon) % SEASON_LENGTH)
+    return Y[:, columns]
+
+_MODEL_FUNCTIONS = {
+    "linear": linear_forecast,
+    "holt_winters": holt_winters_forecast,
+    "seasonal_naive": seasonal_naive_forecast,
+}
+
+def forecast_matrix(Y: np.ndarray, horizon: int = 1) -> Dict[str, np.ndarray]:
+    """Forecast every row of a (series x months) matrix in one batched pass
+
+    Each model is backtested on the last BACKTEST_MONTHS of every series and
+    the model with the lowest mean absolute error is picked per series. The
+    confidence interval is derived from that model's backtest RMSE.
+    """
+    n, T = Y.shape
+    if n == 0:
+        empty = np.zeros((0, horizon))
+        return {"model": np.zeros(0, dtype=int), "forecast": empty, "lower": empty, "upper": empty, "spread": empty, "backtest_error": np.zeros(0)}
+
+    holdout = BACKTEST_MONTHS if T > BACKTEST_MONTHS + 1 else 0
+
+    # Services created inside the holdout window can't be scored and get the naive model
+    choice = np.full(n, MODELS.index("seasonal_naive"))
+    backtest_error = np.full(n, np.nan)
+    sigma = np.zeros(n)
+
+    if holdout:
+        train, actual = Y[:, :-holdout], Y[:, -holdout:]
+        errors = np.stack([
+            _MODEL_FUNCTIONS[name](train, holdout) - actual for name in MODELS
+        ])
+        scored = ~np.isnan(errors)
+        count = scored.sum(axis=2)
+        mae = np.where(count > 0, np.where(scored, np.abs(errors), 0).sum(axis=2) / np.maximum(count, 1), np.inf)
+        rmse = np.sqrt(np.where(scored, errors ** 2, 0).sum(axis=2) / np.maximum(count, 1))
+
+        scorable = ~np.isnan(train).all(axis=1) & (count[0] > 0)
+        rows = np.flatnonzero(scorable)
+        best = np.argmin(mae[:, rows], axis=0)
+        choice[rows] = best
+        backtest_error[rows] = mae[best, rows]
+        sigma[rows] = rmse[best, rows]
+
+    forecasts = np.stack([_MODEL_FUNCTIONS[name](Y, horizon) for name in MODELS])
+    forecast = np.take_along_axis(forecasts, choice[None, :, None], axis=0)[0]
+    forecast = np.maximum(forecast, 0)  # Don't predict negative costs
+
+    spread = CONFIDENCE_Z * sigma[:, None] * np.sqrt(np.arange(1, horizon + 1))[None, :]
+
+    return {
+        "model": choice,
+        "forecast": forecast,
+        "lower": np.maximum(forecast - spread, 0),
+        "upper": forecast + spread,
+        "spread": spread,
+        "backtest_error": backtest_error,
+    }
+
+def aggregate_forecasts(result: Dict[str, np.ndarray], group_index: np.ndarray, groups: int) -> Dict[str, np.ndarray]:
+    """Sum per-series forecasts into groups, combining interval widths as independent errors"""
+    horizon = result["forecast"].shape[1]
+    forecast = np.zeros((groups, horizon))
+    variance = np.zeros((groups, horizon))
+    backtest_error = np.zeros(groups)
+
+    np.add.at(forecast, group_index, result["forecast"])
+    np.add.at(variance, group_index, result["spread"] ** 2)
+    np.add.at(backtest_error, group_index, np.nan_to_num(result["backtest_error"]))
+
+    spread = np.sqrt(variance)
+    return {
+        "model": None,
+        "forecast": forecast,
+        "lower": np.maximum(forecast - spread, 0),
+        "upper": forecast + spread,
+        "spread": spread,
+        "backtest_error": backtest_error,
+    }
+
+def _series_result(result: Dict[str, np.ndarray], row: int) -> dict:
+    error = result["backtest_error"][row]
+    return {
+        "model": "bottom_up" if result["model"] is None else MODELS[int(result["model"][row])],
+        "forecast": [round(float(v), 2) for v in result["forecast"][row]],
+        "lower": [round(float(v), 2) for v in result["lower"][row]],
+        "upper": [round(float(v), 2) for v in result["upper"][row]],
+        "backtest_error": None if np.isnan(error) else round(float(error), 2),
+    }
+
+def _future_months(last_month: str, horizon: int) -> List[str]:
+    year, month = int(last_month[:4]), int(last_month[5:7])
+    months = []
+    for _ in range(horizon):
+        month += 1
+        if month == 13:
+            year, month = year + 1, 1
+        months.append(f"{year:04d}-{month:02d}")
+    return months
+
+def forecast_organization(org_id: str, horizon: int = 1) -> dict:
+    """Forecast every active service of an organization, with platform and org totals"""
+    months = month_range(datetime.utcnow(), FORECAST_HISTORY_MONTHS)
+    service_ids = sorted(redis_db.smembers(f"org_active_services:{org_id}"))
+    services = redis_db.mget([f"service:{service_id}" for service_id in service_ids])
+
+    service_matrix = load_rollup_matrix(org_id, service_ids, months)
+
+    # One batched pass over all services of the organization
+    result = forecast_matrix(service_matrix, horizon)
+
+    # Platform and org totals are reconciled bottom-up from the service forecasts, so a
+    # service created last month shows up as its own cost rather than as a sudden jump
+    platforms = list(OrderedDict.fromkeys(
+        (service or {}).get("platform", "unknown") for service in services
+    ))
+    platform_index = np.array(
+        [platforms.index((service or {}).get("platform", "unknown")) for service in services], dtype=int
+    )
+    platform_result = aggregate_forecasts(result, platform_index, len(platforms))
+    total_result = aggregate_forecasts(result, np.zeros(len(service_ids), dtype=int), 1)
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "history_months": months,
+        "forecast_months": _future_months(months[-1], horizon),
+        "total": _series_result(total_result, 0),
+        "platforms": {
+            platform: _series_result(platform_result, i) for i, platform in enumerate(platforms)
+        },
+        "services": {
+            service_id: _series_result(result, i) for i, service_id in enumerate(service_ids)
+        },
+    }
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Dict, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+# Webhook endpoints get a short connect timeout; a slow read only holds its own request
+WEBHOOK_TIMEOUT = httpx.Timeout(10.0, connect=3.0, pool=5.0)
+
+# Connections kept open across alerts so repeated deliveries skip the TCP/TLS handshake
+WEBHOOK_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+# In-flight requests allowed per destination host, so one slow host can't take the whole pool
+MAX_REQUESTS_PER_HOST = 10
+
+class _LoopState:
+    """Client and per-host semaphores of one event loop (scheduled jobs run several loops in turn)"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.client = httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT, limits=WEBHOOK_LIMITS)
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(MAX_REQUESTS_PER_HOST)
+        return self.host_limits[host]
+
+_state: Optional[_LoopState] = None
+
+# Closes of clients left by an earlier loop, kept referenced until they finish
+_closing: Set[asyncio.Task] = set()
+
+async def _close_stale_client(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except Exception:
+        # Its loop is gone, so closing the pooled connections may fail; the client is marked closed anyway
+        pass
+
+def _current_state() -> _LoopState:
+    global _state
+    loop = asyncio.get_running_loop()
+    if _state is None or _state.loop is not loop:
+        if _state is not None:
+            # Each asyncio.run pass of a scheduled job would otherwise leak a client and its pooled sockets
+            task = loop.create_task(_close_stale_client(_state.client))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        _state = _LoopState(loop)
+    return _state
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared async HTTP client of the running event loop"""
+    return _current_state().client
+
+async def post_json(url: str, payload: Any, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """POST a JSON payload through the shared client, respecting the per-host limit"""
+    state = _current_state()
+    async with state.host_limit(url):
+        return await state.client.post(url, json=payload, headers=headers)
+
+async def post_content(url: str, content: bytes, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """POST a body that must go out byte for byte (e.g. a signed payload), respecting the per-host limit"""
+    state = _current_state()
+    async with state.host_limit(url):
+        return await state.client.post(url, content=content, headers=headers)
+
+async def close_http_client():
+    """Close the shared client of the running event loop (application shutdown)"""
+    global _state
+    if _state is not None and _state.loop is asyncio.get_running_loop():
+        await _state.client.aclose()
+        _state = None
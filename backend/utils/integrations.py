@@ -1,12 +1,13 @@
-import smtplib
-import requests
-import json
-import time
+import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Dict, Any, Optional
 import logging
 
+from utils.rate_limits import RateLimited, rate_limited_post
+from utils.email_transport import SMTPAccount, send_emails
+from utils.templates import render_alert
+
 logger = logging.getLogger(__name__)
 
 class IntegrationService:
@@ -17,25 +18,39 @@ class IntegrationService:
         "discord": "https://discord.com/api/webhooks/000000000000000000/XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX"
     }
 
+    # Set to the address of a local webhook sink (python -m benchmarks.webhook_sink) to have the
+    # test configurations deliver real HTTP requests there instead of only logging
+    TEST_WEBHOOK_BASE_URL = os.getenv("TEST_WEBHOOK_BASE_URL")
+
+    # Paths of each platform's webhook contract, as served by the sink
+    SINK_WEBHOOK_PATHS = {
+        "slack": "/services/{name}/B00000000/XXXXXXXXXXXXXXXXXXXXXXXX",
+        "google_workspace": "/v1/spaces/{name}/messages",
+        "discord": "/api/webhooks/{name}/XXXXXXXXXXXXXXXX",
+        "teams": "/webhook/{name}",
+    }
+
     @staticmethod
-    async def send_slack_webhook(webhook_url: str, message: str, channel: Optional[str] = None, username: str = "BurnStop") -> bool:
-        """Send message to Slack via webhook"""
+    def sink_webhook_url(base_url: str, integration_type: str, name: str) -> str:
+        """Get the URL of a webhook of the given type on a local sink"""
+        return base_url.rstrip("/") + IntegrationService.SINK_WEBHOOK_PATHS[integration_type].format(name=name)
+
+    @staticmethod
+    async def send_slack_webhook(
+        webhook_url: str,
+        message: str,
+        channel: Optional[str] = None,
+        username: str = "BurnStop",
+        payload: Optional[dict] = None
+    ) -> bool:
+        """Send message to Slack via webhook
+
+        `payload` is the alert already rendered with the Slack template (shared
+        by every Slack integration); the default template is rendered otherwise.
+        """
         try:
-            # Enhanced Slack message with rich formatting
-            payload = {
-                "text": message,
-                "username": username,
-                "icon_emoji": ":fire:",
-                "attachments": [
-                    {
-                        "color": "#ff6b6b",
-                        "title": "🔥 BurnStop Alert",
-                        "text": message,
-                        "footer": "BurnStop Cost Monitor",
-                        "ts": int(time.time())
-                    }
-                ]
-            }
+            payload = dict(payload or render_alert("slack", message))
+            payload["username"] = username
             
             if channel:
                 payload["channel"] = channel
@@ -45,98 +60,75 @@ class IntegrationService:
                 logger.info(f"TEST MODE: Would send Slack message: {message}")
                 return True
             
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
+            response = await rate_limited_post(webhook_url, payload)
             
             response.raise_for_status()
             return True
             
+        except RateLimited:
+            raise
         except Exception as e:
             logger.error(f"Failed to send Slack webhook: {e}")
             return False
 
     @staticmethod
-    async def send_google_workspace_webhook(webhook_url: str, message: str, space_name: Optional[str] = None) -> bool:
+    async def send_google_workspace_webhook(
+        webhook_url: str,
+        message: str,
+        space_name: Optional[str] = None,
+        payload: Optional[dict] = None
+    ) -> bool:
         """Send message to Google Workspace via webhook"""
         try:
-            # Enhanced Google Chat message with cards
-            payload = {
-                "cards": [{
-                    "header": {
-                        "title": "🔥 BurnStop Alert",
-                        "subtitle": space_name if space_name else "Cost Management Alert",
-                        "imageUrl": "https://raw.githubusercontent.com/yourusername/burn-stop/main/assets/logo.png"
-                    },
-                    "sections": [{
-                        "widgets": [
-                            {
-                                "textParagraph": {
-                                    "text": f"<b>Alert:</b> {message}"
-                                }
-                            }
-                        ]
-                    }]
-                }]
-            }
+            payload = payload or render_alert("google_workspace", message)
+            
+            # Show the space name as the card subtitle (copying the parts we change, the rest is shared)
+            if space_name and payload.get("cards"):
+                card = payload["cards"][0]
+                if isinstance(card.get("header"), dict):
+                    header = dict(card["header"], subtitle=space_name)
+                    payload = dict(payload, cards=[dict(card, header=header)] + payload["cards"][1:])
             
             # For test webhook, use a mock response
             if webhook_url == IntegrationService.TEST_WEBHOOKS["google_workspace"]:
                 logger.info(f"TEST MODE: Would send Google Workspace message: {message}")
                 return True
             
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
+            response = await rate_limited_post(webhook_url, payload)
             
             response.raise_for_status()
             return True
             
+        except RateLimited:
+            raise
         except Exception as e:
             logger.error(f"Failed to send Google Workspace webhook: {e}")
             return False
 
     @staticmethod
-    async def send_discord_webhook(webhook_url: str, message: str, username: str = "BurnStop") -> bool:
+    async def send_discord_webhook(
+        webhook_url: str,
+        message: str,
+        username: str = "BurnStop",
+        payload: Optional[dict] = None
+    ) -> bool:
         """Send message to Discord via webhook"""
         try:
-            payload = {
-                "content": message,
-                "username": username,
-                "avatar_url": "https://raw.githubusercontent.com/yourusername/burn-stop/main/assets/logo.png",
-                "embeds": [
-                    {
-                        "title": "🔥 BurnStop Alert",
-                        "description": message,
-                        "color": 16733525,  # #ff6b6b in decimal
-                        "footer": {
-                            "text": "BurnStop Cost Monitor"
-                        }
-                    }
-                ]
-            }
+            payload = dict(payload or render_alert("discord", message))
+            payload["username"] = username
             
             # For test webhook, use a mock response
             if webhook_url == IntegrationService.TEST_WEBHOOKS["discord"]:
                 logger.info(f"TEST MODE: Would send Discord message: {message}")
                 return True
             
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
+            response = await rate_limited_post(webhook_url, payload)
             
             response.raise_for_status()
             return True
             
+        except RateLimited:
+            raise
         except Exception as e:
             logger.error(f"Failed to send Discord webhook: {e}")
             return False
@@ -150,9 +142,16 @@ class IntegrationService:
         to_email: str,
         subject: str,
         message: str,
-        from_name: str = "BurnStop Alerts"
+        from_name: str = "BurnStop Alerts",
+        use_tls: bool = True,
+        html_body: Optional[str] = None
     ) -> bool:
-        """Send email alert using SMTP"""
+        """Send email alert using SMTP
+
+        `to_email` may list several comma-separated recipients; they all get
+        the message in one transaction over a pooled session. `html_body` is
+        the alert rendered with the email template.
+        """
         try:
             # For test mode with specific test email
             if email == "test@burnstop.dev":
@@ -164,63 +163,12 @@ class IntegrationService:
             msg['From'] = f"{from_name} <{email}>"
             msg['To'] = to_email
             msg['Subject'] = subject
+            msg.attach(MIMEText(html_body or render_alert("email", message, subject), 'html'))
             
-            # Enhanced HTML email template
-            body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }}
-        .container {{ max-width: 600px; margin: 0 auto; background-color: #ffffff; }}
-        .header {{ background-color: #ff6b6b; color: white; padding: 20px; text-align: center; }}
-        .content {{ padding: 30px; }}
-        .footer {{ background-color: #f4f4f4; padding: 15px; text-align: center; font-size: 12px; color: #666; }}
-        .alert-box {{ background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; }}
-        .button {{ background-color: #ff6b6b; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; margin: 15px 0; }}
-        .stats {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🔥 BurnStop Alert</h1>
-            <p>Cost Management System</p>
-        </div>
-        <div class="content">
-            <div class="alert-box">
-                <h3>Alert Details</h3>
-                <p>{message}</p>
-            </div>
-            
-            <div class="stats">
-                <h4>Alert Information</h4>
-                <p>This alert was generated by your BurnStop cost monitoring system.</p>
-            </div>
-            
-            <p><strong>Timestamp:</strong> {subject}</p>
-            <p><strong>System:</strong> BurnStop Cost Monitor</p>
-        </div>
-        <div class="footer">
-            <p>BurnStop - Stop burning money on cloud services!</p>
-            <p>This is an automated message from your cost monitoring system.</p>
-        </div>
-    </div>
-</body>
-</html>
-            """
-            
-            msg.attach(MIMEText(body, 'html'))
-            
-            # Create SMTP session
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()  # Enable security
-            server.login(email, app_password)
-            
-            # Send email
-            text = msg.as_string()
-            server.sendmail(email, to_email, text)
-            server.quit()
+            # Send over a pooled SMTP session on a worker thread
+            recipients = [address.strip() for address in to_email.split(",") if address.strip()]
+            account = SMTPAccount(smtp_server, smtp_port, email, app_password, use_tls=use_tls)
+            await send_emails(account, [(email, recipients, msg.as_string())])
             
             return True
             
@@ -229,73 +177,66 @@ class IntegrationService:
             return False
 
     @staticmethod
-    async def send_teams_webhook(webhook_url: str, message: str) -> bool:
+    async def send_teams_webhook(webhook_url: str, message: str, payload: Optional[dict] = None) -> bool:
         """Send message to Microsoft Teams via webhook"""
         try:
-            payload = {
-                "@type": "MessageCard",
-                "@context": "http://schema.org/extensions",
-                "themeColor": "ff6b6b",
-                "summary": "BurnStop Alert",
-                "sections": [{
-                    "activityTitle": "🔥 BurnStop Alert",
-                    "activitySubtitle": "Cost Management System",
-                    "activityImage": "https://raw.githubusercontent.com/yourusername/burn-stop/main/assets/logo.png",
-                    "facts": [{
-                        "name": "Alert:",
-                        "value": message
-                    }, {
-                        "name": "System:",
-                        "value": "BurnStop Cost Monitor"
-                    }],
-                    "markdown": True
-                }]
-            }
+            payload = payload or render_alert("teams", message)
             
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
+            response = await rate_limited_post(webhook_url, payload)
             
             response.raise_for_status()
             return True
             
+        except RateLimited:
+            raise
         except Exception as e:
             logger.error(f"Failed to send Teams webhook: {e}")
             return False
 
     @staticmethod
-    async def send_alert_to_integration(integration_type: str, config: Dict[str, Any], message: str, subject: str = None) -> bool:
-        """Send alert through the specified integration"""
+    async def send_alert_to_integration(
+        integration_type: str,
+        config: Dict[str, Any],
+        message: str,
+        subject: str = None,
+        rendered: Optional[Any] = None
+    ) -> bool:
+        """Send alert through the specified integration
+
+        `rendered` is the alert rendered with the integration type's template
+        (see utils.templates.AlertRenderer); the default template is used otherwise.
+        """
         try:
             if integration_type == "slack":
                 return await IntegrationService.send_slack_webhook(
                     webhook_url=config["webhook_url"],
                     message=message,
                     channel=config.get("channel"),
-                    username=config.get("username", "BurnStop")
+                    username=config.get("username", "BurnStop"),
+                    payload=rendered
                 )
             
             elif integration_type == "google_workspace":
                 return await IntegrationService.send_google_workspace_webhook(
                     webhook_url=config["webhook_url"],
                     message=message,
-                    space_name=config.get("space_name")
+                    space_name=config.get("space_name"),
+                    payload=rendered
                 )
             
             elif integration_type == "discord":
                 return await IntegrationService.send_discord_webhook(
                     webhook_url=config["webhook_url"],
                     message=message,
-                    username=config.get("username", "BurnStop")
+                    username=config.get("username", "BurnStop"),
+                    payload=rendered
                 )
             
             elif integration_type == "teams":
                 return await IntegrationService.send_teams_webhook(
                     webhook_url=config["webhook_url"],
-                    message=message
+                    message=message,
+                    payload=rendered
                 )
             
             elif integration_type == "email":
@@ -309,13 +250,17 @@ class IntegrationService:
                     to_email=config.get("to_email", config["email"]),  # Default to sender if no recipient
                     subject=subject or "🔥 BurnStop Alert",
                     message=message,
-                    from_name=config.get("from_name", "BurnStop Alerts")
+                    from_name=config.get("from_name", "BurnStop Alerts"),
+                    use_tls=config.get("use_tls", True),
+                    html_body=rendered
                 )
             
             else:
                 logger.error(f"Unknown integration type: {integration_type}")
                 return False
                 
+        except RateLimited:
+            raise
         except Exception as e:
             logger.error(f"Failed to send alert through {integration_type}: {e}")
             return False
@@ -350,4 +295,10 @@ class IntegrationService:
             }
         }
         
+        base_url = IntegrationService.TEST_WEBHOOK_BASE_URL
+        if base_url and integration_type in IntegrationService.SINK_WEBHOOK_PATHS:
+            test_configs[integration_type]["webhook_url"] = IntegrationService.sink_webhook_url(
+                base_url, integration_type, "test"
+            )
+        
         return test_configs.get(integration_type, {}) 
\ No newline at end of file
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional
+
+from utils.redis_db import redis_db
+
+# How long a lease or a work group membership outlives its last renewal
+LEASE_TTL_SECONDS = 15
+MEMBERSHIP_TTL_SECONDS = 15
+
+# Lease of a scheduled batch job (python -m utils.budgets --every N); it must outlive one run
+SCHEDULED_JOB_LEASE_SECONDS = 30 * 60
+
+# Takes the lease if it's free (with a new fencing token) or extends it if the caller holds it;
+# returns the token, or 0 when someone else holds it
+_ACQUIRE_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local holder, token = string.match(current, '^(%S+) (%d+)$')
+    if holder == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return tonumber(token)
+    end
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ' ' .. token, 'PX', ARGV[2])
+return token
+"""
+
+# Deletes the lease only if it still carries the caller's token
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_acquire = redis_db.redis_client.register_script(_ACQUIRE_LUA)
+_release = redis_db.redis_client.register_script(_RELEASE_LUA)
+
+class LeaseLost(Exception):
+    """The lease expired or was taken over; work done under it must not be committed"""
+
+def process_id() -> str:
+    """Identify this process to leases and work groups"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class Lease:
+    """A named Redis lease with fencing tokens
+
+    Every grant gets a token higher than all earlier ones. Writes made on the
+    lease's behalf call guard() inside their WATCH block, so a holder whose
+    lease lapsed (a long GC pause, a network partition) can't commit after a
+    new holder took over.
+    """
+
+    def __init__(self, name: str, holder: Optional[str] = None, ttl_seconds: float = LEASE_TTL_SECONDS):
+        self.name = name
+        self.holder = holder or process_id()
+        self.ttl_seconds = ttl_seconds
+        self.token: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return f"lease:{self.name}"
+
+    @property
+    def value(self) -> str:
+        return f"{self.holder} {self.token}"
+
+    def acquire(self) -> bool:
+        """Take or renew the lease; the token changes if it lapsed in between"""
+        token = _acquire(keys=[self.key, f"lease_fence:{self.name}"], args=[self.holder, int(self.ttl_seconds * 1000)])
+        self.token = int(token) or None
+        return self.token is not None
+
+    def release(self):
+        if self.token is not None:
+            _release(keys=[self.key], args=[self.value])
+            self.token = None
+
+    def guard(self, pipe):
+        """Watch the lease in a WATCH/MULTI block; raises LeaseLost unless this holder and token still own it"""
+        pipe.watch(self.key)
+        if self.token is None or pipe.get(self.key) != self.value:
+            pipe.unwatch()
+            raise LeaseLost(f"Lost the {self.name} lease")
+
+async def run_while_leader(lease: Lease, job: Callable[[Lease], Awaitable[Any]]):
+    """Run a job whenever this process holds the lease, renewing it and cancelling the job if it's lost"""
+    while True:
+        if lease.acquire():
+            print(f"Acquired the {lease.name} lease (token {lease.token})")
+            task = asyncio.create_task(job(lease))
+            try:
+                while not task.done():
+                    await asyncio.sleep(lease.ttl_seconds / 3)
+                    if not lease.acquire():
+                        print(f"Lost the {lease.name} lease")
+                        break
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                lease.release()
+        await asyncio.sleep(lease.ttl_seconds / 3)
+
+def run_exclusively(name: str, ttl_seconds: float, job: Callable[[], Any]) -> Any:
+    """Run a scheduled job only if no other replica is running it; returns None when skipped
+
+    The lease must outlive the job, so pass its longest expected run time.
+    """
+    lease = Lease(name, ttl_seconds=ttl_seconds)
+    if not lease.acquire():
+        print(f"Skipping {name}: another process holds its lease")
+        return None
+    try:
+        return job()
+    finally:
+        lease.release()
+
+def rendezvous_owner(unit: str, members: List[str]) -> Optional[str]:
+    """Pick a unit's owner by highest random weight, so a member leaving only moves its own units"""
+    if not members:
+        return None
+    return max(members, key=lambda member: hashlib.sha1(f"{member}\x1f{unit}".encode()).digest())
+
+class WorkGroup:
+    """Processes splitting units of work (e.g. organizations) by rendezvous hashing
+
+    Members heartbeat into a sorted set; one that stops for
+    MEMBERSHIP_TTL_SECONDS is dropped and its units move to the survivors.
+    Ownership spreads the work, it doesn't make it exclusive: during a
+    rebalance two members may briefly both own a unit, so the work itself
+    must still commit atomically (a WATCH transaction or a per-unit lock).
+    """
+
+    def __init__(self, name: str, member: Optional[str] = None):
+        self.name = name
+        self.member = member or process_id()
+        self.members: List[str] = [self.member]
+
+    @property
+    def key(self) -> str:
+        return f"work_group:{self.name}"
+
+    def heartbeat(self) -> bool:
+        """Renew membership and refresh the live members; returns whether they changed"""
+        now = time.time()
+        pipe = redis_db.pipeline()
+        pipe.zadd(self.key, {self.member: now})
+        pipe.zremrangebyscore(self.key, "-inf", now - MEMBERSHIP_TTL_SECONDS)
+        pipe.zrange(self.key, 0, -1)
+        members = sorted(pipe.execute()[-1])
+        changed = members != self.members
+        self.members = members
+        return changed
+
+    def leave(self):
+        redis_db.redis_client.zrem(self.key, self.member)
+
+    def owns(self, unit: str) -> bool:
+        return rendezvous_owner(unit, self.members) == self.member
+
+    async def run(self, on_change: Optional[Callable[[], Any]] = None):
+        """Heartbeat until cancelled, calling on_change when members join or leave"""
+        try:
+            while True:
+                try:
+                    if self.heartbeat():
+                        print(f"Work group {self.name} now has {len(self.members)} member(s)")
+                        if on_change:
+                            on_change()
+                except Exception as e:
+                    print(f"Error renewing {self.name} membership: {e}")
+                await asyncio.sleep(MEMBERSHIP_TTL_SECONDS / 3)
+        finally:
+            self.leave()
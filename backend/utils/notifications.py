@@ -0,0 +1,275 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import redis
+
+from utils.redis_db import redis_db
+from utils.dispatch import load_alert_targets, dispatch_alert, summarize_dispatch
+from utils.digests import (
+    COALESCED_KINDS, DIGEST_WINDOW_SECONDS, PLATFORM_MESSAGE_LIMITS, digest_buffer_key, digest_window,
+    buffer_digest_event, claim_due_digests, render_digest, chunk_digest, DIGEST_DUE
+)
+from utils.routing import route_alert
+from utils.dedup import claim_first_delivery, release_delivery_claims, get_suppressed_counts
+from utils.delivery_metrics import (
+    count_outcome, record_dispatch_results, failing_integrations, disable_failing_integration
+)
+from utils.event_webhooks import OUTBOX_DUE
+
+# Outbound notifications waiting for the worker pool (python worker.py)
+NOTIFICATION_STREAM = "notifications"
+CONSUMER_GROUP = "notifiers"
+STREAM_MAXLEN = 100000
+
+# Deliveries that failed for some targets, scored by the time they are due again
+RETRY_QUEUE = "notifications:retry"
+
+# Notifications that still failed after MAX_ATTEMPTS; replay with python worker.py replay
+DEAD_LETTER_STREAM = "notifications:dead"
+DEAD_LETTER_MAXLEN = 10000
+
+MAX_ATTEMPTS = 6
+BASE_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 15 * 60
+
+# Spreads out notifications held back by the same rate limit so they don't all return at once
+RATE_LIMIT_JITTER_SECONDS = 2
+
+# Entries a consumer read but never acknowledged (it crashed) are taken over after this long;
+# it must be well above the dispatch deadline so live deliveries aren't picked up twice
+CLAIM_IDLE_MS = 5 * 60 * 1000
+
+# Moves due retries back onto the stream; ZREM first so only one worker promotes each entry
+_PROMOTE_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, event in ipairs(due) do
+    if redis.call('ZREM', KEYS[1], event) == 1 then
+        redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'event', event)
+    end
+end
+return #due
+"""
+
+_promote_due = redis_db.redis_client.register_script(_PROMOTE_DUE_LUA)
+
+def enqueue_notification(
+    pipe,
+    org_ids: List[str],
+    message: str,
+    subject: str,
+    kind: str = "alert",
+    targets: Optional[List[str]] = None,
+    attempt: int = 0,
+    attributes: Optional[Dict[str, Any]] = None
+):
+    """Queue an alert for the enabled integrations of the given organizations
+
+    Pass the pipeline of a mutation to enqueue in the same transaction (the
+    notification exists if and only if the mutation was committed), or None to
+    enqueue on its own. `targets` restricts delivery to those integration keys;
+    `attributes` describe the alert to the integrations' routing rules.
+    """
+    event = {
+        "kind": kind,
+        "org_ids": list(dict.fromkeys(org_ids)),
+        "message": message,
+        "subject": subject,
+        "targets": targets,
+        "attempt": attempt,
+        "attributes": attributes,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    target = pipe if pipe is not None else redis_db.redis_client
+    target.xadd(NOTIFICATION_STREAM, {"event": json.dumps(event)}, maxlen=STREAM_MAXLEN, approximate=True)
+
+def ensure_consumer_group():
+    """Create the consumer group (and the stream) if they don't exist yet"""
+    try:
+        redis_db.redis_client.xgroup_create(NOTIFICATION_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+def backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with jitter: half the capped delay plus a random share of the other half"""
+    delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def schedule_retry(pipe, event: Dict[str, Any], results: List[Dict[str, Any]]):
+    """Queue a retry for the targets that failed, or dead-letter them after MAX_ATTEMPTS
+
+    Rate-limited targets are held until their destination accepts messages
+    again; waiting out a rate limit doesn't use up an attempt.
+    """
+    failed = [result for result in results if not result["success"] and result["status"] != "rate_limited"]
+    limited = [result for result in results if result["status"] == "rate_limited"]
+
+    if limited:
+        held = dict(event, targets=[result["target"] for result in limited])
+        retry_after = max(result["retry_after"] for result in limited)
+        pipe.zadd(RETRY_QUEUE, {json.dumps(held): time.time() + retry_after + random.uniform(0, RATE_LIMIT_JITTER_SECONDS)})
+
+    if not failed:
+        return
+
+    attempt = event["attempt"] + 1
+
+    if attempt >= MAX_ATTEMPTS:
+        dead = dict(event, attempt=attempt, targets=[result["target"] for result in failed])
+        dead["failures"] = [
+            {"target": result["target"], "status": result["status"], "error": result.get("error")}
+            for result in failed
+        ]
+        dead["failed_at"] = datetime.utcnow().isoformat()
+        release_delivery_claims(pipe, dead["targets"], event)
+        pipe.xadd(DEAD_LETTER_STREAM, {"event": json.dumps(dead)}, maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+        return
+
+    retry = dict(event, attempt=attempt, targets=[result["target"] for result in failed])
+    for result in failed:
+        count_outcome(pipe, result["target"], "retried")
+    pipe.zadd(RETRY_QUEUE, {json.dumps(retry): time.time() + backoff_seconds(event["attempt"])})
+
+async def process_notification(entry_id: str, fields: Dict[str, str]) -> str:
+    """Deliver one queued notification and acknowledge it
+
+    Failed targets are re-queued (or dead-lettered) in the same transaction as
+    the acknowledgement, so a notification is never lost between the two. The
+    Redis work runs on a thread, so its round trips don't stall the other
+    consumers sharing the event loop.
+    """
+    event = json.loads(fields["event"])
+    targets = await asyncio.to_thread(load_alert_targets, event["org_ids"])
+    if event.get("targets") is not None:
+        wanted = set(event["targets"])
+        targets = [target for target in targets if target["id"] in wanted]
+
+    # Drop integrations whose rules don't match and those that already got this exact alert;
+    # retries carry the flag and skip both checks
+    suppressed = []
+    if not event.get("deduplicated"):
+        targets = route_alert(targets, event)
+        targets, suppressed = await asyncio.to_thread(claim_first_delivery, targets, event, entry_id)
+        event["deduplicated"] = True
+
+    # First deliveries of coalesced kinds wait in each integration's digest buffer
+    coalesced = []
+    if event["kind"] in COALESCED_KINDS and event["attempt"] == 0:
+        coalesced = [target for target in targets if digest_window(target) > 0]
+        targets = [target for target in targets if digest_window(target) == 0]
+
+    results = await dispatch_alert(targets, message=event["message"], subject=event["subject"], kind=event["kind"])
+
+    pipe = redis_db.pipeline()
+    for target in coalesced:
+        buffer_digest_event(pipe, target, event)
+    record_dispatch_results(pipe, results)
+    if any(not result["success"] for result in results):
+        schedule_retry(pipe, event, results)
+    pipe.xack(NOTIFICATION_STREAM, CONSUMER_GROUP, entry_id)
+    await asyncio.to_thread(pipe.execute)
+
+    failed = [result["target"] for result in results if not result["success"] and result["status"] != "rate_limited"]
+    if failed:
+        await asyncio.to_thread(disable_sustained_failures, failed)
+
+    summary = f"{event['kind']} {entry_id} attempt {event['attempt'] + 1}: {summarize_dispatch(results)} delivered"
+    if coalesced:
+        summary += f", {len(coalesced)} buffered for digest"
+    if suppressed:
+        summary += f", {len(suppressed)} suppressed as duplicate"
+    return summary
+
+def disable_sustained_failures(target_ids: List[str]):
+    """Disable integrations that kept failing and tell the rest of the organization's integrations"""
+    for failing in failing_integrations(target_ids):
+        reason = disable_failing_integration(failing["target"], failing["failures"], failing["since"])
+        if not reason:
+            continue
+        _, org_id, integration_type = failing["target"].split(":", 2)
+        print(f"Disabled {failing['target']}: {reason}")
+        enqueue_notification(
+            None, [org_id],
+            f"⚠️ **Integration Disabled**\n\nThe {integration_type} integration stopped accepting alerts. {reason}. "
+            f"Fix its configuration and re-enable it to resume delivery.",
+            f"⚠️ {integration_type} integration disabled - BurnStop Alert",
+            kind="integration.disabled"
+        )
+
+def flush_due_digests(count: int = 100) -> int:
+    """Queue a digest notification for every integration whose window has closed
+
+    The digest is split into chunks that fit the platform's message limit. The
+    chunks are queued and the events trimmed from the buffer in one
+    transaction; events buffered meanwhile wait for the next window.
+    """
+    flushed = 0
+    for target_id in claim_due_digests(count):
+        key = digest_buffer_key(target_id)
+        raw_entries = redis_db.redis_client.lrange(key, 0, -1)
+        if not raw_entries:
+            continue
+
+        _, org_id, integration_type = target_id.split(":", 2)
+        digest = render_digest([json.loads(raw) for raw in raw_entries])
+        messages = chunk_digest(digest["header"], digest["sections"], PLATFORM_MESSAGE_LIMITS.get(integration_type))
+
+        pipe = redis_db.pipeline()
+        for message in messages:
+            enqueue_notification(pipe, [org_id], message, digest["subject"], kind="digest", targets=[target_id])
+        pipe.ltrim(key, len(raw_entries), -1)
+        pipe.llen(key)
+        remaining = pipe.execute()[-1]
+
+        if remaining:
+            target = redis_db.get(target_id)
+            window = digest_window(target) if target else DIGEST_WINDOW_SECONDS
+            redis_db.redis_client.zadd(DIGEST_DUE, {target_id: time.time() + window}, nx=True)
+        flushed += 1
+    return flushed
+
+def promote_due_retries(count: int = 100) -> int:
+    """Move retries whose backoff has passed back onto the notification stream"""
+    return _promote_due(keys=[RETRY_QUEUE, NOTIFICATION_STREAM], args=[time.time(), count, STREAM_MAXLEN])
+
+def claim_stale_notifications(consumer: str, count: int = 10) -> list:
+    """Take over notifications another consumer read but never acknowledged"""
+    response = redis_db.redis_client.xautoclaim(
+        NOTIFICATION_STREAM, CONSUMER_GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=count
+    )
+    return response[1] if response else []
+
+def replay_dead_letters(count: Optional[int] = None) -> int:
+    """Put dead-lettered notifications back on the stream with a fresh retry budget"""
+    entries = redis_db.redis_client.xrange(DEAD_LETTER_STREAM, count=count)
+    for entry_id, fields in entries:
+        event = json.loads(fields["event"])
+        pipe = redis_db.pipeline()
+        enqueue_notification(
+            pipe, event["org_ids"], event["message"], event["subject"],
+            kind=event["kind"], targets=event.get("targets"), attributes=event.get("attributes")
+        )
+        pipe.xdel(DEAD_LETTER_STREAM, entry_id)
+        pipe.execute()
+    return len(entries)
+
+def queue_stats() -> Dict[str, int]:
+    """Get the backlog of the notification queue, the duplicates it suppressed and the event outboxes waiting"""
+    pending = 0
+    try:
+        pending = redis_db.redis_client.xpending(NOTIFICATION_STREAM, CONSUMER_GROUP)["pending"]
+    except redis.ResponseError:
+        pass
+    return {
+        "stream": redis_db.redis_client.xlen(NOTIFICATION_STREAM),
+        "pending": pending,
+        "retrying": redis_db.redis_client.zcard(RETRY_QUEUE),
+        "dead": redis_db.redis_client.xlen(DEAD_LETTER_STREAM),
+        "digests": redis_db.redis_client.zcard(DIGEST_DUE),
+        "suppressed": sum(get_suppressed_counts().values()),
+        "event_outboxes": redis_db.redis_client.zcard(OUTBOX_DUE),
+    }
@@ -0,0 +1,72 @@
+from typing import Optional, List
+
+from utils.redis_db import redis_db
+from utils.analytics import ensure_org_index, build_unless_changed
+from models.service import CloudPlatform
+
+def _rank_keys(org_id: str, platform: Optional[str] = None) -> List[str]:
+    keys = [f"costrank:{org_id}"]
+    if platform:
+        keys.append(f"costrank:{org_id}:{platform}")
+    return keys
+
+def _all_rank_keys(org_id: str) -> List[str]:
+    return [f"costrank:{org_id}", f"costrank_built:{org_id}"] + [
+        f"costrank:{org_id}:{platform.value}" for platform in CloudPlatform
+    ]
+
+def apply_rank_change(pipe, org_id: str, old_data: Optional[dict], new_data: Optional[dict]):
+    """Queue the cost rank updates for a service going from old_data to new_data
+
+    costrank:{org} scores every active service by its monthly cost and
+    costrank:{org}:{platform} does the same per platform.
+    """
+    old_active = bool(old_data and old_data.get("status") == "active")
+    new_active = bool(new_data and new_data.get("status") == "active")
+    service_id = (new_data or old_data)["id"]
+
+    old_platform = old_data.get("platform") if old_active else None
+    new_platform = new_data.get("platform") if new_active else None
+
+    if old_active and (not new_active or old_platform != new_platform):
+        for key in _rank_keys(org_id, old_platform):
+            pipe.zrem(key, service_id)
+
+    if new_active:
+        cost = float(new_data.get("cost", 0) or 0)
+        for key in _rank_keys(org_id, new_platform):
+            pipe.zadd(key, {service_id: cost})
+
+def rebuild_cost_rank(org_id: str, batch_size: int = 1000):
+    """Replace an organization's cost ranks with ones built from its active services
+
+    They are written in batches, so they are only marked built if no service
+    changed meanwhile; otherwise they are built again.
+    """
+    def build():
+        service_ids = list(redis_db.smembers(f"org_active_services:{org_id}"))
+
+        redis_db.redis_client.delete(*_all_rank_keys(org_id))
+        for start in range(0, len(service_ids), batch_size):
+            batch = service_ids[start:start + batch_size]
+            pipe = redis_db.pipeline(transaction=False)
+            for service_data in redis_db.mget([f"service:{service_id}" for service_id in batch]):
+                if service_data:
+                    apply_rank_change(pipe, org_id, None, service_data)
+            pipe.execute()
+
+    build_unless_changed(org_id, build, lambda pipe, _: pipe.set(f"costrank_built:{org_id}", 1))
+
+def ensure_cost_rank(org_id: str):
+    """Build the cost ranks for organizations created before they existed"""
+    ensure_org_index(org_id, "cost rank", f"costrank_built:{org_id}", rebuild_cost_rank)
+
+def get_top_service_ids(org_id: str, n: int = 10, platform: Optional[str] = None) -> List[tuple]:
+    """Get the n most expensive active services as (service id, cost), optionally on one platform"""
+    ensure_cost_rank(org_id)
+    key = f"costrank:{org_id}:{platform}" if platform else f"costrank:{org_id}"
+    return redis_db.redis_client.zrevrange(key, 0, n - 1, withscores=True)
+
+def delete_cost_rank(org_id: str):
+    """Remove the cost ranks of a deleted organization"""
+    redis_db.redis_client.delete(*_all_rank_keys(org_id))
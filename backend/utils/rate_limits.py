@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.redis_db import redis_db
+from utils.http_client import post_json
+
+# Documented webhook limits as (messages per second, burst), by host
+DESTINATION_RATES = {
+    "hooks.slack.com": (1.0, 3),
+    "discord.com": (2.5, 5),
+    "discordapp.com": (2.5, 5),
+    "chat.googleapis.com": (1.0, 3),
+    "outlook.office.com": (2.0, 4),
+}
+DEFAULT_RATE = (5.0, 10)
+
+# A 429 halves a bucket's rate; every success wins back a tenth of the documented rate
+MIN_RATE_FRACTION = 0.1
+RECOVERY_FRACTION = 0.1
+
+# Waits up to this long are slept through; longer ones are handed back to the queue
+MAX_INLINE_WAIT_SECONDS = 1.0
+
+# Assumed wait when a 429 carries no usable header
+DEFAULT_RETRY_AFTER_SECONDS = 5.0
+
+BUCKET_TTL_SECONDS = 60 * 60
+
+# Takes one token from a webhook's bucket. Returns the seconds to wait before a
+# token is available (0 when one was taken), as a string since Lua numbers are
+# truncated to integers on return.
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate', 'blocked_until')
+local rate = tonumber(bucket[3]) or tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local blocked_until = tonumber(bucket[4]) or 0
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+# Feeds a response back into the bucket: a 429 blocks it for the server's
+# retry delay and halves its rate, a success slowly restores the rate, and a
+# response announcing no remaining requests blocks it until the window resets.
+_FEEDBACK_LUA = """
+local now = tonumber(ARGV[1])
+local limited = ARGV[2] == '1'
+local block_for = tonumber(ARGV[3])
+local default_rate = tonumber(ARGV[4])
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or default_rate
+if limited then
+    rate = math.max(default_rate * tonumber(ARGV[5]), rate / 2)
+    redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', 0, 'ts', now)
+elseif rate < default_rate then
+    redis.call('HSET', KEYS[1], 'rate', math.min(default_rate, rate + default_rate * tonumber(ARGV[6])))
+end
+if block_for > 0 then
+    redis.call('HSET', KEYS[1], 'blocked_until', now + block_for)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+return 1
+"""
+
+# Run on the async client (passed on each call, so it follows redis_db.async_client): every
+# webhook post goes through both, and a blocking round trip would stall every other delivery
+_acquire = redis_db.async_client.register_script(_ACQUIRE_LUA)
+_feedback = redis_db.async_client.register_script(_FEEDBACK_LUA)
+
+class RateLimited(Exception):
+    """A webhook can't take a message right now; retry after `retry_after` seconds"""
+
+    def __init__(self, url: str, retry_after: float):
+        super().__init__(f"Rate limited by {urlsplit(url).netloc}, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def destination_rate(url: str) -> Tuple[float, int]:
+    """Get the documented (rate, burst) of a webhook URL"""
+    host = urlsplit(url).netloc.lower()
+    for suffix, rate in DESTINATION_RATES.items():
+        if host == suffix or host.endswith("." + suffix):
+            return rate
+    return DEFAULT_RATE
+
+def bucket_key(url: str) -> str:
+    """Redis key of a webhook URL's token bucket (the URL itself holds a secret, so it is hashed)"""
+    return f"ratelimit:{hashlib.sha256(url.encode()).hexdigest()[:32]}"
+
+def retry_after_from_headers(headers: httpx.Headers, now: Optional[float] = None) -> Optional[float]:
+    """Get the seconds a server asked us to wait from Retry-After or X-RateLimit-* headers"""
+    now = now if now is not None else time.time()
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - now, 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    reset_after = headers.get("x-ratelimit-reset-after")
+    if reset_after:
+        try:
+            return max(float(reset_after), 0.0)
+        except ValueError:
+            pass
+
+    reset = headers.get("x-ratelimit-reset")
+    if reset:
+        try:
+            reset = float(reset)
+            # Either an epoch timestamp or seconds until the window resets
+            return max(reset - now, 0.0) if reset > 1e9 else reset
+        except ValueError:
+            pass
+
+    return None
+
+async def acquire_send_slot(url: str):
+    """Take a token from the webhook's shared bucket, sleeping through short waits
+
+    Raises RateLimited when the wait is longer than MAX_INLINE_WAIT_SECONDS.
+    """
+    rate, burst = destination_rate(url)
+    while True:
+        wait = await _acquire(
+            keys=[bucket_key(url)], args=[time.time(), rate, burst, BUCKET_TTL_SECONDS], client=redis_db.async_client
+        )
+        wait = float(wait)
+        if wait <= 0:
+            return
+        if wait > MAX_INLINE_WAIT_SECONDS:
+            raise RateLimited(url, wait)
+        await asyncio.sleep(wait)
+
+async def record_response(url: str, response: httpx.Response):
+    """Adapt the webhook's bucket to a response; raises RateLimited on 429"""
+    rate, _ = destination_rate(url)
+    limited = response.status_code == 429
+    block_for = 0.0
+
+    if limited:
+        block_for = retry_after_from_headers(response.headers) or DEFAULT_RETRY_AFTER_SECONDS
+    elif response.headers.get("x-ratelimit-remaining") == "0":
+        block_for = retry_after_from_headers(response.headers) or 0.0
+
+    await _feedback(
+        keys=[bucket_key(url)],
+        args=[time.time(), int(limited), block_for, rate, MIN_RATE_FRACTION, RECOVERY_FRACTION, BUCKET_TTL_SECONDS],
+        client=redis_db.async_client
+    )
+    if limited:
+        raise RateLimited(url, block_for)
+
+async def rate_limited_post(url: str, payload: Any, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """POST to a webhook within its shared rate limit"""
+    await acquire_send_slot(url)
+    response = await post_json(url, payload, headers=headers)
+    await record_response(url, response)
+    return response
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 import json
 import os
 from typing import Optional, Any
@@ -10,6 +11,12 @@ class RedisDB:
             port=int(os.getenv('REDIS_PORT', 6379)),
             decode_responses=True
         )
+        # Async client for long blocking reads (change feed streams) that must not stall the event loop
+        self.async_client = redis.asyncio.Redis(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', 6379)),
+            decode_responses=True
+        )
     
     def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
         """Set a key-value pair in Redis"""
@@ -85,6 +92,45 @@ class RedisDB:
             print(f"Error getting from sorted set by score {key}: {e}")
             return []
     
+    def mget(self, keys: list) -> list:
+        """Get several values from Redis in one round trip"""
+        try:
+            if not keys:
+                return []
+            values = []
+            for value in self.redis_client.mget(keys):
+                if value is None:
+                    values.append(None)
+                    continue
+                try:
+                    values.append(json.loads(value))
+                except json.JSONDecodeError:
+                    values.append(value)
+            return values
+        except Exception as e:
+            print(f"Error getting keys {keys[:3]}...: {e}")
+            return [None] * len(keys)
+    
+    def hgetall(self, key: str) -> dict:
+        """Get all fields of a hash"""
+        try:
+            return self.redis_client.hgetall(key)
+        except Exception as e:
+            print(f"Error getting hash {key}: {e}")
+            return {}
+    
+    def smembers(self, key: str) -> set:
+        """Get all members of a set"""
+        try:
+            return self.redis_client.smembers(key)
+        except Exception as e:
+            print(f"Error getting set members {key}: {e}")
+            return set()
+    
+    def pipeline(self, transaction: bool = True):
+        """Create a pipeline; with transaction=True the queued commands run atomically (MULTI/EXEC)"""
+        return self.redis_client.pipeline(transaction=transaction)
+    
     def keys(self, pattern: str = "*"):
         """Get all keys matching a pattern"""
         try:
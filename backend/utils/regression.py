@@ -0,0 +1,211 @@
+import math
+import sys
+import time
+from datetime import datetime
+from typing import Optional, List, Tuple
+
+from utils.redis_db import redis_db
+from utils.leases import SCHEDULED_JOB_LEASE_SECONDS, run_exclusively
+from utils.analytics import build_unless_changed
+
+SECONDS_PER_MONTH = 30.436875 * 24 * 60 * 60
+
+# Half-life of the exponentially decayed statistics
+DECAY_HALF_LIFE_MONTHS = 6
+DECAY_RATE = math.log(2) / DECAY_HALF_LIFE_MONTHS
+
+# Points closer together than this can't give a meaningful monthly slope
+MIN_SPAN_MONTHS = 0.5
+
+STAT_FIELDS = ("n", "sx", "sy", "sxy", "sxx", "dw", "dwx", "dwy", "dwxy", "dwxx")
+
+# Appends one (x, y) point to the sufficient statistics of a series. x is stored
+# relative to the series origin to keep the sums small, and the decayed sums use
+# forward decay (weight exp(rate * x)) so an append is a plain increment.
+# If ARGV[2] is empty, y is read from field ARGV[4] of hash KEYS[2].
+_APPEND_POINT_LUA = """
+local x = tonumber(ARGV[1])
+local y
+if ARGV[2] == '' then
+    y = tonumber(redis.call('HGET', KEYS[2], ARGV[4]) or '0')
+else
+    y = tonumber(ARGV[2])
+end
+local rate = tonumber(ARGV[3])
+
+local origin = redis.call('HGET', KEYS[1], 'origin')
+if not origin then
+    origin = x
+    redis.call('HSET', KEYS[1], 'origin', x)
+end
+local dx = x - tonumber(origin)
+local w = math.exp(rate * dx)
+
+redis.call('HINCRBYFLOAT', KEYS[1], 'n', 1)
+redis.call('HINCRBYFLOAT', KEYS[1], 'sx', dx)
+redis.call('HINCRBYFLOAT', KEYS[1], 'sy', y)
+redis.call('HINCRBYFLOAT', KEYS[1], 'sxy', dx * y)
+redis.call('HINCRBYFLOAT', KEYS[1], 'sxx', dx * dx)
+redis.call('HINCRBYFLOAT', KEYS[1], 'dw', w)
+redis.call('HINCRBYFLOAT', KEYS[1], 'dwx', w * dx)
+redis.call('HINCRBYFLOAT', KEYS[1], 'dwy', w * y)
+redis.call('HINCRBYFLOAT', KEYS[1], 'dwxy', w * dx * y)
+redis.call('HINCRBYFLOAT', KEYS[1], 'dwxx', w * dx * dx)
+redis.call('HSET', KEYS[1], 'last_x', x, 'last_y', y)
+return 1
+"""
+
+_append_point = redis_db.redis_client.register_script(_APPEND_POINT_LUA)
+
+def to_months(when: Optional[datetime] = None) -> float:
+    """Convert a timestamp to fractional months since the epoch (the regression x axis)"""
+    timestamp = when.timestamp() if when else time.time()
+    return timestamp / SECONDS_PER_MONTH
+
+def append_service_point(pipe, org_id: str, service_id: str, cost: float, when: Optional[datetime] = None):
+    """Queue a cost point for a single service's regression state"""
+    _append_point(
+        keys=[f"regression:{org_id}:{service_id}"],
+        args=[to_months(when), cost, DECAY_RATE, ""],
+        client=pipe
+    )
+
+def append_org_point(pipe, org_id: str, when: Optional[datetime] = None):
+    """Queue a point for the organization total, read from the running total_cost counter
+
+    Must be queued after the counter deltas of the same transaction so the new
+    total is used.
+    """
+    _append_point(
+        keys=[f"regression:{org_id}", f"analytics_counters:{org_id}"],
+        args=[to_months(when), "", DECAY_RATE, "total_cost"],
+        client=pipe
+    )
+
+def predict_from_stats(stats: dict, at_x: float, decayed: bool = True) -> Optional[float]:
+    """Evaluate the (optionally decayed) least-squares line of a series at an absolute x"""
+    if not stats or "origin" not in stats:
+        return None
+
+    values = {field: float(stats.get(field, 0)) for field in STAT_FIELDS}
+    if decayed:
+        n, sx, sy, sxy, sxx = (values[f] for f in ("dw", "dwx", "dwy", "dwxy", "dwxx"))
+    else:
+        n, sx, sy, sxy, sxx = (values[f] for f in ("n", "sx", "sy", "sxy", "sxx"))
+
+    if values["n"] < 2 or n <= 0:
+        return None
+
+    # Weighted variance of x, guards against all points landing at (nearly) the same time
+    variance = sxx / n - (sx / n) ** 2
+    if variance < MIN_SPAN_MONTHS ** 2:
+        return None
+
+    slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    intercept = (sy - slope * sx) / n
+    return intercept + slope * (at_x - float(stats["origin"]))
+
+def predict_next_month(org_id: str, service_id: Optional[str] = None, decayed: bool = True) -> Optional[float]:
+    """Predict the cost one month from now in constant time from the stored statistics"""
+    key = f"regression:{org_id}:{service_id}" if service_id else f"regression:{org_id}"
+    prediction = predict_from_stats(redis_db.hgetall(key), to_months() + 1, decayed=decayed)
+    if prediction is None:
+        return None
+    return max(0, prediction)  # Don't predict negative costs
+
+def _stats_from_points(points: List[Tuple[float, float]]) -> dict:
+    """Compute the sufficient statistics of a series from scratch, rebased on its latest point"""
+    if not points:
+        return {}
+    origin = max(x for x, _ in points)
+    stats = {field: 0.0 for field in STAT_FIELDS}
+    for x, y in points:
+        dx = x - origin
+        w = math.exp(DECAY_RATE * dx)
+        stats["n"] += 1
+        stats["sx"] += dx
+        stats["sy"] += y
+        stats["sxy"] += dx * y
+        stats["sxx"] += dx * dx
+        stats["dw"] += w
+        stats["dwx"] += w * dx
+        stats["dwy"] += w * y
+        stats["dwxy"] += w * dx * y
+        stats["dwxx"] += w * dx * dx
+    last_x, last_y = max(points)
+    stats.update({"origin": origin, "last_x": last_x, "last_y": last_y})
+    return stats
+
+def _refit_stats(org_id: str) -> dict:
+    """Compute the refitted regression state of an organization and its services, keyed by Redis key"""
+    service_ids = redis_db.get(f"org_services:{org_id}") or []
+    services = redis_db.mget([f"service:{service_id}" for service_id in service_ids])
+    histories = redis_db.mget([f"cost_history:{org_id}:{service_id}" for service_id in service_ids])
+
+    refitted = {}
+    events = []
+
+    for service_id, service_data, history in zip(service_ids, services, histories):
+        if not service_data:
+            continue
+        points = []
+        for entry in history or []:
+            if entry.get("synthetic"):
+                continue
+            x = to_months(datetime.fromisoformat(entry["date"]))
+            points.append((x, float(entry.get("cost", 0))))
+            events.append((x, service_id, float(entry.get("cost", 0))))
+
+        # Services that left the active set stop contributing to the org total
+        if service_data.get("status") != "active" and service_data.get("updated_at"):
+            events.append((to_months(datetime.fromisoformat(service_data["updated_at"])), service_id, 0.0))
+
+        refitted[f"regression:{org_id}:{service_id}"] = _stats_from_points(points)
+
+    # Replay the cost events in order to recover the org total after each change
+    current = {}
+    total = 0.0
+    org_points = []
+    for x, service_id, cost in sorted(events):
+        total += cost - current.get(service_id, 0.0)
+        current[service_id] = cost
+        org_points.append((x, total))
+
+    refitted[f"regression:{org_id}"] = _stats_from_points(org_points)
+    return refitted
+
+def _store_refit(pipe, refitted: dict):
+    """Queue the replacement of every refitted regression state on a transaction"""
+    for key, stats in refitted.items():
+        pipe.delete(key)
+        if stats:
+            pipe.hset(key, mapping=stats)
+
+def refit_regression(org_id: str) -> bool:
+    """Rebuild the regression state of an organization and its services from the raw cost history
+
+    Clears accumulated float drift and rebases every series on its latest point.
+    A cost change appending a point while the history is read would be wiped
+    by the rebuild, so the refit commits only if no mutation landed meanwhile
+    and otherwise starts over; returns False if it gave up.
+    """
+    return build_unless_changed(org_id, lambda: _refit_stats(org_id), _store_refit) is not None
+
+def refit_organizations(org_ids: List[str]) -> dict:
+    """Refit the regression state of several organizations"""
+    stats = {"organizations": 0, "skipped": 0}
+    for org_id in org_ids:
+        stats["organizations"] += 1
+        if not refit_regression(org_id):
+            stats["skipped"] += 1
+    return stats
+
+if __name__ == "__main__":
+    # Periodic refit job: python -m utils.regression [org_id ...]
+    org_ids = sys.argv[1:] or [
+        org_key.split(":", 1)[1] for org_key in redis_db.redis_client.scan_iter(match="org:*")
+    ]
+    # Replicas running the same schedule take turns instead of refitting twice
+    result = run_exclusively("regression-refit", SCHEDULED_JOB_LEASE_SECONDS, lambda: refit_organizations(org_ids))
+    if result is not None:
+        print(f"Refitted regression state for {len(org_ids)} organization(s): {result}")
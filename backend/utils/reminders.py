@@ -0,0 +1,332 @@
+import asyncio
+import os
+import re
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Callable, Optional, Tuple, List, Dict
+
+import redis
+
+from utils.redis_db import redis_db
+from utils.alerts import build_reminder_alert
+from utils.notifications import enqueue_notification
+from utils.change_feed import publish_change
+from utils.event_webhooks import emit_event
+from utils.leases import Lease, WorkGroup, run_exclusively
+
+# Reminder times are published here when set, so a sleeping scheduler wakes up for an earlier one
+REMINDER_WAKE_CHANNEL = "reminders:wake"
+
+# Due reminders popped per organization and transaction
+REMINDER_BATCH = 100
+
+# Longest the scheduler sleeps without a due reminder, in case a wake-up was missed (pub/sub isn't durable)
+MAX_SLEEP_SECONDS = 300
+
+# Wait after a failed pass before trying again
+ERROR_SLEEP_SECONDS = 5
+
+# Every organization's reminders in one index (member "org_id:service_id", scored by due time),
+# split over this many sorted sets so a cluster can spread them; 1 keeps a single reminders:due
+REMINDER_DUE_SHARDS = max(int(os.getenv("REMINDER_DUE_SHARDS", 1)), 1)
+
+# Holds the shard count the index was built with; a different count rebuilds it
+REMINDER_INDEX_MARKER = "reminders:due:built"
+
+# One worker rebuilds the index at a time; the lease must outlive a rebuild
+REMINDER_INDEX_LEASE_SECONDS = 10 * 60
+
+def reminders_key(org_id: str) -> str:
+    return f"reminders:{org_id}"
+
+def due_index_key(org_id: str) -> str:
+    """Get the global due index shard of an organization's reminders"""
+    if REMINDER_DUE_SHARDS == 1:
+        return "reminders:due"
+    return f"reminders:due:{zlib.crc32(org_id.encode()) % REMINDER_DUE_SHARDS}"
+
+def due_index_keys() -> List[str]:
+    if REMINDER_DUE_SHARDS == 1:
+        return ["reminders:due"]
+    return [f"reminders:due:{shard}" for shard in range(REMINDER_DUE_SHARDS)]
+
+def due_member(org_id: str, service_id: str) -> str:
+    return f"{org_id}:{service_id}"
+
+def set_reminder(pipe, org_id: str, service_id: str, timestamp: int):
+    """Schedule (or move) a service's reminder and wake the scheduler"""
+    target = pipe if pipe is not None else redis_db.pipeline()
+    target.zadd(reminders_key(org_id), {service_id: timestamp})
+    target.zadd(due_index_key(org_id), {due_member(org_id, service_id): timestamp})
+    target.publish(REMINDER_WAKE_CHANNEL, timestamp)
+    if pipe is None:
+        target.execute()
+
+def clear_reminder(pipe, org_id: str, service_id: str):
+    target = pipe if pipe is not None else redis_db.pipeline()
+    target.zrem(reminders_key(org_id), service_id)
+    target.zrem(due_index_key(org_id), due_member(org_id, service_id))
+    if pipe is None:
+        target.execute()
+
+def delete_org_reminders(org_id: str):
+    """Remove a deleted organization's reminders and their index entries"""
+    service_ids = redis_db.redis_client.zrange(reminders_key(org_id), 0, -1)
+    pipe = redis_db.pipeline()
+    if service_ids:
+        pipe.zrem(due_index_key(org_id), *(due_member(org_id, service_id) for service_id in service_ids))
+    pipe.delete(reminders_key(org_id))
+    pipe.execute()
+
+def _org_reminder_keys():
+    for key in redis_db.redis_client.scan_iter(match="reminders:*"):
+        org_id = key.split(":", 1)[1]
+        if not org_id.startswith("due"):
+            yield key, org_id
+
+def _copy_org_reminders(key: str, org_id: str, index_key: str, expire: Optional[int] = None) -> bool:
+    """Copy an organization's reminders into an index key as of one consistent read; returns whether it had any
+
+    set_reminder and clear_reminder change the organization's set and the
+    index in one transaction, so watching the set keeps the copy from
+    overwriting a newer score.
+    """
+    with redis_db.redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                entries = pipe.zrange(key, 0, -1, withscores=True)
+                if not entries:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.zadd(index_key, {due_member(org_id, service_id): timestamp for service_id, timestamp in entries})
+                if expire:
+                    pipe.expire(index_key, expire)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+def rebuild_reminder_index():
+    """Build the global due index from the per-organization reminder sets
+
+    The index is built into temporary keys and renamed into place in one
+    transaction, so the scheduler never sees it half built. Reminders set
+    or cleared during the build went to the old keys, so a second pass
+    copies every organization into the new ones; entries left for cleared
+    reminders are dropped by resync_due_entries once they fall due.
+    """
+    build = uuid.uuid4().hex
+    live_keys = due_index_keys()
+    build_keys = {key: f"reminders:due:rebuild:{build}:{key}" for key in live_keys}
+    filled = set()
+    for key, org_id in _org_reminder_keys():
+        # The build keys expire in case this worker dies before renaming them
+        if _copy_org_reminders(key, org_id, build_keys[due_index_key(org_id)], expire=REMINDER_INDEX_LEASE_SECONDS):
+            filled.add(due_index_key(org_id))
+
+    # Shard keys of an earlier shard count would keep members the scheduler can't pop
+    stale = [
+        key for key in redis_db.redis_client.scan_iter(match="reminders:due*")
+        if re.fullmatch(r"reminders:due(:\d+)?", key) and key not in live_keys
+    ]
+
+    pipe = redis_db.pipeline()
+    for key in live_keys:
+        if key in filled:
+            pipe.rename(build_keys[key], key)
+            pipe.persist(key)
+        else:
+            pipe.delete(key)
+    if stale:
+        pipe.delete(*stale)
+    pipe.set(REMINDER_INDEX_MARKER, REMINDER_DUE_SHARDS)
+    pipe.execute()
+
+    for key, org_id in _org_reminder_keys():
+        _copy_org_reminders(key, org_id, due_index_key(org_id))
+
+def ensure_reminder_index() -> bool:
+    """Build the global due index for reminders set before it existed, or after a shard count change
+
+    Only the worker holding the rebuild lease builds it; returns whether the
+    index is current, so the others can wait for it.
+    """
+    def index_is_current() -> bool:
+        return redis_db.redis_client.get(REMINDER_INDEX_MARKER) == str(REMINDER_DUE_SHARDS)
+
+    def rebuild():
+        # Another worker may have finished a rebuild while this one waited for the lease
+        if not index_is_current():
+            print(f"Rebuilding reminder due index over {REMINDER_DUE_SHARDS} shard(s)")
+            rebuild_reminder_index()
+
+    if not index_is_current():
+        run_exclusively("reminder-index", REMINDER_INDEX_LEASE_SECONDS, rebuild)
+    return index_is_current()
+
+def reminder_event(service_id: str, service_data: dict, reminder_timestamp: float, now: float) -> dict:
+    """Describe a reminder to dashboards and outbound webhooks"""
+    return {
+        "service_id": service_id,
+        "service_name": service_data["name"],
+        "cost": service_data["cost"],
+        "reminder_date": datetime.fromtimestamp(reminder_timestamp).isoformat(),
+        "days_until": round((reminder_timestamp - now) / (24 * 60 * 60), 1)
+    }
+
+def pop_due_reminders(org_id: str, now: float, lease: Optional[Lease] = None) -> Tuple[int, int]:
+    """Take up to REMINDER_BATCH due reminders off an organization's set and queue their alert
+
+    The reminders are removed in the same transaction that queues the alert,
+    so the set itself is the checkpoint: a crash before the commit leaves
+    them for the next pass, and a concurrent scheduler (or a user moving a
+    reminder) makes the transaction retry instead of sending twice. With a
+    lease, the transaction also fails once the lease is lost (LeaseLost).
+    Returns (reminders popped, reminders alerted).
+    """
+    key = reminders_key(org_id)
+    with redis_db.redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                if lease is not None:
+                    lease.guard(pipe)
+                due = pipe.zrangebyscore(key, "-inf", now, start=0, num=REMINDER_BATCH, withscores=True)
+                if not due:
+                    pipe.unwatch()
+                    return 0, 0
+
+                services = redis_db.mget([f"service:{service_id}" for service_id, _ in due])
+                org_data = redis_db.get(f"org:{org_id}") or {}
+                reminders = [
+                    {
+                        "service_id": service_id,
+                        "service_data": service_data,
+                        "org_name": org_data.get("name", "Unknown Organization"),
+                        "org_id": org_id,
+                        "reminder_timestamp": timestamp,
+                        "days_until": round((timestamp - now) / (24 * 60 * 60), 1)
+                    }
+                    for (service_id, timestamp), service_data in zip(due, services)
+                    if service_data and service_data.get("status") == "active"
+                ]
+
+                pipe.multi()
+                pipe.zrem(key, *(service_id for service_id, _ in due))
+                pipe.zrem(due_index_key(org_id), *(due_member(org_id, service_id) for service_id, _ in due))
+                if reminders:
+                    message, subject = build_reminder_alert(reminders, 0)
+                    enqueue_notification(pipe, [org_id], message, subject, kind="reminders")
+                    for reminder in reminders:
+                        event = reminder_event(reminder["service_id"], reminder["service_data"], reminder["reminder_timestamp"], now)
+                        publish_change(pipe, org_id, "reminder.due", event)
+                        emit_event(pipe, org_id, "reminder.due", event)
+                pipe.execute()
+                return len(due), len(reminders)
+            except redis.WatchError:
+                continue
+
+def resync_due_entries(org_id: str, service_ids: List[str]):
+    """Correct index entries that disagree with the organization's set (e.g. left by a rebuild racing a delete)"""
+    scores = redis_db.redis_client.zmscore(reminders_key(org_id), service_ids)
+    pipe = redis_db.pipeline()
+    for service_id, score in zip(service_ids, scores):
+        if score is None:
+            pipe.zrem(due_index_key(org_id), due_member(org_id, service_id))
+        else:
+            pipe.zadd(due_index_key(org_id), {due_member(org_id, service_id): score})
+    pipe.execute()
+
+def next_owned_due(key: str, owns: Callable[[str], bool]) -> Optional[float]:
+    """Get the time the earliest reminder of an owned organization in an index shard is due, or None"""
+    start = 0
+    while True:
+        entries = redis_db.redis_client.zrange(key, start, start + REMINDER_BATCH - 1, withscores=True)
+        if not entries:
+            return None
+        for member, score in entries:
+            if owns(member.partition(":")[0]):
+                return score
+        start += len(entries)
+
+def run_due_reminders(now: Optional[float] = None, lease: Optional[Lease] = None,
+                      group: Optional[WorkGroup] = None) -> Tuple[int, Optional[float]]:
+    """Alert every due reminder; returns (reminders alerted, time the next one is due or None)
+
+    Due work is found with one range query per index shard instead of a look
+    at every organization. In a work group only the organizations this member
+    owns are handled, so reminders spread over the workers whatever the shard
+    count.
+    """
+    now = now or time.time()
+    owns = group.owns if group is not None else lambda org_id: True
+    alerted = 0
+    keys = due_index_keys()
+    for key in keys:
+        # Entries of other members' organizations stay in the range; page past them
+        skipped = 0
+        while True:
+            due = redis_db.redis_client.zrangebyscore(key, "-inf", now, start=skipped, num=REMINDER_BATCH)
+            if not due:
+                break
+            by_org: Dict[str, List[str]] = {}
+            for member in due:
+                org_id, _, service_id = member.partition(":")
+                if owns(org_id):
+                    by_org.setdefault(org_id, []).append(service_id)
+                else:
+                    skipped += 1
+            for org_id, service_ids in by_org.items():
+                popped, sent = pop_due_reminders(org_id, now, lease)
+                alerted += sent
+                if not popped:
+                    resync_due_entries(org_id, service_ids)
+
+    upcoming = [next_owned_due(key, owns) for key in keys]
+    next_due = min((score for score in upcoming if score is not None), default=None)
+    return alerted, next_due
+
+async def wait_for_reminder(pubsub, deadline: float):
+    """Sleep until the deadline, or until a reminder due before it is set"""
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+        if message is not None and float(message["data"]) < deadline:
+            return
+
+def wake_reminder_schedulers():
+    """Make every sleeping scheduler look again, e.g. after organizations changed owners"""
+    redis_db.redis_client.publish(REMINDER_WAKE_CHANNEL, 0)
+
+async def run_reminder_scheduler(lease: Optional[Lease] = None, group: Optional[WorkGroup] = None):
+    """Send reminder alerts as they fall due, sleeping until the next one in between
+
+    Run it under a lease (utils.leases.run_while_leader) for a single
+    scheduler, or with a work group to split the organizations between workers.
+    """
+    pubsub = redis_db.async_client.pubsub()
+    await pubsub.subscribe(REMINDER_WAKE_CHANNEL)
+    while not ensure_reminder_index():
+        # Another worker is rebuilding the index; an old shard layout would mislead run_due_reminders
+        await asyncio.sleep(ERROR_SLEEP_SECONDS)
+    print("Reminder scheduler started")
+    try:
+        while True:
+            try:
+                alerted, next_due = run_due_reminders(lease=lease, group=group)
+                if alerted:
+                    print(f"Queued alerts for {alerted} due reminder(s)")
+                deadline = min(next_due, time.time() + MAX_SLEEP_SECONDS) if next_due else time.time() + MAX_SLEEP_SECONDS
+            except Exception as e:
+                print(f"Error running reminder scheduler: {e}")
+                deadline = time.time() + ERROR_SLEEP_SECONDS
+            await wait_for_reminder(pubsub, deadline)
+    finally:
+        await pubsub.unsubscribe(REMINDER_WAKE_CHANNEL)
+        await pubsub.aclose()
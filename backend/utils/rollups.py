@@ -0,0 +1,136 @@
+import argparse
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.redis_db import redis_db
+from utils.leases import SCHEDULED_JOB_LEASE_SECONDS, run_exclusively
+
+def month_key(when: datetime) -> str:
+    """Get the rollup bucket (YYYY-MM) for a timestamp"""
+    return when.strftime("%Y-%m")
+
+def month_range(end: datetime, months: int) -> List[str]:
+    """Get the last `months` rollup buckets up to and including the month of `end`"""
+    year, month = end.year, end.month
+    buckets = []
+    for _ in range(months):
+        buckets.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(buckets))
+
+def record_cost_rollup(org_id: str, service_id: str, cost: float, when: Optional[datetime] = None, pipe=None):
+    """Record the latest real cost of a service in its monthly rollup"""
+    when = when or datetime.utcnow()
+    target = pipe if pipe is not None else redis_db.redis_client
+    target.hset(f"cost_rollup:{org_id}:{service_id}", month_key(when), cost)
+
+def rollup_from_history(history: Optional[list]) -> dict:
+    """Compute the monthly rollup of a service from its raw cost history, skipping synthetic sample points"""
+    rollup = {}
+    for entry in sorted(history or [], key=lambda x: x.get("date", "")):
+        if entry.get("synthetic"):
+            continue
+        rollup[entry["date"][:7]] = entry.get("cost", 0)
+    return rollup
+
+def rollups_from_histories(org_id: str, service_ids: List[str]) -> Dict[str, dict]:
+    """Compute the rollups of several services from their cost histories in one round trip"""
+    histories = redis_db.mget([f"cost_history:{org_id}:{service_id}" for service_id in service_ids]) if service_ids else []
+    return {service_id: rollup_from_history(history) for service_id, history in zip(service_ids, histories)}
+
+def backfill_missing_rollups() -> dict:
+    """Store the rollups of all active services that have none yet (run by the rollup job, not by readers)"""
+    stats = {"organizations": 0, "services": 0, "backfilled": 0}
+    for org_key in redis_db.redis_client.scan_iter(match="org:*"):
+        org_id = org_key.split(":", 1)[1]
+        stats["organizations"] += 1
+        try:
+            service_ids = list(redis_db.redis_client.smembers(f"org_active_services:{org_id}"))
+            stats["services"] += len(service_ids)
+            pipe = redis_db.pipeline(transaction=False)
+            for service_id in service_ids:
+                pipe.exists(f"cost_rollup:{org_id}:{service_id}")
+            missing = [service_id for service_id, stored in zip(service_ids, pipe.execute()) if not stored]
+            for service_id, rollup in rollups_from_histories(org_id, missing).items():
+                if rollup:
+                    pipe.hset(f"cost_rollup:{org_id}:{service_id}", mapping=rollup)
+                    stats["backfilled"] += 1
+            pipe.execute()
+        except Exception as e:
+            print(f"Error backfilling rollups for org {org_id}: {e}")
+    return stats
+
+def load_rollup_observations(org_id: str, service_ids: List[str], months: List[str]) -> np.ndarray:
+    """Load the monthly rollups of several services as a (services x months) matrix of recorded costs
+
+    Months without a rollup entry are NaN, except that the first column holds
+    the last cost recorded before the range. Readers never write: a missing
+    rollup is computed from the cost history, and stored later by the rollup
+    job (python -m utils.rollups).
+    """
+    pipe = redis_db.pipeline(transaction=False)
+    for service_id in service_ids:
+        pipe.hgetall(f"cost_rollup:{org_id}:{service_id}")
+    rollups = pipe.execute() if service_ids else []
+
+    # One batched read of the cost histories behind any missing rollups
+    computed = rollups_from_histories(org_id, [service_id for service_id, rollup in zip(service_ids, rollups) if not rollup])
+
+    matrix = np.full((len(service_ids), len(months)), np.nan)
+    first_month = months[0] if months else None
+
+    for row, (service_id, rollup) in enumerate(zip(service_ids, rollups)):
+        if not rollup:
+            rollup = computed[service_id]
+        carried = None
+        for bucket in sorted(rollup):
+            if bucket < first_month:
+                carried = float(rollup[bucket])
+        if carried is not None:
+            matrix[row, 0] = carried
+        for col, bucket in enumerate(months):
+            if bucket in rollup:
+                matrix[row, col] = float(rollup[bucket])
+
+    return matrix
+
+def load_rollup_matrix(org_id: str, service_ids: List[str], months: List[str]) -> np.ndarray:
+    """Load the monthly rollups of several services as a (services x months) matrix
+
+    Months without a recorded change carry the previous month's cost forward;
+    months before a service's first rollup entry are NaN.
+    """
+    return forward_fill(load_rollup_observations(org_id, service_ids, months))
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Carry the last observed value of each row forward over NaN gaps"""
+    if matrix.size == 0:
+        return matrix
+    valid = ~np.isnan(matrix)
+    index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], index]
+    # Leading gaps have nothing to carry forward and stay NaN
+    filled[np.maximum.accumulate(valid, axis=1) == 0] = np.nan
+    return filled
+
+if __name__ == "__main__":
+    # Scheduled job: python -m utils.rollups [--every SECONDS]
+    parser = argparse.ArgumentParser(description="Backfill missing cost rollups across all organizations")
+    parser.add_argument("--every", type=int, default=0, help="repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    while True:
+        started = time.time()
+        # Replicas running the same schedule take turns instead of backfilling twice
+        result = run_exclusively("rollup-backfill", SCHEDULED_JOB_LEASE_SECONDS, backfill_missing_rollups)
+        if result is not None:
+            print(f"Rollup backfill finished in {time.time() - started:.1f}s: {result}")
+        if not args.every:
+            break
+        time.sleep(max(0, args.every - (time.time() - started)))
@@ -0,0 +1,284 @@
+"""Per-integration alert routing rules
+
+An integration's config may hold "rules": one expression, or a list of
+expressions of which any may match. An integration without rules gets every
+alert. Expressions compare alert attributes with values:
+
+    platform == aws
+    cost > 500 and kind == service.created
+    kind in (service.deleted, budget)
+    tag.team == data or not region == us-east-1
+
+Attributes are kind, org, platform, service_type, name, region, cost and
+tag.<key>. Comparisons are case-insensitive, and numeric when both sides
+are numbers (cost in (500, 1000) matches a cost of 500.0); ==, !=, >, >=,
+<, <= and in are supported, combined with and, or, not and parentheses. A
+comparison against an attribute the alert doesn't have is false.
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.tags import parse_tags
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+# Notifications routed before they were queued (digests hold events that already matched)
+UNROUTED_KINDS = {"digest"}
+
+ATTRIBUTES = {"kind", "org", "platform", "service_type", "name", "region", "cost"}
+NUMERIC_ATTRIBUTES = {"cost"}
+
+MAX_RULES = 20
+MAX_RULE_LENGTH = 500
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<op>==|!=|>=|<=|>|<|\(|\)|,)
+      | "(?P<dq>[^"]*)"
+      | '(?P<sq>[^']*)'
+      | (?P<word>[^\s()=!<>,"']+)
+    )""", re.VERBOSE)
+
+class RuleError(ValueError):
+    """A routing rule that doesn't parse"""
+
+def alert_attributes(service_data: dict) -> Dict[str, Any]:
+    """Get the routing attributes of a service alert"""
+    return {
+        "platform": service_data.get("platform"),
+        "service_type": service_data.get("service_type"),
+        "name": service_data.get("name"),
+        "region": service_data.get("region"),
+        "cost": service_data.get("cost"),
+        "tags": parse_tags(service_data.get("tags")),
+    }
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens, position = [], 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise RuleError(f"Unexpected character at position {position}: {expression[position:]!r}")
+        position = match.end()
+        if match.group("op"):
+            tokens.append(("op", match.group("op")))
+        elif match.group("word") is not None:
+            tokens.append(("word", match.group("word")))
+        else:
+            tokens.append(("string", match.group("dq") if match.group("dq") is not None else match.group("sq")))
+    return tokens
+
+def _getter(name: str) -> Callable[[Dict[str, Any]], Any]:
+    name = name.lower()
+    if name.startswith("tag."):
+        key = name[4:]
+        if not key:
+            raise RuleError("Tag attributes are written tag.<key>")
+        return lambda attributes: (attributes.get("tags") or {}).get(key)
+    if name not in ATTRIBUTES:
+        raise RuleError(f"Unknown attribute {name!r}; use one of {', '.join(sorted(ATTRIBUTES))} or tag.<key>")
+    return lambda attributes: attributes.get(name)
+
+def _number(value: Any) -> Optional[float]:
+    """Parse a number the way rules write them ("500", "$500", 500.0), None for anything else"""
+    try:
+        return float(str(value).lstrip("$"))
+    except ValueError:
+        return None
+
+def _comparison(name: str, op: str, values: List[str]) -> Predicate:
+    get = _getter(name)
+
+    if name.lower() in NUMERIC_ATTRIBUTES:
+        numbers = [_number(value) for value in values]
+        for value, number in zip(values, numbers):
+            if number is None:
+                raise RuleError(f"{name} compares with a number, not {value!r}")
+        number = numbers[0]
+        compare = {
+            "==": lambda a: a == number, "!=": lambda a: a != number,
+            ">": lambda a: a > number, ">=": lambda a: a >= number,
+            "<": lambda a: a < number, "<=": lambda a: a <= number,
+            "in": lambda a: a in numbers,
+        }[op]
+
+        def numeric(attributes: Dict[str, Any]) -> bool:
+            value = get(attributes)
+            try:
+                return value is not None and compare(float(value))
+            except (TypeError, ValueError):
+                return False
+        return numeric
+
+    if op in (">", ">=", "<", "<="):
+        raise RuleError(f"{op} only applies to numeric attributes ({', '.join(sorted(NUMERIC_ATTRIBUTES))})")
+
+    wanted = {value.lower() for value in values}
+    wanted_numbers = {number for number in map(_number, values) if number is not None}
+    negate = op == "!="
+
+    def textual(attributes: Dict[str, Any]) -> bool:
+        value = get(attributes)
+        if value is None:
+            return False
+        matched = str(value).lower() in wanted or (bool(wanted_numbers) and _number(value) in wanted_numbers)
+        return matched != negate
+    return textual
+
+class _Parser:
+    """Recursive descent over: or_expr := and_expr (or and_expr)*; and_expr := unary (and unary)*;
+    unary := not unary | ( or_expr ) | attribute op value | attribute in ( value, ... )"""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise RuleError("Rule ends unexpectedly")
+        self.index += 1
+        return token
+
+    def keyword(self, word: str) -> bool:
+        token = self.peek()
+        if token and token[0] == "word" and token[1].lower() == word:
+            self.index += 1
+            return True
+        return False
+
+    def expect(self, op: str):
+        token = self.take()
+        if token != ("op", op):
+            raise RuleError(f"Expected {op!r}, got {token[1]!r}")
+
+    def parse(self) -> Predicate:
+        predicate = self.or_expr()
+        if self.peek() is not None:
+            raise RuleError(f"Unexpected {self.peek()[1]!r}")
+        return predicate
+
+    def or_expr(self) -> Predicate:
+        terms = [self.and_expr()]
+        while self.keyword("or"):
+            terms.append(self.and_expr())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda attributes: any(term(attributes) for term in terms)
+
+    def and_expr(self) -> Predicate:
+        terms = [self.unary()]
+        while self.keyword("and"):
+            terms.append(self.unary())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda attributes: all(term(attributes) for term in terms)
+
+    def unary(self) -> Predicate:
+        if self.keyword("not"):
+            inner = self.unary()
+            return lambda attributes: not inner(attributes)
+        if self.peek() == ("op", "("):
+            self.take()
+            inner = self.or_expr()
+            self.expect(")")
+            return inner
+
+        kind, name = self.take()
+        if kind != "word":
+            raise RuleError(f"Expected an attribute, got {name!r}")
+
+        if self.keyword("in"):
+            self.expect("(")
+            values = [self.value()]
+            while self.peek() == ("op", ","):
+                self.take()
+                values.append(self.value())
+            self.expect(")")
+            return _comparison(name, "in", values)
+
+        kind, op = self.take()
+        if kind != "op" or op not in ("==", "!=", ">", ">=", "<", "<="):
+            raise RuleError(f"Expected a comparison after {name!r}, got {op!r}")
+        return _comparison(name, op, [self.value()])
+
+    def value(self) -> str:
+        kind, value = self.take()
+        if kind == "op":
+            raise RuleError(f"Expected a value, got {value!r}")
+        return value
+
+def compile_rules(rules: Any) -> Optional[Predicate]:
+    """Compile an integration's rules into one predicate, None when it takes every alert
+
+    Raises RuleError for rules that don't parse.
+    """
+    if rules is None or rules == "" or rules == []:
+        return None
+    if isinstance(rules, str):
+        rules = [rules]
+    if not isinstance(rules, list) or not all(isinstance(rule, str) for rule in rules):
+        raise RuleError("rules must be an expression or a list of expressions")
+    if len(rules) > MAX_RULES:
+        raise RuleError(f"At most {MAX_RULES} rules per integration")
+
+    predicates = []
+    for rule in rules:
+        if len(rule) > MAX_RULE_LENGTH:
+            raise RuleError(f"Rules are limited to {MAX_RULE_LENGTH} characters")
+        tokens = _tokenize(rule)
+        if not tokens:
+            raise RuleError("Empty rule")
+        try:
+            predicates.append(_Parser(tokens).parse())
+        except RuleError as e:
+            raise RuleError(f"{rule!r}: {e}")
+
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda attributes: any(predicate(attributes) for predicate in predicates)
+
+# Compiled rules by integration key, with the updated_at they were compiled from
+_compiled: Dict[str, Tuple[Optional[str], Optional[Predicate]]] = {}
+MAX_COMPILED = 10000
+
+def target_predicate(target: Dict[str, Any]) -> Optional[Predicate]:
+    """Get the compiled rules of a target, recompiling only when the integration was updated
+
+    Rules that no longer parse (saved before validation existed) match nothing.
+    """
+    cached = _compiled.get(target["id"])
+    if cached and cached[0] == target.get("updated_at"):
+        return cached[1]
+
+    try:
+        predicate = compile_rules(target["config"].get("rules"))
+    except RuleError as e:
+        print(f"Invalid routing rules for {target['id']}: {e}")
+        predicate = lambda attributes: False
+
+    if len(_compiled) >= MAX_COMPILED:
+        _compiled.clear()
+    _compiled[target["id"]] = (target.get("updated_at"), predicate)
+    return predicate
+
+def route_alert(targets: List[Dict[str, Any]], event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Keep the targets whose rules match the alert"""
+    if event["kind"] in UNROUTED_KINDS:
+        return targets
+
+    attributes = dict(event.get("attributes") or {}, kind=event["kind"])
+    routed = []
+    for target in targets:
+        predicate = target_predicate(target)
+        if predicate is None:
+            routed.append(target)
+            continue
+        attributes["org"] = target["id"].split(":")[1]
+        if predicate(attributes):
+            routed.append(target)
+    return routed
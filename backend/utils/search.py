@@ -0,0 +1,162 @@
+import re
+import sys
+import uuid
+from collections import defaultdict
+from typing import Optional, Dict, List, Tuple
+
+from utils.redis_db import redis_db
+from utils.analytics import ensure_org_index, build_unless_changed
+
+# Relevance weight of a term by the field it appears in
+SEARCH_FIELDS = {
+    "name": 4.0,
+    "instance_id": 3.0,
+    "owner_email": 2.0,
+    "region": 1.0,
+    "description": 1.0,
+}
+
+# Matching a whole term scores this much more than only matching its prefix
+EXACT_MATCH_BOOST = 2.0
+
+# Terms a single query token may expand to through prefix matching
+MAX_PREFIX_EXPANSIONS = 64
+
+MAX_QUERY_TOKENS = 8
+MIN_PREFIX_LENGTH = 2
+
+# Ranked results are kept briefly so paging through them doesn't redo the set algebra
+SEARCH_RESULT_TTL_SECONDS = 60
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lower-case alphanumeric terms"""
+    return TOKEN_PATTERN.findall(str(text).lower()) if text else []
+
+def document_terms(service_data: Optional[dict]) -> Dict[str, float]:
+    """Get the weighted terms an active service is indexed under"""
+    if not service_data or service_data.get("status") != "active":
+        return {}
+
+    terms = defaultdict(float)
+    for field, weight in SEARCH_FIELDS.items():
+        for term in tokenize(service_data.get(field)):
+            terms[term] += weight
+    return dict(terms)
+
+def apply_search_change(pipe, org_id: str, old_data: Optional[dict], new_data: Optional[dict]):
+    """Queue the postings updates for a service going from old_data to new_data
+
+    search_postings:{org}:{term} maps service ids to their weight for the term
+    and search_terms:{org} is the lexicon (all scores 0) used for prefix
+    expansion with ZRANGEBYLEX. Terms whose postings empty out stay in the
+    lexicon until the next rebuild; they expand to nothing.
+    """
+    old_terms = document_terms(old_data)
+    new_terms = document_terms(new_data)
+    service_id = (new_data or old_data)["id"]
+
+    for term in set(old_terms) - set(new_terms):
+        pipe.zrem(f"search_postings:{org_id}:{term}", service_id)
+
+    changed = {term: weight for term, weight in new_terms.items() if old_terms.get(term) != weight}
+    for term, weight in changed.items():
+        pipe.zadd(f"search_postings:{org_id}:{term}", {service_id: weight})
+    if changed:
+        pipe.zadd(f"search_terms:{org_id}", {term: 0 for term in changed})
+
+def _search_index_keys(org_id: str) -> List[str]:
+    """Get every key of an organization's search index, found through its lexicon"""
+    keys = [f"search_terms:{org_id}", f"search_index_built:{org_id}"]
+    for term in redis_db.redis_client.zrange(f"search_terms:{org_id}", 0, -1):
+        keys.append(f"search_postings:{org_id}:{term}")
+    return keys
+
+def rebuild_search_index(org_id: str, batch_size: int = 1000) -> int:
+    """Replace an organization's search index with one built from its active services
+
+    The index is written in batches, so it is only marked built if no service
+    changed meanwhile; otherwise it is built again.
+    """
+    def build():
+        service_ids = list(redis_db.smembers(f"org_active_services:{org_id}"))
+
+        stale_keys = _search_index_keys(org_id)
+        for start in range(0, len(stale_keys), batch_size):
+            redis_db.redis_client.delete(*stale_keys[start:start + batch_size])
+
+        for start in range(0, len(service_ids), batch_size):
+            batch = service_ids[start:start + batch_size]
+            pipe = redis_db.pipeline(transaction=False)
+            for service_data in redis_db.mget([f"service:{service_id}" for service_id in batch]):
+                if service_data:
+                    apply_search_change(pipe, org_id, None, service_data)
+            pipe.execute()
+        return len(service_ids)
+
+    indexed = build_unless_changed(org_id, build, lambda pipe, _: pipe.set(f"search_index_built:{org_id}", 1))
+    return indexed or 0
+
+def ensure_search_index(org_id: str):
+    """Build the search index for organizations created before it existed"""
+    ensure_org_index(org_id, "search index", f"search_index_built:{org_id}", rebuild_search_index)
+
+def _expand_prefix(org_id: str, token: str) -> List[str]:
+    """Get the lexicon terms starting with a query token"""
+    if len(token) < MIN_PREFIX_LENGTH:
+        return [token]
+    return redis_db.redis_client.zrangebylex(
+        f"search_terms:{org_id}", f"[{token}", f"[{token}\xff", start=0, num=MAX_PREFIX_EXPANSIONS
+    )
+
+def search_services(org_id: str, query: str, offset: int = 0, limit: int = 20, revision: int = 0) -> Tuple[int, List[Tuple[str, float]]]:
+    """Rank an organization's active services against a query; returns (total hits, [(service id, score)])
+
+    Every query token must match (as a whole term or a prefix of one). Scores
+    add up the field weights of the matched terms, with whole term matches
+    boosted. The ranked set is computed server side with ZUNIONSTORE per token
+    and one ZINTERSTORE, and is cached per org revision so paging is one
+    ZREVRANGE.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return 0, []
+
+    ensure_search_index(org_id)
+    result_key = f"search_results:{org_id}:{revision}:{' '.join(tokens)}"
+
+    if not redis_db.exists(result_key):
+        token_keys = []
+        pipe = redis_db.pipeline()
+        for token in tokens:
+            weights = {f"search_postings:{org_id}:{term}": 1.0 for term in _expand_prefix(org_id, token)}
+            weights[f"search_postings:{org_id}:{token}"] = EXACT_MATCH_BOOST
+            token_key = f"search_tmp:{org_id}:{uuid.uuid4().hex}"
+            pipe.zunionstore(token_key, weights, aggregate="MAX")
+            token_keys.append(token_key)
+
+        pipe.zinterstore(result_key, token_keys, aggregate="SUM")
+        pipe.expire(result_key, SEARCH_RESULT_TTL_SECONDS)
+        pipe.delete(*token_keys)
+        pipe.execute()
+
+    pipe = redis_db.pipeline(transaction=False)
+    pipe.zcard(result_key)
+    pipe.zrevrange(result_key, offset, offset + limit - 1, withscores=True)
+    total, hits = pipe.execute()
+    return total, hits
+
+def delete_search_index(org_id: str):
+    """Remove the search index of a deleted organization"""
+    keys = _search_index_keys(org_id)
+    for start in range(0, len(keys), 1000):
+        redis_db.redis_client.delete(*keys[start:start + 1000])
+
+if __name__ == "__main__":
+    # Offline rebuild: python -m utils.search [org_id ...]
+    org_ids = sys.argv[1:] or [
+        org_key.split(":", 1)[1] for org_key in redis_db.redis_client.scan_iter(match="org:*")
+    ]
+    for org_id in org_ids:
+        print(f"Indexed {rebuild_search_index(org_id)} service(s) for org {org_id}")
@@ -0,0 +1,169 @@
+import json
+from typing import Optional, Dict, List
+
+from utils.redis_db import redis_db
+from utils.analytics import ensure_org_index, build_unless_changed
+
+MAX_TAGS_PER_SERVICE = 50
+MAX_TAG_KEY_LENGTH = 64
+MAX_TAG_VALUE_LENGTH = 256
+
+def _parse_tag_item(item: str) -> tuple:
+    """Split a single "key=value", "key:value" or bare "label" tag"""
+    separators = [index for index in (item.find("="), item.find(":")) if index >= 0]
+    if not separators:
+        return item, ""
+    index = min(separators)
+    return item[:index], item[index + 1:]
+
+def normalize_tags(raw: Optional[str]) -> Optional[str]:
+    """Parse free-form tags into canonical JSON (an object of lower-case keys to values)
+
+    Accepts a JSON object, a JSON list of "key=value" items, or a comma separated
+    string such as "team=payments, env:prod, critical". Bare labels get an empty
+    value. Raises ValueError for tags that can't be indexed.
+    """
+    if raw is None or not str(raw).strip():
+        return None
+
+    try:
+        parsed = json.loads(raw)
+    except (TypeError, ValueError):
+        parsed = [item for line in str(raw).splitlines() for item in line.split(",")]
+
+    if isinstance(parsed, dict):
+        pairs = [(str(key), "" if value is None else str(value)) for key, value in parsed.items()]
+    elif isinstance(parsed, list):
+        pairs = [_parse_tag_item(str(item)) for item in parsed if str(item).strip()]
+    else:
+        pairs = [_parse_tag_item(str(parsed))]
+
+    tags = {}
+    for key, value in pairs:
+        key = key.strip().lower()
+        value = value.strip()
+        if not key:
+            continue
+        if "=" in key or len(key) > MAX_TAG_KEY_LENGTH:
+            raise ValueError(f"Invalid tag key: {key!r}")
+        if len(value) > MAX_TAG_VALUE_LENGTH:
+            raise ValueError(f"Tag value too long for key {key!r}")
+        tags[key] = value
+
+    if len(tags) > MAX_TAGS_PER_SERVICE:
+        raise ValueError(f"A service can have at most {MAX_TAGS_PER_SERVICE} tags")
+
+    return json.dumps(tags, sort_keys=True) if tags else None
+
+def parse_tags(tags: Optional[str]) -> Dict[str, str]:
+    """Get the key/value pairs of stored tags, tolerating services saved before normalization"""
+    try:
+        normalized = normalize_tags(tags)
+    except ValueError:
+        return {}
+    return json.loads(normalized) if normalized else {}
+
+def format_tags(tags: Optional[str]) -> str:
+    """Render tags for alert messages"""
+    return ", ".join(f"{key}={value}" if value else key for key, value in parse_tags(tags).items())
+
+def tag_contribution(service_data: Optional[dict]) -> Dict[tuple, float]:
+    """Get the (key, value) pairs an active service is indexed under, with the cost it adds to each"""
+    if not service_data or service_data.get("status") != "active":
+        return {}
+    cost = float(service_data.get("cost", 0) or 0)
+    return {(key, value): cost for key, value in parse_tags(service_data.get("tags")).items()}
+
+def apply_tag_change(pipe, org_id: str, old_data: Optional[dict], new_data: Optional[dict]):
+    """Queue the inverted index and tag cost updates for a service going from old_data to new_data
+
+    tag_index:{org}:{key}={value} holds the ids of active services with that
+    tag, tag_costs:{org}:{key} the cost and service count of each value, and
+    tag_keys:{org} the number of active services carrying each key.
+    """
+    old_tags = tag_contribution(old_data)
+    new_tags = tag_contribution(new_data)
+    service_id = (new_data or old_data)["id"]
+
+    for key, value in set(old_tags) - set(new_tags):
+        pipe.srem(f"tag_index:{org_id}:{key}={value}", service_id)
+        pipe.hincrbyfloat(f"tag_costs:{org_id}:{key}", f"cost:{value}", -old_tags[(key, value)])
+        pipe.hincrby(f"tag_costs:{org_id}:{key}", f"count:{value}", -1)
+        pipe.hincrby(f"tag_keys:{org_id}", key, -1)
+
+    for key, value in set(new_tags) - set(old_tags):
+        pipe.sadd(f"tag_index:{org_id}:{key}={value}", service_id)
+        pipe.hincrbyfloat(f"tag_costs:{org_id}:{key}", f"cost:{value}", new_tags[(key, value)])
+        pipe.hincrby(f"tag_costs:{org_id}:{key}", f"count:{value}", 1)
+        pipe.hincrby(f"tag_keys:{org_id}", key, 1)
+
+    for key, value in set(old_tags) & set(new_tags):
+        delta = new_tags[(key, value)] - old_tags[(key, value)]
+        if delta:
+            pipe.hincrbyfloat(f"tag_costs:{org_id}:{key}", f"cost:{value}", delta)
+
+def _tag_index_keys(org_id: str) -> List[str]:
+    """Get every index key of an organization, found through its tag key and value counters"""
+    keys = [f"tag_keys:{org_id}", f"tag_index_built:{org_id}"]
+    for key in redis_db.hgetall(f"tag_keys:{org_id}"):
+        keys.append(f"tag_costs:{org_id}:{key}")
+        for field in redis_db.hgetall(f"tag_costs:{org_id}:{key}"):
+            kind, _, value = field.partition(":")
+            if kind == "count":
+                keys.append(f"tag_index:{org_id}:{key}={value}")
+    return keys
+
+def rebuild_tag_index(org_id: str):
+    """Replace an organization's tag indexes with ones built from its active services"""
+    def load():
+        service_ids = list(redis_db.smembers(f"org_active_services:{org_id}"))
+        return _tag_index_keys(org_id), redis_db.mget([f"service:{service_id}" for service_id in service_ids])
+
+    def commit(pipe, loaded):
+        stale_keys, services = loaded
+        pipe.delete(*stale_keys)
+        for service_data in services:
+            if service_data:
+                apply_tag_change(pipe, org_id, None, service_data)
+        pipe.set(f"tag_index_built:{org_id}", 1)
+
+    build_unless_changed(org_id, load, commit)
+
+def ensure_tag_index(org_id: str):
+    """Build the tag indexes for organizations created before they existed"""
+    ensure_org_index(org_id, "tag index", f"tag_index_built:{org_id}", rebuild_tag_index)
+
+def get_tag_keys(org_id: str) -> Dict[str, int]:
+    """Get the tag keys in use and the number of active services carrying each"""
+    ensure_tag_index(org_id)
+    return {
+        key: int(count)
+        for key, count in redis_db.hgetall(f"tag_keys:{org_id}").items()
+        if int(count) > 0
+    }
+
+def get_cost_by_tag_value(org_id: str, key: str) -> List[dict]:
+    """Get the monthly cost and service count of every value of a tag key, most expensive first"""
+    ensure_tag_index(org_id)
+    raw = redis_db.hgetall(f"tag_costs:{org_id}:{key.strip().lower()}")
+
+    values = []
+    for field, count in raw.items():
+        kind, _, value = field.partition(":")
+        if kind != "count" or int(count) <= 0:
+            continue
+        values.append({
+            "value": value,
+            "cost": round(float(raw.get(f"cost:{value}", 0)), 2),
+            "services": int(count),
+        })
+    return sorted(values, key=lambda item: -item["cost"])
+
+def get_tagged_service_ids(org_id: str, key: str, value: str) -> List[str]:
+    """Get the ids of active services tagged key=value"""
+    ensure_tag_index(org_id)
+    return sorted(redis_db.smembers(f"tag_index:{org_id}:{key.strip().lower()}={value.strip()}"))
+
+def delete_tag_index(org_id: str):
+    """Remove the tag indexes of a deleted organization"""
+    redis_db.redis_client.delete(*_tag_index_keys(org_id))
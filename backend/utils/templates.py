@@ -0,0 +1,254 @@
+import hashlib
+import html
+import json
+import re
+import time
+from datetime import datetime
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from utils.redis_db import redis_db
+
+# Placeholders available to every template, written $name or ${name}
+PLACEHOLDERS = {
+    "message": "alert text (Markdown with **bold**)",
+    "message_mrkdwn": "alert text in Slack mrkdwn (*bold*)",
+    "message_html": "alert text escaped for HTML, line breaks as <br>",
+    "subject": "alert subject line",
+    "title": "alert title",
+    "kind": "notification kind, e.g. service.created",
+    "timestamp": "Unix time the alert was rendered (a number when it is the whole value)",
+    "time_text": "render time as YYYY-MM-DD HH:MM UTC",
+}
+
+ALERT_TITLE = "🔥 BurnStop Alert"
+LOGO_URL = "https://raw.githubusercontent.com/yourusername/burn-stop/main/assets/logo.png"
+
+DEFAULT_TEMPLATES: Dict[str, Union[dict, str]] = {
+    "slack": {
+        "text": "$message_mrkdwn",
+        "icon_emoji": ":fire:",
+        "attachments": [{
+            "color": "#ff6b6b",
+            "blocks": [
+                {"type": "header", "text": {"type": "plain_text", "text": "$title"}},
+                {"type": "section", "text": {"type": "mrkdwn", "text": "$message_mrkdwn"}},
+                {"type": "context", "elements": [{"type": "mrkdwn", "text": "BurnStop Cost Monitor • $time_text"}]},
+            ],
+        }],
+    },
+    "discord": {
+        "content": "$message",
+        "avatar_url": LOGO_URL,
+        "embeds": [{
+            "title": "$title",
+            "description": "$message",
+            "color": 16733525,  # #ff6b6b in decimal
+            "footer": {"text": "BurnStop Cost Monitor"},
+        }],
+    },
+    "teams": {
+        "@type": "MessageCard",
+        "@context": "http://schema.org/extensions",
+        "themeColor": "ff6b6b",
+        "summary": "BurnStop Alert",
+        "sections": [{
+            "activityTitle": "$title",
+            "activitySubtitle": "Cost Management System",
+            "activityImage": LOGO_URL,
+            "facts": [
+                {"name": "Alert:", "value": "$message"},
+                {"name": "System:", "value": "BurnStop Cost Monitor"},
+            ],
+            "markdown": True,
+        }],
+    },
+    "google_workspace": {
+        "cards": [{
+            "header": {"title": "$title", "subtitle": "Cost Management Alert", "imageUrl": LOGO_URL},
+            "sections": [{"widgets": [{"textParagraph": {"text": "<b>Alert:</b> $message_html"}}]}],
+        }],
+    },
+    "email": """<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }
+        .container { max-width: 600px; margin: 0 auto; background-color: #ffffff; }
+        .header { background-color: #ff6b6b; color: white; padding: 20px; text-align: center; }
+        .content { padding: 30px; }
+        .footer { background-color: #f4f4f4; padding: 15px; text-align: center; font-size: 12px; color: #666; }
+        .alert-box { background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; }
+        .stats { background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 15px 0; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>$title</h1>
+            <p>Cost Management System</p>
+        </div>
+        <div class="content">
+            <div class="alert-box">
+                <h3>Alert Details</h3>
+                <p>$message_html</p>
+            </div>
+
+            <div class="stats">
+                <h4>Alert Information</h4>
+                <p>This alert was generated by your BurnStop cost monitoring system.</p>
+            </div>
+
+            <p><strong>Subject:</strong> $subject</p>
+            <p><strong>Time:</strong> $time_text</p>
+            <p><strong>System:</strong> BurnStop Cost Monitor</p>
+        </div>
+        <div class="footer">
+            <p>BurnStop - Stop burning money on cloud services!</p>
+            <p>This is an automated message from your cost monitoring system.</p>
+        </div>
+    </div>
+</body>
+</html>
+""",
+}
+
+# Largest override accepted, in characters of JSON
+MAX_TEMPLATE_SIZE = 20000
+
+Renderer = Callable[[Dict[str, Any]], Union[dict, str]]
+
+class TemplateError(ValueError):
+    """A template that can't be compiled"""
+
+_WHOLE_PLACEHOLDER = re.compile(r"^\$(?:(\w+)|\{(\w+)\})$")
+
+def _compile_string(text: str) -> Callable[[Dict[str, Any]], Any]:
+    whole = _WHOLE_PLACEHOLDER.match(text)
+    if whole:
+        name = whole.group(1) or whole.group(2)
+        if name not in PLACEHOLDERS:
+            raise TemplateError(f"Unknown placeholder ${name}")
+        return lambda context: context[name]
+
+    template = Template(text)
+    if not template.is_valid():
+        raise TemplateError(f"Invalid placeholder syntax in {text[:80]!r}")
+    unknown = set(template.get_identifiers()) - set(PLACEHOLDERS)
+    if unknown:
+        raise TemplateError(f"Unknown placeholder(s): {', '.join('$' + name for name in sorted(unknown))}")
+    if not template.get_identifiers():
+        return lambda context: text
+    return template.substitute
+
+def _compile_node(node: Any) -> Callable[[Dict[str, Any]], Any]:
+    """Turn a JSON template into a function building the payload, with constant parts shared"""
+    if isinstance(node, str):
+        return _compile_string(node)
+    if isinstance(node, dict):
+        parts = [(key, _compile_node(value)) for key, value in node.items()]
+        return lambda context: {key: render(context) for key, render in parts}
+    if isinstance(node, list):
+        parts = [_compile_node(value) for value in node]
+        return lambda context: [render(context) for render in parts]
+    if node is None or isinstance(node, (bool, int, float)):
+        return lambda context: node
+    raise TemplateError(f"Unsupported value in template: {node!r}")
+
+def compile_template(channel: str, source: Union[dict, str]) -> Renderer:
+    """Compile a channel template: a JSON object for webhooks, an HTML string for email"""
+    if channel not in DEFAULT_TEMPLATES:
+        raise TemplateError(f"No templates for {channel}")
+    if channel == "email":
+        if not isinstance(source, str):
+            raise TemplateError("Email templates are an HTML string")
+    elif not isinstance(source, dict):
+        raise TemplateError(f"{channel} templates are a JSON object (the webhook payload)")
+    if len(json.dumps(source)) > MAX_TEMPLATE_SIZE:
+        raise TemplateError(f"Templates are limited to {MAX_TEMPLATE_SIZE} characters")
+    return _compile_node(source)
+
+# Compiled once at import, so rendering never parses a template
+_DEFAULT_RENDERERS: Dict[str, Renderer] = {
+    channel: compile_template(channel, source) for channel, source in DEFAULT_TEMPLATES.items()
+}
+
+# Compiled org overrides by a hash of their source
+_compiled_overrides: Dict[str, Renderer] = {}
+MAX_COMPILED_OVERRIDES = 1000
+
+def _override_renderer(channel: str, source: str) -> Renderer:
+    digest = hashlib.sha256(f"{channel}\x1f{source}".encode()).hexdigest()
+    renderer = _compiled_overrides.get(digest)
+    if renderer is None:
+        if len(_compiled_overrides) >= MAX_COMPILED_OVERRIDES:
+            _compiled_overrides.clear()
+        renderer = compile_template(channel, json.loads(source))
+        _compiled_overrides[digest] = renderer
+    return renderer
+
+def alert_context(message: str, subject: str, kind: str = "alert") -> Dict[str, Any]:
+    """Get the placeholder values of one alert"""
+    now = time.time()
+    return {
+        "message": message,
+        "message_mrkdwn": re.sub(r"\*\*(.+?)\*\*", r"*\1*", message),
+        "message_html": html.escape(message).replace("\n", "<br>"),
+        "subject": subject,
+        "title": ALERT_TITLE,
+        "kind": kind,
+        "timestamp": int(now),
+        "time_text": datetime.utcfromtimestamp(now).strftime("%Y-%m-%d %H:%M UTC"),
+    }
+
+def templates_key(org_id: str) -> str:
+    return f"alert_templates:{org_id}"
+
+def load_template_overrides(org_ids: List[str]) -> Dict[str, Dict[str, str]]:
+    """Get the raw template overrides of several organizations in one round trip"""
+    org_ids = list(dict.fromkeys(org_ids))
+    pipe = redis_db.redis_client.pipeline(transaction=False)
+    for org_id in org_ids:
+        pipe.hgetall(templates_key(org_id))
+    return dict(zip(org_ids, pipe.execute()))
+
+class AlertRenderer:
+    """Renders one alert at most once per channel and template, shared by every integration using it"""
+
+    def __init__(self, message: str, subject: str, kind: str = "alert",
+                 overrides: Optional[Dict[str, Dict[str, str]]] = None):
+        self.context = alert_context(message, subject, kind)
+        self.overrides = overrides or {}
+        self.rendered: Dict[tuple, Union[dict, str]] = {}
+
+    def render(self, channel: str, org_id: Optional[str] = None) -> Union[dict, str]:
+        """Get the channel payload (or email HTML); callers copy before adding per-integration fields"""
+        source = self.overrides.get(org_id, {}).get(channel) if org_id else None
+        key = (channel, source)
+        if key not in self.rendered:
+            renderer = _DEFAULT_RENDERERS[channel]
+            if source:
+                try:
+                    renderer = _override_renderer(channel, source)
+                except (TemplateError, ValueError) as e:
+                    print(f"Invalid {channel} template for org {org_id}, using the default: {e}")
+            self.rendered[key] = renderer(self.context)
+        return self.rendered[key]
+
+def render_alert(channel: str, message: str, subject: str = "", kind: str = "alert") -> Union[dict, str]:
+    """Render one alert with the default template of a channel"""
+    return AlertRenderer(message, subject, kind).render(channel)
+
+def get_template_overrides(org_id: str) -> Dict[str, Any]:
+    return {channel: json.loads(source) for channel, source in redis_db.redis_client.hgetall(templates_key(org_id)).items()}
+
+def set_template_override(org_id: str, channel: str, source: Union[dict, str]):
+    """Store an organization's template for a channel; raises TemplateError if it doesn't compile"""
+    compile_template(channel, source)
+    redis_db.redis_client.hset(templates_key(org_id), channel, json.dumps(source))
+
+def delete_template_override(org_id: str, channel: str) -> bool:
+    return bool(redis_db.redis_client.hdel(templates_key(org_id), channel))
+
+def delete_template_overrides(org_id: str):
+    redis_db.redis_client.delete(templates_key(org_id))
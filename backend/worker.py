@@ -0,0 +1,127 @@
+"""Notification worker: delivers queued alerts to integrations and batches to event webhooks,
+and queues reminder alerts as they fall due
+
+    python worker.py [--consumers N]     run the worker pool
+    python worker.py replay [--count N]  re-queue dead-lettered notifications
+    python worker.py stats               show the queue backlog
+    python worker.py metrics [--hours N] show delivery metrics per integration type
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import traceback
+
+from utils.redis_db import redis_db
+from utils.http_client import close_http_client
+from utils.email_transport import close_email_transport
+from utils.delivery_metrics import get_type_metrics
+from utils.event_webhooks import deliver_due_event_webhooks
+from utils.reminders import run_reminder_scheduler, wake_reminder_schedulers
+from utils.leases import Lease, WorkGroup, run_while_leader
+from models.integration import IntegrationType
+from utils.notifications import (
+    NOTIFICATION_STREAM, CONSUMER_GROUP, ensure_consumer_group, process_notification,
+    promote_due_retries, flush_due_digests, claim_stale_notifications, replay_dead_letters, queue_stats
+)
+
+# How long one XREADGROUP waits for new notifications
+READ_BLOCK_MS = 5000
+
+RETRY_POLL_SECONDS = 1
+CLAIM_INTERVAL_SECONDS = 60
+
+# Outbound event batches close every batch_ms, so their outboxes are checked more often
+EVENT_WEBHOOK_POLL_SECONDS = 0.1
+
+# How workers and replicas share the background jobs: "leader" runs the reminder scheduler
+# only in the process holding its lease; "partitioned" splits the organizations' reminders and
+# event webhooks between all live workers by rendezvous hashing
+JOB_COORDINATION = os.getenv("JOB_COORDINATION", "leader")
+
+async def handle(entry_id: str, fields: dict):
+    try:
+        print(await process_notification(entry_id, fields))
+    except Exception as e:
+        # Left unacknowledged; another consumer claims it after CLAIM_IDLE_MS
+        print(f"Error processing notification {entry_id}: {e}")
+        traceback.print_exc()
+
+async def consume(consumer: str):
+    """Read new notifications for this consumer and deliver them one batch at a time"""
+    while True:
+        try:
+            response = await redis_db.async_client.xreadgroup(
+                CONSUMER_GROUP, consumer, {NOTIFICATION_STREAM: ">"}, count=10, block=READ_BLOCK_MS
+            )
+        except Exception as e:
+            # A Redis blip must not take down the other consumers and background jobs gathered with this one
+            print(f"Error reading notifications for {consumer}: {e}")
+            await asyncio.sleep(RETRY_POLL_SECONDS)
+            continue
+        for _, entries in response or []:
+            await asyncio.gather(*(handle(entry_id, fields) for entry_id, fields in entries))
+
+async def housekeeping(consumer: str):
+    """Promote due retries, flush closed digest windows and recover notifications abandoned by crashed consumers"""
+    since_claim = CLAIM_INTERVAL_SECONDS
+    while True:
+        try:
+            # Blocking Redis work runs on a thread so the consumers keep delivering meanwhile
+            await asyncio.to_thread(promote_due_retries)
+            await asyncio.to_thread(flush_due_digests)
+            if since_claim >= CLAIM_INTERVAL_SECONDS:
+                since_claim = 0
+                for entry_id, fields in await asyncio.to_thread(claim_stale_notifications, consumer):
+                    await handle(entry_id, fields)
+        except Exception as e:
+            print(f"Error in notification housekeeping: {e}")
+        await asyncio.sleep(RETRY_POLL_SECONDS)
+        since_claim += RETRY_POLL_SECONDS
+
+async def event_webhooks(group: WorkGroup = None):
+    """Deliver outbound event webhook batches as they fill up or their window closes"""
+    while True:
+        try:
+            await deliver_due_event_webhooks(owns=group.owns if group else None)
+        except Exception as e:
+            print(f"Error delivering event webhooks: {e}")
+        await asyncio.sleep(EVENT_WEBHOOK_POLL_SECONDS)
+
+async def run(consumers: int):
+    ensure_consumer_group()
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    names = [f"{prefix}-{index}" for index in range(consumers)]
+    print(f"Notification worker started with {consumers} consumer(s), {JOB_COORDINATION} background jobs")
+    
+    # Retries and digests are claimed atomically, so every worker runs housekeeping
+    if JOB_COORDINATION == "partitioned":
+        group = WorkGroup("background", prefix)
+        group.heartbeat()
+        jobs = [group.run(on_change=wake_reminder_schedulers), event_webhooks(group), run_reminder_scheduler(group=group)]
+    else:
+        jobs = [event_webhooks(), run_while_leader(Lease("reminder-scheduler", prefix), run_reminder_scheduler)]
+    
+    try:
+        await asyncio.gather(housekeeping(names[0]), *jobs, *(consume(name) for name in names))
+    finally:
+        await close_http_client()
+        close_email_transport()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BurnStop notification worker")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "replay", "stats", "metrics"])
+    parser.add_argument("--consumers", type=int, default=int(os.getenv("NOTIFICATION_CONSUMERS", 4)))
+    parser.add_argument("--count", type=int, default=None, help="dead letters to replay (default: all)")
+    parser.add_argument("--hours", type=int, default=24, help="hours of delivery metrics to show")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        print(f"Replayed {replay_dead_letters(args.count)} dead-lettered notification(s)")
+    elif args.command == "stats":
+        print(json.dumps(queue_stats()))
+    elif args.command == "metrics":
+        print(json.dumps(get_type_metrics([integration_type.value for integration_type in IntegrationType], args.hours), indent=2))
+    else:
+        asyncio.run(run(args.consumers))